@@ -37,11 +37,13 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'bms_app'
 ]
 
 MIDDLEWARE = [
+    'bms_app.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -135,3 +137,50 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'bms_app.responses.MessagePackRenderer',
+    ],
+}
+
+# Transaction list pagination
+BMS_PAGE_SIZE = 100
+BMS_MAX_PAGE_SIZE = 1000
+
+# Rows fetched per server-side cursor round trip in ?stream=1 exports
+BMS_STREAM_CHUNK_SIZE = 2000
+
+# Bulk transaction create limits
+BMS_BULK_MAX_ROWS = 5000
+BMS_BULK_BATCH_SIZE = 1000
+
+# In-process cache of the items, remarks and tax reference lists
+BMS_REFERENCE_CACHE_TTL = 300
+BMS_REFERENCE_CACHE_MAX_ENTRIES = 10000
+
+# Upper bounds in seconds of the request latency histogram served at /metrics
+BMS_METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Background jobs (run_workers): worker processes, how long a job's lease
+# lasts before another worker may take it over, how often a running job's
+# worker renews it and checks for cancellation, how many of one company's
+# jobs may run at once, and attempts per job with the delay before a retry,
+# doubling after each failure up to the maximum
+BMS_JOB_WORKERS = 4
+BMS_JOB_LEASE_SECONDS = 300
+BMS_JOB_HEARTBEAT_SECONDS = 60
+BMS_JOB_COMPANY_CONCURRENCY = 2
+BMS_JOB_MAX_ATTEMPTS = 5
+BMS_JOB_RETRY_DELAY_SECONDS = 30
+BMS_JOB_RETRY_MAX_DELAY_SECONDS = 3600
+
+# Rows a background delete removes per batch
+BMS_DELETE_BATCH_SIZE = 5000
+
+# Parquet files archive_financial_year moves closed years' transactions to
+BMS_ARCHIVE_DIR = BASE_DIR / 'archive'
+BMS_ARCHIVE_ROW_GROUP_SIZE = 100000
+BMS_ARCHIVE_COMPRESSION = 'zstd'
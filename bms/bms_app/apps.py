@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BmsAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bms_app'
+
+    def ready(self):
+        from . import metrics, purge, signals  # noqa: F401
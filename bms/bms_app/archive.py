@@ -0,0 +1,351 @@
+import operator
+import os
+from datetime import date
+from itertools import islice
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, models, transaction
+from django.db.models import Count, F, Max, Min, Window
+from django.db.models.functions import DenseRank
+from .fieldsets import InvalidFieldset
+from .models import TransactionArchive, Transactions
+from .pagination import InvalidPageRequest, decode_cursor, get_page_size, sort_column
+from .rollup import UNDATED_MONTH
+from .versions import bump_table_version
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Name of a financial year's transactions partition, see migration 0008.
+PARTITION_PREFIX = 'transactions_fy_'
+
+# Text sort keys archived together with their rank in the database
+# collation, which need not be pyarrow's byte order, so archived years
+# page in the order the same rows had in the database.
+RANKED_COLUMNS = {'bill_no': 'bill_no_rank'}
+
+LOOKUP_OPERATORS = {
+    'exact': operator.eq,
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'lt': operator.lt,
+    'lte': operator.le,
+}
+
+REPORT_COLUMNS = ['party_id', 'seller_party_id', 'quantity', 'amount',
+                  'brokerage_amount', 'brokerage_gst', 'tax_amount',
+                  'transaction_id']
+
+GST_COLUMNS = ['bill_date', 'tax_id', 'party_id', 'amount', 'tax_amount',
+               'brokerage_gst', 'transaction_id']
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImproperlyConfigured("Archived financial years need pyarrow installed")
+
+
+def arrow_type(field):
+    if field.is_relation or isinstance(field, models.IntegerField):
+        return pa.int64()
+    if isinstance(field, models.DecimalField):
+        return pa.decimal128(field.max_digits, field.decimal_places)
+    if isinstance(field, models.DateField):
+        return pa.date32()
+    return pa.string()
+
+
+def archive_schema():
+    """
+    Parquet schema of an archive: every Transactions column, by attname,
+    then the collation rank of each of RANKED_COLUMNS.
+    """
+    require_pyarrow()
+    return pa.schema([pa.field(field.attname, arrow_type(field), nullable=field.null)
+                      for field in Transactions._meta.concrete_fields]
+                     + [pa.field(rank, pa.int64()) for rank in RANKED_COLUMNS.values()])
+
+
+def write_archive(queryset, path):
+    """
+    Writes the transactions of `queryset` to a Parquet file in bill_date
+    order, one row group per BMS_ARCHIVE_ROW_GROUP_SIZE rows, and returns
+    the number written. Sorting by date keeps each row group's bill_date
+    statistics narrow, so date filters skip most of the file.
+
+    The ranks of RANKED_COLUMNS are numbered by the database in the same
+    query, with equal values sharing a rank and nulls left without one.
+    """
+    schema = archive_schema()
+    size = settings.BMS_ARCHIVE_ROW_GROUP_SIZE
+    rows = queryset.annotate(**{
+        rank: Window(DenseRank(), order_by=F(column).asc())
+        for column, rank in RANKED_COLUMNS.items()
+    }).order_by(F('bill_date').asc(nulls_last=True), 'transaction_id') \
+        .values_list(*schema.names).iterator(chunk_size=size)
+    written = 0
+    with pq.ParquetWriter(path, schema,
+                          compression=settings.BMS_ARCHIVE_COMPRESSION) as writer:
+        while True:
+            chunk = list(islice(rows, size))
+            if not chunk:
+                break
+            arrays = [pa.array(values, type=field.type)
+                      for values, field in zip(zip(*chunk), schema)]
+            for column, rank in RANKED_COLUMNS.items():
+                index = schema.get_field_index(rank)
+                arrays[index] = pc.if_else(arrays[schema.get_field_index(column)].is_null(),
+                                           pa.scalar(None, pa.int64()), arrays[index])
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            written += len(chunk)
+    return written
+
+
+def drop_partition(cursor, partition):
+    """
+    Detaches and drops a transactions partition. Foreign key checks are
+    deferred, and PostgreSQL will not drop a table that rows written
+    earlier in the transaction still have checks pending on, so those
+    run first.
+    """
+    cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+    cursor.execute(f"ALTER TABLE transactions DETACH PARTITION {partition}")
+    cursor.execute(f"DROP TABLE {partition}")
+    cursor.execute("SET CONSTRAINTS ALL DEFERRED")
+    bump_table_version('transactions')
+
+
+def archive_financial_year(year, directory=None):
+    """
+    Moves the transactions of `year` into a Parquet file under `directory`
+    and drops the year's partition, returning the TransactionArchive.
+
+    Writers to the year wait until the move commits. The brokerage rollup
+    is left as it is, so whole-month reports on the year stay in SQL.
+    """
+    require_pyarrow()
+    directory = os.path.join(directory or settings.BMS_ARCHIVE_DIR,
+                             f"company_{year.company_id}")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"financial_year_{year.pk}.parquet")
+    partition = f"{PARTITION_PREFIX}{year.pk}"
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [partition])
+        partitioned = cursor.fetchone()[0]
+        cursor.execute(f"LOCK TABLE {partition if partitioned else 'transactions'} "
+                       "IN SHARE MODE")
+
+        queryset = Transactions.objects.filter(company_financial_year=year)
+        totals = queryset.aggregate(rows=Count('pk'), min_transaction_id=Min('pk'),
+                                    max_transaction_id=Max('pk'))
+        try:
+            written = write_archive(queryset, path + '.tmp')
+            if written != totals['rows']:
+                raise RuntimeError(f"Archived {written} of {totals['rows']} transactions")
+            os.replace(path + '.tmp', path)
+        finally:
+            if os.path.exists(path + '.tmp'):
+                os.remove(path + '.tmp')
+
+        if partitioned:
+            drop_partition(cursor, partition)
+        else:
+            cursor.execute("DELETE FROM transactions WHERE company_financial_year_id = %s",
+                           [year.pk])
+        return TransactionArchive.objects.create(financial_year=year, path=path, **totals)
+
+
+def year_archive(financial_year_id):
+    return TransactionArchive.objects.filter(financial_year_id=financial_year_id).first()
+
+
+def lookup_expression(lookups):
+    """
+    pyarrow filter for Django style `lookups` on transaction columns,
+    such as {'party_id': 3, 'bill_date__gte': date(2024, 4, 1)}.
+    """
+    expression = None
+    for lookup, value in lookups.items():
+        column, _, name = lookup.partition('__')
+        term = LOOKUP_OPERATORS[name or 'exact'](pc.field(column), value)
+        expression = term if expression is None else expression & term
+    return expression
+
+
+def after_cursor_expression(value, transaction_id, ordering, column=None):
+    """
+    pyarrow counterpart of pagination.after_cursor, comparing `column`,
+    by default the ordering's own, against `value`.
+    """
+    column = pc.field(column or sort_column(ordering))
+    descending = ordering.startswith('-')
+    after_id = (pc.field('transaction_id') < transaction_id if descending
+                else pc.field('transaction_id') > transaction_id)
+    if sort_column(ordering) == 'transaction_id':
+        return after_id
+    if value is None:
+        if descending:
+            return column.is_null() & after_id | column.is_valid()
+        return column.is_null() & after_id
+    if descending:
+        return (column < value) | (column == value) & after_id
+    return (column > value) | (column == value) & after_id | column.is_null()
+
+
+def archive_dataset(archive, columns):
+    """
+    The archive's Parquet file as a dataset, after checking it has
+    `columns`; columns of expanded foreign keys are not archived.
+    """
+    require_pyarrow()
+    if set(columns).difference(archive_schema().names):
+        raise InvalidFieldset("Expanded fields are not available for archived financial years")
+    return ds.dataset(archive.path, format='parquet')
+
+
+def read_archive(archive, columns, expression=None):
+    """
+    Reads only `columns` of the rows matching `expression`. Row groups
+    whose statistics rule the expression out are skipped unread.
+    """
+    columns = list(dict.fromkeys(columns))
+    return archive_dataset(archive, columns).to_table(columns=columns, filter=expression)
+
+
+def table_rows(table, columns):
+    """
+    The rows of a pyarrow table or batch as values_list() style tuples.
+    """
+    return list(zip(*(table.column(name).to_pylist() for name in columns)))
+
+
+def sort_indices(table, ordering, column=None):
+    column = column or sort_column(ordering)
+    direction = 'descending' if ordering.startswith('-') else 'ascending'
+    return pc.sort_indices(
+        table, sort_keys=[(column, direction), ('transaction_id', direction)],
+        null_placement='at_start' if ordering.startswith('-') else 'at_end')
+
+
+def collation_rank(archive, column, value, transaction_id):
+    """
+    The stored rank of the cursor's row in a ranked text column. The row
+    is found by its ID, so no other value needs ranking at read time.
+    """
+    if value is None:
+        return None
+    row = read_archive(archive, [column, RANKED_COLUMNS[column]],
+                       pc.field('transaction_id') == transaction_id)
+    if row.num_rows != 1 or row.column(column)[0].as_py() != value:
+        raise InvalidPageRequest("Invalid cursor")
+    return row.column(RANKED_COLUMNS[column])[0].as_py()
+
+
+def archived_page(archive, columns, lookups, request, ordering):
+    """
+    Archive counterpart of pagination.keyset_queryset: the rows of one
+    page plus the look-ahead row, as tuples of `columns`, and the page
+    size. The page is picked reading only the sort key and ID columns,
+    text columns being sorted and sought on their stored collation rank;
+    the other columns are read for the page's rows alone.
+    """
+    page_size = get_page_size(request)
+    column = sort_column(ordering)
+    key = RANKED_COLUMNS.get(column, column)
+    expression = lookup_expression(lookups)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        value, transaction_id = decode_cursor(cursor, ordering)
+        if key != column:
+            value = collation_rank(archive, column, value, transaction_id)
+        after = after_cursor_expression(value, transaction_id, ordering, key)
+        expression = after if expression is None else expression & after
+
+    keys = read_archive(archive, [key, 'transaction_id'], expression)
+    indices = sort_indices(keys, ordering, key)
+    page_ids = keys.take(indices[:page_size + 1]).column('transaction_id').to_pylist()
+
+    table = read_archive(archive, [*columns, 'transaction_id'],
+                         pc.field('transaction_id').isin(page_ids))
+    positions = pc.index_in(table.column('transaction_id'),
+                            value_set=pa.array(page_ids, type=pa.int64()))
+    return table_rows(table.take(pc.sort_indices(positions)), columns), page_size
+
+
+def iter_archive(archive, columns, lookups, batch_size):
+    """
+    Yields lists of at most `batch_size` rows of `columns` matching
+    `lookups`, in bill_date order.
+    """
+    dataset = archive_dataset(archive, columns)
+    for batch in dataset.to_batches(columns=list(columns), filter=lookup_expression(lookups),
+                                    batch_size=batch_size):
+        if batch.num_rows:
+            yield table_rows(batch, columns)
+
+
+def find_archived_transaction(transaction_id, columns):
+    """
+    The archived transaction with this ID as a tuple of `columns`, or None.
+    """
+    archives = TransactionArchive.objects.filter(
+        min_transaction_id__lte=transaction_id, max_transaction_id__gte=transaction_id)
+    for archive in archives:
+        rows = table_rows(read_archive(
+            archive, columns, pc.field('transaction_id') == transaction_id), columns)
+        if rows:
+            return rows[0]
+    return None
+
+
+def archived_party_pairs(archive, lookups, party=None):
+    """
+    Totals per (party, seller_party) pair of the archived transactions
+    matching `lookups` and, if given, involving `party` on either side;
+    the rows report.party_summary aggregates in SQL for live years.
+    """
+    expression = lookup_expression(lookups)
+    if party is not None:
+        either = (pc.field('party_id') == party) | (pc.field('seller_party_id') == party)
+        expression = either if expression is None else expression & either
+    table = read_archive(archive, REPORT_COLUMNS, expression)
+    totals = table.group_by(['party_id', 'seller_party_id']).aggregate(
+        [(column, 'sum') for column in REPORT_COLUMNS[2:-1]]
+        + [('transaction_id', 'count')])
+    return [{
+        'party_id': row['party_id'],
+        'seller_party_id': row['seller_party_id'],
+        **{column: row[f"{column}_sum"] for column in REPORT_COLUMNS[2:-1]},
+        'transactions': row['transaction_id_count'],
+    } for row in totals.to_pylist()]
+
+
+def archived_gst_groups(archive, company_id, months):
+    """
+    Totals per (month, tax, party) of the company's archived transactions
+    in `months`; the rows report.gst_groups aggregates in SQL for live
+    years.
+    """
+    table = read_archive(archive, GST_COLUMNS, pc.field('company_id') == company_id)
+    dates = table.column('bill_date')
+    table = table.append_column('year', pc.year(dates)).append_column('month', pc.month(dates))
+    totals = table.group_by(['year', 'month', 'tax_id', 'party_id']).aggregate(
+        [(column, 'sum') for column in GST_COLUMNS[3:-1]] + [('transaction_id', 'count')])
+    groups = []
+    for row in totals.to_pylist():
+        month = UNDATED_MONTH if row['year'] is None else date(row['year'], row['month'], 1)
+        if month in months:
+            groups.append({
+                'month': month,
+                'tax_id': row['tax_id'],
+                'party_id': row['party_id'],
+                **{column: row[f"{column}_sum"] for column in GST_COLUMNS[3:-1]},
+                'transactions': row['transaction_id_count'],
+            })
+    return groups
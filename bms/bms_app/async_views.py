@@ -0,0 +1,300 @@
+import logging
+import traceback
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from .archive import archived_page, find_archived_transaction
+from .cache import item_cache, remark_cache, tax_cache
+from .fieldsets import InvalidFieldset, only_fields, requested_expansions, requested_fields, trim_rows
+from .models import Party, Transactions
+from .pagination import InvalidPageRequest, get_ordering, keyset_queryset, sort_column, split_page
+from .responses import api_response
+from .rowencoders import row_encoder
+from .serializers import PartySerializer, TransactionFilterSerializer, TransactionSerializer
+from .transaction import filter_transactions, requested_archive, stream_transactions, transaction_lookups
+from .versions import async_condition, versioned_etag
+
+# Setup logger
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+async def iterate_in_thread(iterator):
+    """
+    Drives a sync iterator that reads the database, one item per trip to
+    the thread the ORM runs on, so a streamed body never blocks the loop.
+    """
+    while (item := await sync_to_async(next)(iterator, None)) is not None:
+        yield item
+
+
+class AsyncPartyView(View):
+    """
+    Read-only async counterpart of PartyAPIView. Under ASGI these run on
+    the event loop instead of the single thread sync views share, so slow
+    queries elsewhere do not hold up cheap lookups.
+    """
+
+    @method_decorator(async_condition(versioned_etag('party')))
+    async def get(self, request, party_id=None, *args, **kwargs):
+        try:
+            fields = requested_fields(request, PartySerializer)
+            if party_id:
+                party = await only_fields(Party.objects.filter(
+                    party_id=party_id), fields).afirst()
+                if party is None:
+                    return api_response(request, {
+                        "error_code": 404,
+                        "message": "Party not found",
+                        "data": [],
+                        "error": []
+                    }, status=404)
+
+                serializer = PartySerializer(party, fields=fields)
+                return api_response(request, {
+                    "error_code": 200,
+                    "message": "Party found",
+                    "data": [serializer.data],
+                    "error": []
+                }, status=200)
+
+            encoder = row_encoder(PartySerializer, fields)
+            partys = [party async for party in encoder.values(Party.objects.all())]
+            if not partys:
+                return api_response(request, {
+                    "error_code": 400,
+                    "message": "No partys found",
+                    "data": [],
+                    "error": []
+                }, status=400)
+
+            return api_response(request, {
+                "error_code": 200,
+                "message": "Data found",
+                "data": encoder.encode_rows(partys),
+                "error": []
+            }, status=200)
+
+        except InvalidFieldset as e:
+            return api_response(request, {
+                "error_code": 400,
+                "message": "Invalid fields",
+                "data": [],
+                "error": [str(e)]
+            }, status=400)
+
+        except Exception as e:
+            logger.error(f"Internal Server Error: {str(e)}")
+            return api_response(request, {
+                "error_code": 500,
+                "message": "Internal Server Error",
+                "data": [],
+                "error": traceback.format_exc().splitlines()
+            }, status=500)
+
+
+class AsyncReferenceView(View):
+    """
+    Read-only async view over one of the cached reference tables.
+    """
+    cache = None
+    label = None
+
+    async def get(self, request, *args, **kwargs):
+        etag_func = versioned_etag(self.cache.model._meta.db_table)
+        return await async_condition(etag_func)(self.read)(request, *args, **kwargs)
+
+    async def read(self, request, pk=None, *args, **kwargs):
+        try:
+            fields = requested_fields(request, self.cache.serializer_class)
+            if pk:
+                row = await self.cache.aget(pk)
+                if row is None:
+                    return api_response(request, {
+                        "error_code": 404,
+                        "message": f"{self.label} not found",
+                        "data": [],
+                        "error": []
+                    }, status=404)
+
+                return api_response(request, {
+                    "error_code": 200,
+                    "message": f"{self.label} found",
+                    "data": trim_rows([row], fields),
+                    "error": []
+                }, status=200)
+
+            rows = await self.cache.aall()
+            if not rows:
+                return api_response(request, {
+                    "error_code": 400,
+                    "message": f"No {self.label.lower()}s found",
+                    "data": [],
+                    "error": []
+                }, status=400)
+
+            return api_response(request, {
+                "error_code": 200,
+                "message": "Data found",
+                "data": trim_rows(rows, fields),
+                "error": []
+            }, status=200)
+
+        except InvalidFieldset as e:
+            return api_response(request, {
+                "error_code": 400,
+                "message": "Invalid fields",
+                "data": [],
+                "error": [str(e)]
+            }, status=400)
+
+        except Exception as e:
+            logger.error(f"Internal Server Error: {str(e)}")
+            return api_response(request, {
+                "error_code": 500,
+                "message": "Internal Server Error",
+                "data": [],
+                "error": traceback.format_exc().splitlines()
+            }, status=500)
+
+
+class AsyncItemsView(AsyncReferenceView):
+    cache = item_cache
+    label = "Item"
+
+
+class AsyncRemarkView(AsyncReferenceView):
+    cache = remark_cache
+    label = "Remark"
+
+
+class AsyncTaxView(AsyncReferenceView):
+    cache = tax_cache
+    label = "Tax"
+
+
+class AsyncTransactionView(View):
+    """
+    Read-only async counterpart of TransactionAPIView, with the same
+    filters, keyset pagination, streaming and reads of archived years.
+    """
+
+    @method_decorator(async_condition(versioned_etag(
+        'transactions', expandable=TransactionSerializer.expandable_fields)))
+    async def get(self, request, trnx_id=None, *args, **kwargs):
+        try:
+            fields = requested_fields(request, TransactionSerializer)
+            expand = requested_expansions(request, TransactionSerializer, fields)
+            if trnx_id:
+                transaction = await only_fields(
+                    Transactions.objects.select_related(*expand).filter(
+                        transaction_id=trnx_id), fields).afirst()
+                if transaction is None:
+                    encoder = row_encoder(TransactionSerializer, fields, expand=expand)
+                    row = await sync_to_async(find_archived_transaction)(
+                        trnx_id, encoder.columns)
+                    if row is None:
+                        return api_response(request, {
+                            "error_code": 404,
+                            "message": "Transaction not found",
+                            "data": [],
+                            "error": []
+                        }, status=404)
+
+                    return api_response(request, {
+                        "error_code": 200,
+                        "message": "Transactiion found",
+                        "data": encoder.encode_rows([row]),
+                        "error": []
+                    }, status=200)
+
+                serializer = TransactionSerializer(
+                    transaction, fields=fields, expand=expand)
+                return api_response(request, {
+                    "error_code": 200,
+                    "message": "Transactiion found",
+                    "data": [serializer.data],
+                    "error": []
+                }, status=200)
+
+            filters = TransactionFilterSerializer(data=request.GET)
+            if not filters.is_valid():
+                return api_response(request, {
+                    "error_code": 400,
+                    "message": "Validation failed",
+                    "data": [],
+                    "error": filters.errors
+                }, status=400)
+
+            archive = await sync_to_async(requested_archive)(filters.validated_data)
+            if request.GET.get('stream'):
+                return StreamingHttpResponse(
+                    iterate_in_thread(stream_transactions(
+                        filter_transactions(Transactions.objects.all(),
+                                            filters.validated_data),
+                        fields, expand, archive,
+                        transaction_lookups(filters.validated_data))),
+                    content_type='application/json')
+
+            ordering = get_ordering(request)
+            column = sort_column(ordering)
+            encoder = row_encoder(TransactionSerializer, fields,
+                                  extra=(column, 'transaction_id'),
+                                  expand=expand)
+            if archive is None:
+                queryset, page_size = keyset_queryset(
+                    encoder.values(filter_transactions(
+                        Transactions.objects.all(), filters.validated_data)),
+                    request, ordering)
+                rows = [transaction async for transaction in queryset]
+            else:
+                rows, page_size = await sync_to_async(archived_page)(
+                    archive, encoder.columns,
+                    transaction_lookups(filters.validated_data), request, ordering)
+            transactions, next_cursor = split_page(
+                rows, page_size, encoder.getter(column, 'transaction_id'), ordering)
+            if not transactions and not request.GET.get('cursor'):
+                return api_response(request, {
+                    "error_code": 400,
+                    "message": "No transaction found",
+                    "data": [],
+                    "error": []
+                }, status=400)
+
+            return api_response(request, {
+                "error_code": 200,
+                "message": "Data found",
+                "data": encoder.encode_rows(transactions),
+                "error": [],
+                "pagination": {
+                    "page_size": page_size,
+                    "next_cursor": next_cursor,
+                }
+            }, status=200)
+
+        except InvalidPageRequest as e:
+            return api_response(request, {
+                "error_code": 400,
+                "message": "Invalid pagination parameters",
+                "data": [],
+                "error": [str(e)]
+            }, status=400)
+
+        except InvalidFieldset as e:
+            return api_response(request, {
+                "error_code": 400,
+                "message": "Invalid fields",
+                "data": [],
+                "error": [str(e)]
+            }, status=400)
+
+        except Exception as e:
+            logger.error(f"Internal Server Error: {str(e)}")
+            return api_response(request, {
+                "error_code": 500,
+                "message": "Internal Server Error",
+                "data": [],
+                "error": traceback.format_exc().splitlines()
+            }, status=500)
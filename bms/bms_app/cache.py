@@ -0,0 +1,166 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.db.models import Sum
+from .models import Items, Remarks, TableVersion, Tax
+from .serializers import ItemSerializer, RemarkSerializer, TaxSerializer
+
+
+class ReferenceCache:
+    """
+    In-process read-through cache of a small reference table, holding the
+    serialized rows.
+
+    Entries are kept against the table's table_version, the counter the
+    ETags of these endpoints are built from, so a write from any process
+    or through raw SQL reloads them on the next read and a new ETag never
+    goes out with an old body. Writes in this process also invalidate it
+    straight away through the views and model signals, and entries expire
+    after BMS_REFERENCE_CACHE_TTL. The full list is only kept when the
+    table has at most BMS_REFERENCE_CACHE_MAX_ENTRIES rows, and single-row
+    lookups are bounded the same way.
+    """
+
+    def __init__(self, name, model, serializer_class):
+        self.name = name
+        self.model = model
+        self.serializer_class = serializer_class
+        self.lock = threading.Lock()
+        self.version = 0
+        self.table_version = None
+        self.rows = None
+        self.by_id = OrderedDict()
+        self.loaded_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def versions(self):
+        return TableVersion.objects.filter(table_name=self.model._meta.db_table)
+
+    def current_table_version(self):
+        return self.versions().aggregate(total=Sum('version'))['total'] or 0
+
+    async def acurrent_table_version(self):
+        return (await self.versions().aaggregate(total=Sum('version')))['total'] or 0
+
+    def is_fresh(self, table_version):
+        return (self.table_version == table_version
+                and time.monotonic() - self.loaded_at < settings.BMS_REFERENCE_CACHE_TTL)
+
+    def cached_all(self, table_version):
+        """
+        Returns (rows, None) on a hit, or (None, token) on a miss where
+        token must be passed back to store_all with the loaded rows.
+        """
+        with self.lock:
+            if self.rows is not None and self.is_fresh(table_version):
+                self.hits += 1
+                return self.rows, None
+            self.misses += 1
+            return None, (self.version, table_version)
+
+    def reset(self, table_version):
+        self.rows = None
+        self.by_id.clear()
+        self.loaded_at = time.monotonic()
+        self.table_version = table_version
+
+    def store_all(self, token, rows):
+        version, table_version = token
+        with self.lock:
+            if (version == self.version
+                    and len(rows) <= settings.BMS_REFERENCE_CACHE_MAX_ENTRIES):
+                self.reset(table_version)
+                self.rows = rows
+                self.by_id.update(
+                    (row[self.model._meta.pk.name], row) for row in rows)
+
+    def cached_get(self, pk, table_version):
+        with self.lock:
+            if self.is_fresh(table_version) and pk in self.by_id:
+                self.hits += 1
+                self.by_id.move_to_end(pk)
+                return self.by_id[pk], None
+            self.misses += 1
+            return None, (self.version, table_version)
+
+    def store_get(self, token, pk, row):
+        version, table_version = token
+        with self.lock:
+            if version == self.version:
+                if not self.is_fresh(table_version):
+                    self.reset(table_version)
+                self.by_id[pk] = row
+                if len(self.by_id) > settings.BMS_REFERENCE_CACHE_MAX_ENTRIES:
+                    self.rows = None
+                    self.by_id.popitem(last=False)
+
+    def all(self):
+        rows, token = self.cached_all(self.current_table_version())
+        if rows is None:
+            rows = self.serializer_class(
+                self.model.objects.all(), many=True).data
+            self.store_all(token, rows)
+        return rows
+
+    async def aall(self):
+        rows, token = self.cached_all(await self.acurrent_table_version())
+        if rows is None:
+            instances = [instance async for instance in self.model.objects.all()]
+            rows = self.serializer_class(instances, many=True).data
+            self.store_all(token, rows)
+        return rows
+
+    def get(self, pk):
+        row, token = self.cached_get(pk, self.current_table_version())
+        if token is not None:
+            instance = self.model.objects.filter(pk=pk).first()
+            if instance is None:
+                return None
+            row = self.serializer_class(instance).data
+            self.store_get(token, pk, row)
+        return row
+
+    async def aget(self, pk):
+        row, token = self.cached_get(pk, await self.acurrent_table_version())
+        if token is not None:
+            instance = await self.model.objects.filter(pk=pk).afirst()
+            if instance is None:
+                return None
+            row = self.serializer_class(instance).data
+            self.store_get(token, pk, row)
+        return row
+
+    def invalidate(self):
+        with self.lock:
+            self.version += 1
+            self.invalidations += 1
+            self.rows = None
+            self.by_id.clear()
+            self.loaded_at = 0.0
+            self.table_version = None
+
+    def stats(self):
+        with self.lock:
+            return {
+                "name": self.name,
+                "version": self.version,
+                "table_version": self.table_version,
+                "entries": len(self.by_id),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+
+item_cache = ReferenceCache("items", Items, ItemSerializer)
+remark_cache = ReferenceCache("remarks", Remarks, RemarkSerializer)
+tax_cache = ReferenceCache("tax", Tax, TaxSerializer)
+
+REFERENCE_CACHES = {
+    Items: item_cache,
+    Remarks: remark_cache,
+    Tax: tax_cache,
+}
@@ -1,11 +1,16 @@
 import logging
 import traceback
-from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from .fieldsets import InvalidFieldset, only_fields, requested_fields
 from .models import Company, FinancialYear
-from .serializers import CompanySerializer, FinancialYearSerializer
+from .purge import enqueue_deletion
+from .responses import api_response
+from .serializers import CompanySerializer, FinancialYearSerializer, JobSerializer
+from .versions import versioned_etag
 
 # Setup logger
 logger = logging.getLogger(__name__)
@@ -18,50 +23,61 @@ class CompanyAPIView(APIView):
     Handles retrieving, updating, and deleting a single company.
     """
 
+    @method_decorator(condition(etag_func=versioned_etag('company')))
     def get(self, request, company_id=None, *args, **kwargs):
         try:
+            fields = requested_fields(request, CompanySerializer)
             if company_id:
-                company = Company.objects.filter(pk=company_id).first()
+                company = only_fields(Company.objects.filter(
+                    pk=company_id), fields).first()
                 if company is None:
                     logger.error(f"Company with ID {company_id} not found")
-                    return JsonResponse({
+                    return api_response(request, {
                         "error_code": 404,
                         "message": "Company not found",
                         "data": [],
                         "error": []
                     }, status=404)
 
-                serializer = CompanySerializer(company)
+                serializer = CompanySerializer(company, fields=fields)
                 logger.info(f"Fetched company: {company.name}")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 200,
                     "message": "Company found",
                     "data": [serializer.data],
                     "error": []
                 }, status=200)
             else:
-                companies = Company.objects.all()
+                companies = only_fields(Company.objects.all(), fields)
                 if not companies:
                     logger.warning("No companies found")
-                    return JsonResponse({
+                    return api_response(request, {
                         "error_code": 400,
                         "message": "No data found",
                         "data": [],
                         "error": []
                     }, status=400)
 
-                serializer = CompanySerializer(companies, many=True)
+                serializer = CompanySerializer(companies, many=True, fields=fields)
                 logger.info("Fetched all companies")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 200,
                     "message": "Data found",
                     "data": serializer.data,
                     "error": []
                 }, status=200)
 
+        except InvalidFieldset as e:
+            return api_response(request, {
+                "error_code": 400,
+                "message": "Invalid fields",
+                "data": [],
+                "error": [str(e)]
+            }, status=400)
+
         except Exception as e:
             logger.error(f"Internal Server Error: {str(e)}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -76,7 +92,7 @@ class CompanyAPIView(APIView):
                 serializer.save()
                 logger.info(f"Created company: {serializer.data['name']}")
 
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 200,
                     "message": "Company created successfully",
                     "data": [serializer.data],
@@ -84,7 +100,7 @@ class CompanyAPIView(APIView):
                 }, status=201)
 
             logger.error(f"Failed to create company: {serializer.errors}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 400,
                 "message": "Validation failed",
                 "data": [],
@@ -93,7 +109,7 @@ class CompanyAPIView(APIView):
 
         except Exception as e:
             logger.error(f"Internal Server Error: {str(e)}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -105,7 +121,7 @@ class CompanyAPIView(APIView):
             company = Company.objects.filter(pk=company_id).first()
             if company is None:
                 logger.error(f"Company with ID {company_id} not found")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 404,
                     "message": "Company not found",
                     "data": [],
@@ -116,7 +132,7 @@ class CompanyAPIView(APIView):
             if serializer.is_valid():
                 serializer.save()
                 logger.info(f"Updated company: {company.name}")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 200,
                     "message": "Company updated successfully",
                     "data": [serializer.data],
@@ -124,7 +140,7 @@ class CompanyAPIView(APIView):
                 }, status=200)
 
             logger.error(f"Failed to update company: {serializer.errors}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 400,
                 "message": "Validation failed",
                 "data": [],
@@ -133,7 +149,7 @@ class CompanyAPIView(APIView):
 
         except Exception as e:
             logger.error(f"Internal Server Error: {str(e)}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -145,26 +161,25 @@ class CompanyAPIView(APIView):
             company = Company.objects.filter(pk=company_id).first()
             if company is None:
                 logger.error(f"Company with ID {company_id} not found")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 404,
                     "message": "Company not found",
                     "data": [],
                     "error": []
                 }, status=404)
 
-            company_name = company.name
-            company.delete()
-            logger.info(f"Deleted company: {company_name}")
-            return JsonResponse({
-                "error_code": 200,
-                "message": "Company deleted successfully",
-                "data": [],
+            job = enqueue_deletion('company', company.pk)
+            logger.info(f"Queued deletion of company {company.name}: job {job.job_id}")
+            return api_response(request, {
+                "error_code": 202,
+                "message": "Company deletion queued",
+                "data": JobSerializer(job).data,
                 "error": []
-            }, status=200)
+            }, status=202)
 
         except Exception as e:
             logger.error(f"Internal Server Error: {str(e)}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -177,43 +192,53 @@ class FinancialYearAPIView(APIView):
     Handles retrieving, creating, updating, and deleting financial year.
     """
 
+    @method_decorator(condition(etag_func=versioned_etag('financial_year')))
     def get(self, request, financial_year_id=None, *args, **kwargs):
         try:
+            fields = requested_fields(request, FinancialYearSerializer)
             if financial_year_id:
-                financial_year = FinancialYear.objects.filter(
-                    financial_year_id=financial_year_id).first()
+                financial_year = only_fields(FinancialYear.objects.filter(
+                    financial_year_id=financial_year_id), fields).first()
                 if not financial_year:
                     logger.error(f"Financial Year with ID {
                                  financial_year_id} not found")
-                    return JsonResponse({
+                    return api_response(request, {
                         "error_code": 404,
                         "message": "Financial Year not found",
                         "data": [],
                         "error": []
                     }, status=404)
 
-                serializer = FinancialYearSerializer(financial_year)
+                serializer = FinancialYearSerializer(financial_year, fields=fields)
                 logger.info(f"Fetched Financial Year: {
                             financial_year.financial_year_id}")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 200,
                     "message": "Financial Year found",
                     "data": [serializer.data],
                     "error": []
                 }, status=200)
 
-            financial_years = FinancialYear.objects.all()
-            serializer = FinancialYearSerializer(financial_years, many=True)
-            return JsonResponse({
+            financial_years = only_fields(FinancialYear.objects.all(), fields)
+            serializer = FinancialYearSerializer(financial_years, many=True, fields=fields)
+            return api_response(request, {
                 "error_code": 200,
                 "message": "Data found",
                 "data": serializer.data,
                 "error": []
             }, status=200)
 
+        except InvalidFieldset as e:
+            return api_response(request, {
+                "error_code": 400,
+                "message": "Invalid fields",
+                "data": [],
+                "error": [str(e)]
+            }, status=400)
+
         except Exception as e:
             logger.error(f"Internal Server Error: {str(e)}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -225,7 +250,7 @@ class FinancialYearAPIView(APIView):
             company_id = request.data.get('company')
             if not Company.objects.filter(id=company_id).exists():
                 logger.error(f"Company with ID {company_id} does not exist.")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 400,
                     "message": "Invalid Company",
                     "data": [],
@@ -237,7 +262,7 @@ class FinancialYearAPIView(APIView):
                 serializer.save()
                 logger.info(f"Created Financial Year: {
                             serializer.data['financial_year_id']}")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 201,
                     "message": "Financial Year created successfully",
                     "data": [serializer.data],
@@ -246,7 +271,7 @@ class FinancialYearAPIView(APIView):
 
             logger.error(f"Failed to create Financial Year: {
                          serializer.errors}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 400,
                 "message": "Invalid data",
                 "data": [],
@@ -255,7 +280,7 @@ class FinancialYearAPIView(APIView):
 
         except Exception as e:
             logger.error(f"Internal Server Error: {str(e)}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -269,7 +294,7 @@ class FinancialYearAPIView(APIView):
             if not financial_year:
                 logger.error(f"Financial Year with ID {
                              financial_year_id} not found")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 404,
                     "message": "Financial Year not found",
                     "data": [],
@@ -282,7 +307,7 @@ class FinancialYearAPIView(APIView):
                 serializer.save()
                 logger.info(f"Updated Financial Year: {
                             financial_year.financial_year_id}")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 200,
                     "message": "Financial Year updated successfully",
                     "data": [serializer.data],
@@ -291,7 +316,7 @@ class FinancialYearAPIView(APIView):
 
             logger.error(f"Failed to update Financial Year: {
                          serializer.errors}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 400,
                 "message": "Invalid data",
                 "data": [],
@@ -300,7 +325,7 @@ class FinancialYearAPIView(APIView):
 
         except Exception as e:
             logger.error(f"Internal Server Error: {str(e)}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -314,7 +339,7 @@ class FinancialYearAPIView(APIView):
             if not financial_year:
                 logger.error(f"Financial Year with ID {
                              financial_year_id} not found")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 404,
                     "message": "Financial Year not found",
                     "data": [],
@@ -323,7 +348,7 @@ class FinancialYearAPIView(APIView):
 
             financial_year.delete()
             logger.info(f"Deleted Financial Year: {financial_year_id}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 200,
                 "message": "Financial Year deleted successfully",
                 "data": [],
@@ -332,7 +357,7 @@ class FinancialYearAPIView(APIView):
 
         except Exception as e:
             logger.error(f"Internal Server Error: {str(e)}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -0,0 +1,64 @@
+from functools import lru_cache
+
+
+class InvalidFieldset(ValueError):
+    pass
+
+
+@lru_cache(maxsize=None)
+def serializer_field_names(serializer_class):
+    return tuple(serializer_class().fields)
+
+
+def split_names(value):
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+def requested_fields(request, serializer_class):
+    """
+    Field names picked with ?fields= and/or ?exclude=, in serializer order,
+    or None when the request asks for every field.
+    """
+    fields = split_names(request.GET.get('fields'))
+    exclude = split_names(request.GET.get('exclude'))
+    if not fields and not exclude:
+        return None
+
+    available = serializer_field_names(serializer_class)
+    unknown = set(fields).union(exclude).difference(available)
+    if unknown:
+        raise InvalidFieldset(f"Unknown fields: {', '.join(sorted(unknown))}")
+    selected = [name for name in available
+                if (not fields or name in fields) and name not in exclude]
+    if not selected:
+        raise InvalidFieldset("No fields left to return")
+    return selected
+
+
+def requested_expansions(request, serializer_class, fields=None):
+    """
+    Foreign keys named in ?expand=, in serializer order, leaving out those
+    the field selection already drops.
+    """
+    expand = split_names(request.GET.get('expand'))
+    unknown = set(expand).difference(serializer_class.expandable_fields)
+    if unknown:
+        raise InvalidFieldset(f"Cannot expand: {', '.join(sorted(unknown))}")
+    return tuple(name for name in serializer_field_names(serializer_class)
+                 if name in expand and (fields is None or name in fields))
+
+
+def only_fields(queryset, fields, *required):
+    """
+    Restricts the columns loaded for `queryset` to the requested fields,
+    plus any `required` ones the view needs itself.
+    """
+    if fields is None:
+        return queryset
+    return queryset.only(*fields, *required)
+
+
+def trim_rows(rows, fields):
+    if fields is None:
+        return rows
+    return [{name: row[name] for name in fields} for row in rows]
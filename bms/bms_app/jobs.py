@@ -0,0 +1,429 @@
+import io
+import logging
+import threading
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from rest_framework.views import APIView
+from .models import FinancialYear, Job
+from .pagination import InvalidPageRequest, get_page_size
+from .responses import api_response
+from .serializers import (ArchiveJobParamsSerializer, JobCreateSerializer, JobFilterSerializer,
+                          JobSerializer, RebuildRollupsJobParamsSerializer)
+
+# Setup logger
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Handlers by job kind, see job_handler.
+JOB_HANDLERS = {}
+
+# Kinds that may be queued through POST jobs/, with the serializer of
+# their params. Deletions are queued by the resources' own DELETE.
+API_JOB_KINDS = {}
+
+# First key of the advisory locks claim_job takes per company.
+JOB_LOCK_NAMESPACE = 4211
+
+
+class JobCancelled(Exception):
+    """
+    Raised in a handler by save_progress once the job is cancelled, or
+    taken over by another worker after its lease ran out.
+    """
+
+
+class Heartbeat(threading.Thread):
+    """
+    Renews a running job's lease every BMS_JOB_HEARTBEAT_SECONDS while its
+    handler runs, so handlers that never call save_progress, such as whole
+    management commands, are not taken over by another worker.
+
+    Once the job is cancelled or taken over, the handler's queries are
+    cancelled, which stops handlers that cannot check themselves.
+    """
+
+    def __init__(self, job):
+        super().__init__(name=f"job-{job.job_id}-heartbeat", daemon=True)
+        self.job = job
+        self.stopping = threading.Event()
+        self.stopped_job = False
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_backend_pid()")
+            self.backend_pid = cursor.fetchone()[0]
+
+    def run(self):
+        # The thread has a database connection of its own.
+        try:
+            while not self.stopping.wait(settings.BMS_JOB_HEARTBEAT_SECONDS):
+                renewed = Job.objects.filter(
+                    pk=self.job.pk, worker=self.job.worker, status='running',
+                    cancel_requested=False,
+                ).update(locked_until=lease_expiry(), updated_at=timezone.now())
+                if not renewed:
+                    # Again at each beat, until the handler gives up.
+                    self.stopped_job = True
+                    with connection.cursor() as cursor:
+                        cursor.execute("SELECT pg_cancel_backend(%s)", [self.backend_pid])
+        except Exception as e:
+            logger.error(f"Heartbeat of job {self.job.job_id} failed: {str(e)}")
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopping.set()
+        self.join()
+
+
+def job_handler(kind, params=None):
+    """
+    Registers the decorated function as the handler of `kind` jobs. It is
+    called with the Job and returns its JSON result. With a `params`
+    serializer, the kind can also be queued through the API.
+    """
+    def register(handler):
+        JOB_HANDLERS[kind] = handler
+        if params is not None:
+            API_JOB_KINDS[kind] = params
+        return handler
+    return register
+
+
+def lease_expiry():
+    return timezone.now() + timedelta(seconds=settings.BMS_JOB_LEASE_SECONDS)
+
+
+def retry_delay(attempts):
+    """
+    Seconds to wait before retrying a job that failed `attempts` times.
+    """
+    return min(settings.BMS_JOB_RETRY_DELAY_SECONDS * 2 ** (attempts - 1),
+               settings.BMS_JOB_RETRY_MAX_DELAY_SECONDS)
+
+
+def enqueue_job(kind, params=None, company_id=None, max_attempts=None):
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    return Job.objects.create(
+        kind=kind, params=params or {}, company_id=company_id,
+        max_attempts=max_attempts or settings.BMS_JOB_MAX_ATTEMPTS)
+
+
+def claim_job(worker, kinds=None):
+    """
+    Takes the oldest job that is due: queued, or running under a lease
+    that ran out. Concurrent workers skip each other's rows, and a
+    company's jobs are only taken while fewer than
+    BMS_JOB_COMPANY_CONCURRENCY of them run.
+    """
+    now = timezone.now()
+    live = Q(status='running', locked_until__gte=now)
+    busy = Job.objects.filter(live, company__isnull=False).values('company') \
+        .annotate(running=Count('pk')) \
+        .filter(running__gte=settings.BMS_JOB_COMPANY_CONCURRENCY).values('company')
+    due = Job.objects.filter(
+        Q(status='queued', run_after__lte=now) | Q(status='running', locked_until__lt=now)
+    ).exclude(company__in=busy)
+    if kinds:
+        due = due.filter(kind__in=kinds)
+
+    with transaction.atomic():
+        for job in due.select_for_update(skip_locked=True).order_by('job_id')[:10]:
+            if job.company_id is not None:
+                # Claims of one company's jobs take turns, so two workers
+                # cannot both see room for one more.
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)",
+                                   [JOB_LOCK_NAMESPACE, job.company_id])
+                running = Job.objects.filter(live, company_id=job.company_id).count()
+                if running >= settings.BMS_JOB_COMPANY_CONCURRENCY:
+                    continue
+            job.status = 'running'
+            job.worker = worker
+            job.attempts += 1
+            job.locked_until = lease_expiry()
+            job.started_at = job.started_at or now
+            job.save(update_fields=['status', 'worker', 'attempts', 'locked_until',
+                                    'started_at', 'updated_at'])
+            return job
+    return None
+
+
+def save_progress(job, **progress):
+    """
+    Saves `progress` into the job and renews its lease. Handlers call it
+    between units of work; it raises JobCancelled once the job is
+    cancelled or another worker has taken it over.
+    """
+    job.progress.update(progress)
+    job.locked_until = lease_expiry()
+    saved = Job.objects.filter(pk=job.pk, worker=job.worker, status='running',
+                               cancel_requested=False) \
+        .update(progress=job.progress, locked_until=job.locked_until,
+                updated_at=timezone.now())
+    if not saved:
+        raise JobCancelled(f"Job {job.job_id} was cancelled or taken over")
+
+
+def finish_job(job, status, **fields):
+    """
+    Records how the job ended, unless another worker has taken it over.
+    """
+    fields.update(status=status, locked_until=None, finished_at=timezone.now(),
+                  updated_at=timezone.now())
+    Job.objects.filter(pk=job.pk, worker=job.worker).update(**fields)
+
+
+def stop_job(job):
+    """
+    Records a job its heartbeat stopped as cancelled, if it was cancelled
+    rather than taken over. A cancel the heartbeat sent just before it
+    stopped may only land now, on this update, which then runs again; the
+    heartbeat has stopped, so no further one can follow.
+    """
+    for attempt in range(2):
+        try:
+            Job.objects.filter(pk=job.pk, worker=job.worker, cancel_requested=True) \
+                .update(status='cancelled', locked_until=None, finished_at=timezone.now(),
+                        updated_at=timezone.now())
+            break
+        except OperationalError:
+            if attempt:
+                raise
+    logger.info(f"Job {job.job_id} {job.kind} stopped")
+    return 'cancelled'
+
+
+def run_job(job):
+    """
+    Runs a claimed job's handler under a Heartbeat and records the
+    outcome: completed with its result, cancelled, queued again after
+    retry_delay, or failed once its attempts are used up. Returns the
+    job's new status.
+    """
+    heartbeat = Heartbeat(job)
+    heartbeat.start()
+    try:
+        result = JOB_HANDLERS[job.kind](job)
+    except Exception as e:
+        heartbeat.stop()
+        # A query failing once the heartbeat stopped the job was cancelled by it.
+        if isinstance(e, JobCancelled) or heartbeat.stopped_job:
+            return stop_job(job)
+
+        logger.error(f"Job {job.job_id} {job.kind} failed: {str(e)}")
+        error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            Job.objects.filter(pk=job.pk, worker=job.worker).update(
+                status='queued', locked_until=None, error=error, updated_at=timezone.now(),
+                run_after=timezone.now() + timedelta(seconds=retry_delay(job.attempts)))
+            return 'queued'
+        finish_job(job, 'failed', error=error)
+        return 'failed'
+
+    heartbeat.stop()
+    try:
+        finish_job(job, 'completed', result=result, error=None)
+    except OperationalError:
+        # The heartbeat's last cancel landed on this update instead of
+        # on the handler's queries.
+        if not heartbeat.stopped_job:
+            raise
+        return stop_job(job)
+    logger.info(f"Job {job.job_id} {job.kind} completed")
+    return 'completed'
+
+
+def cancel_job(job):
+    """
+    Cancels a queued job at once; a running one stops at its handler's
+    next save_progress or its heartbeat's next beat. Returns False if the
+    job had already finished.
+    """
+    with transaction.atomic():
+        job = Job.objects.select_for_update().get(pk=job.pk)
+        if job.status == 'queued':
+            job.status = 'cancelled'
+            job.finished_at = timezone.now()
+        elif job.status == 'running':
+            job.cancel_requested = True
+        else:
+            return False
+        job.save(update_fields=['status', 'cancel_requested', 'finished_at', 'updated_at'])
+        return True
+
+
+def command_output(name, *args, **options):
+    """
+    Runs a management command for a job, returning what it printed.
+    """
+    stdout = io.StringIO()
+    call_command(name, *args, stdout=stdout, **options)
+    return {'output': stdout.getvalue().splitlines()}
+
+
+@job_handler('rebuild_rollups', params=RebuildRollupsJobParamsSerializer)
+def rebuild_rollups_job(job):
+    options = {'company': job.params['company']} if job.params.get('company') else {}
+    return command_output('rebuild_rollups', **options)
+
+
+@job_handler('archive_financial_year', params=ArchiveJobParamsSerializer)
+def archive_financial_year_job(job):
+    return command_output('archive_financial_year', job.params['financial_year'])
+
+
+def job_company(kind, params):
+    """
+    The company a job works on, for the per-company concurrency limit.
+    """
+    if kind == 'archive_financial_year':
+        return FinancialYear.objects.values_list('company_id', flat=True) \
+            .get(pk=params['financial_year'])
+    return params.get('company')
+
+
+class JobAPIView(APIView):
+    """
+    Lists and queues background jobs, shows one job's status and progress,
+    and cancels it on DELETE.
+    """
+
+    def get(self, request, job_id=None, *args, **kwargs):
+        try:
+            if job_id:
+                job = Job.objects.filter(pk=job_id).first()
+                if job is None:
+                    return api_response(request, {
+                        "error_code": 404,
+                        "message": "Job not found",
+                        "data": [],
+                        "error": []
+                    }, status=404)
+                return api_response(request, {
+                    "error_code": 200,
+                    "message": "Data found",
+                    "data": JobSerializer(job).data,
+                    "error": []
+                }, status=200)
+
+            filters = JobFilterSerializer(data=request.GET)
+            if not filters.is_valid():
+                return api_response(request, {
+                    "error_code": 400,
+                    "message": "Validation failed",
+                    "data": [],
+                    "error": filters.errors
+                }, status=400)
+            jobs = Job.objects.filter(**filters.validated_data).order_by('-job_id')
+            data = JobSerializer(jobs[:get_page_size(request)], many=True).data
+            return api_response(request, {
+                "error_code": 200,
+                "message": "Data found" if data else "No jobs found",
+                "data": data,
+                "error": []
+            }, status=200)
+
+        except InvalidPageRequest as e:
+            return api_response(request, {
+                "error_code": 400,
+                "message": str(e),
+                "data": [],
+                "error": [str(e)]
+            }, status=400)
+
+        except Exception as e:
+            logger.error(f"Internal Server Error: {str(e)}")
+            return api_response(request, {
+                "error_code": 500,
+                "message": "Internal Server Error",
+                "data": [],
+                "error": traceback.format_exc().splitlines()
+            }, status=500)
+
+    def post(self, request, *args, **kwargs):
+        try:
+            serializer = JobCreateSerializer(data=request.data)
+            errors = {} if serializer.is_valid() else serializer.errors
+            if not errors and serializer.validated_data['kind'] not in API_JOB_KINDS:
+                errors = {'kind': [f"Must be one of: {', '.join(sorted(API_JOB_KINDS))}"]}
+            if errors:
+                return api_response(request, {
+                    "error_code": 400,
+                    "message": "Validation failed",
+                    "data": [],
+                    "error": errors
+                }, status=400)
+
+            kind = serializer.validated_data['kind']
+            params = API_JOB_KINDS[kind](data=serializer.validated_data['params'])
+            if not params.is_valid():
+                return api_response(request, {
+                    "error_code": 400,
+                    "message": "Validation failed",
+                    "data": [],
+                    "error": {'params': params.errors}
+                }, status=400)
+
+            values = params.validated_data
+            job = enqueue_job(kind, values, job_company(kind, values),
+                              serializer.validated_data.get('max_attempts'))
+            logger.info(f"Queued job {job.job_id}: {kind} {values}")
+            return api_response(request, {
+                "error_code": 202,
+                "message": "Job queued",
+                "data": JobSerializer(job).data,
+                "error": []
+            }, status=202)
+
+        except Exception as e:
+            logger.error(f"Internal Server Error: {str(e)}")
+            return api_response(request, {
+                "error_code": 500,
+                "message": "Internal Server Error",
+                "data": [],
+                "error": traceback.format_exc().splitlines()
+            }, status=500)
+
+    def delete(self, request, job_id, *args, **kwargs):
+        try:
+            job = Job.objects.filter(pk=job_id).first()
+            if job is None:
+                return api_response(request, {
+                    "error_code": 404,
+                    "message": "Job not found",
+                    "data": [],
+                    "error": []
+                }, status=404)
+
+            if not cancel_job(job):
+                return api_response(request, {
+                    "error_code": 409,
+                    "message": f"Job already {job.status}",
+                    "data": JobSerializer(job).data,
+                    "error": []
+                }, status=409)
+
+            job.refresh_from_db()
+            logger.info(f"Cancelled job {job.job_id}")
+            return api_response(request, {
+                "error_code": 202,
+                "message": "Job cancelled" if job.status == 'cancelled'
+                else "Job cancellation requested",
+                "data": JobSerializer(job).data,
+                "error": []
+            }, status=202)
+
+        except Exception as e:
+            logger.error(f"Internal Server Error: {str(e)}")
+            return api_response(request, {
+                "error_code": 500,
+                "message": "Internal Server Error",
+                "data": [],
+                "error": traceback.format_exc().splitlines()
+            }, status=500)
@@ -0,0 +1,40 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from bms_app import archive
+from bms_app.models import FinancialYear, TransactionArchive
+
+
+class Command(BaseCommand):
+    help = ("Moves the transactions of a closed (inactive) financial year "
+            "out of the transactions table into a compressed Parquet file. "
+            "Reads and reports on the year are served from the file.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('financial_year', type=int,
+                            help="FinancialYear ID to archive")
+        parser.add_argument('--directory',
+                            help="Archive directory, BMS_ARCHIVE_DIR by default")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("archive_financial_year requires PostgreSQL")
+        if archive.pa is None:
+            raise CommandError("archive_financial_year requires pyarrow")
+
+        year = FinancialYear.objects.filter(pk=options['financial_year']).first()
+        if year is None:
+            raise CommandError(
+                f"Financial Year with ID {options['financial_year']} not found")
+        if year.status != 'inactive':
+            raise CommandError(
+                f"Financial Year with ID {year.pk} is still active; "
+                "mark it inactive before archiving it")
+        if TransactionArchive.objects.filter(financial_year=year).exists():
+            raise CommandError(f"Financial Year with ID {year.pk} is already archived")
+
+        result = archive.archive_financial_year(year, options['directory'])
+        size = os.path.getsize(result.path)
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {result.rows} transactions of financial year {year.pk} "
+            f"to {result.path} ({size / 2**20:.1f} MiB)"))
@@ -0,0 +1,384 @@
+import calendar
+import json
+import logging
+import os
+import statistics
+import time
+import tracemalloc
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import urlencode
+from bms_app import urls as api_urls
+from bms_app.management.commands.bench_concurrency import percentile
+from bms_app.models import Company, GSTDetails, Items, Job, Party, Remarks, Tax, Transactions
+from bms_app.serializers import TransactionSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+def size_label(count):
+    for factor, suffix in ((10**6, 'M'), (10**3, 'k')):
+        if count >= factor:
+            return f"{round(count / factor)}{suffix}"
+    return str(count)
+
+
+def swapped(text):
+    """
+    `text` with its middle two characters transposed, a typical typo.
+    """
+    middle = len(text) // 2
+    return text[:middle - 1] + text[middle] + text[middle - 1] + text[middle + 1:]
+
+
+def scenario(name, method, url_name, kwargs=None, query='', body=None, setup=None):
+    """
+    One benchmarked request. `kwargs` and `body` may be callables taking
+    the object `setup` created, for requests that need a fresh row.
+    """
+    return {'name': name, 'method': method, 'url_name': url_name,
+            'kwargs': kwargs, 'query': query, 'body': body, 'setup': setup}
+
+
+def copy_of(instance, **changes):
+    """
+    Saves a new row with the same values as `instance`.
+    """
+    values = {field.attname: getattr(instance, field.attname)
+              for field in instance._meta.concrete_fields if not field.primary_key}
+    values.update(changes)
+    return type(instance).objects.create(**values)
+
+
+class Command(BaseCommand):
+    help = ("Benchmarks every API route in-process against the current (seeded) "
+            "database and compares p50/p95/p99 latency, queries per request and "
+            "peak memory with a JSON baseline. Writes are rolled back. Fails "
+            "when a scenario regresses past the threshold.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--baseline', default='bench_baseline.json',
+                            help="Baseline file to compare with or save to")
+        parser.add_argument('--save', action='store_true',
+                            help="Store this run as the baseline for its data size")
+        parser.add_argument('--label',
+                            help="Data size label of the run (default: from the "
+                                 "transaction count, e.g. 1M)")
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--page-sizes', type=int, nargs='+',
+                            default=[10, 100, 1000],
+                            help="Transaction list page sizes to benchmark")
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help="Allowed relative increase of p95 latency and "
+                                 "peak memory")
+        parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                            help="Latency increases smaller than this never fail")
+        parser.add_argument('--only', action='append',
+                            help="Run only scenarios whose name contains this")
+        parser.add_argument('--output', help="Also write this run's results here")
+
+    def handle(self, *args, **options):
+        transaction_count = Transactions.objects.count()
+        if not transaction_count:
+            raise CommandError("No transactions to benchmark; run seed_bms first")
+        label = options['label'] or size_label(transaction_count)
+
+        scenarios = self.build_scenarios(options['page_sizes'])
+        covered = {item['url_name'] for item in scenarios}
+        missing = sorted(pattern.name for pattern in api_urls.urlpatterns
+                         if pattern.name not in covered)
+        if missing:
+            raise CommandError(f"No benchmark scenario for routes: {', '.join(missing)}")
+        if options['only']:
+            scenarios = [item for item in scenarios
+                         if any(part in item['name'] for part in options['only'])]
+
+        client = Client(HTTP_HOST='localhost')
+        results = {}
+        logging.disable(logging.WARNING)
+        try:
+            for item in scenarios:
+                results[item['name']] = self.run_scenario(client, item, options)
+                self.write_result(item['name'], results[item['name']])
+        finally:
+            logging.disable(logging.NOTSET)
+
+        run = {'transactions': transaction_count, 'vendor': connection.vendor,
+               'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'scenarios': results}
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({label: run}, f, indent=2)
+
+        baselines = {}
+        if os.path.exists(options['baseline']):
+            with open(options['baseline']) as f:
+                baselines = json.load(f)
+
+        if options['save']:
+            baselines[label] = run
+            with open(options['baseline'], 'w') as f:
+                json.dump(baselines, f, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(
+                f"Saved baseline '{label}' to {options['baseline']}"))
+            return
+
+        if label not in baselines:
+            self.stdout.write(self.style.WARNING(
+                f"No baseline '{label}' in {options['baseline']}; "
+                "run with --save to record one"))
+            return
+        regressions = self.compare(baselines[label]['scenarios'], results, options)
+        if regressions:
+            raise CommandError("Performance regressions:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS(f"No regressions against baseline '{label}'"))
+
+    def build_scenarios(self, page_sizes):
+        trnx = Transactions.objects.order_by('transaction_id').first()
+        company = Company.objects.get(pk=trnx.company_id)
+        party = Party.objects.get(pk=trnx.party_id)
+        item = Items.objects.get(pk=trnx.product_id)
+        remark = Remarks.objects.get(pk=trnx.remark_id)
+        tax = Tax.objects.get(pk=trnx.tax_id)
+        gst = GSTDetails.objects.order_by('gst_id').first()
+        year = trnx.company_financial_year
+        month_start = (trnx.bill_date or year.from_date or date.today()).replace(day=1)
+        month_end = month_start.replace(
+            day=calendar.monthrange(month_start.year, month_start.month)[1])
+        transaction_body = dict(TransactionSerializer(trnx).data)
+        del transaction_body['transaction_id']
+        company_body = {'name': "Bench Company", 'phone': "0"}
+        party_body = {'name': "Bench Party", 'phone': "0"}
+        gst_body = {'company': company.pk, 'financial_year': year.pk, 'gst': "BENCH"}
+        report_query = f"?company={company.pk}&financial_year={year.pk}"
+
+        scenarios = [
+            scenario('root', 'get', 'sample-view'),
+            scenario('company list', 'get', 'company-list-create'),
+            scenario('company detail', 'get', 'company-detail-update-delete',
+                     {'company_id': company.pk}),
+            scenario('company create', 'post', 'company-list-create', body=company_body),
+            scenario('company update', 'put', 'company-detail-update-delete',
+                     {'company_id': company.pk},
+                     body={'name': company.name, 'phone': company.phone}),
+            scenario('company delete', 'delete', 'company-detail-update-delete',
+                     lambda new: {'company_id': new.pk},
+                     setup=lambda: Company.objects.create(**company_body)),
+            scenario('party list', 'get', 'party-list-create'),
+            scenario('party list sparse', 'get', 'party-list-create',
+                     query='?fields=party_id,name'),
+            scenario('party detail', 'get', 'party-detail-update-delete',
+                     {'party_id': party.pk}),
+            scenario('party create', 'post', 'party-list-create', body=party_body),
+            scenario('party update', 'put', 'party-detail-update-delete',
+                     {'party_id': party.pk},
+                     body={'name': party.name, 'phone': party.phone}),
+            scenario('party delete', 'delete', 'party-detail-update-delete',
+                     lambda new: {'party_id': new.pk},
+                     setup=lambda: Party.objects.create(**party_body)),
+            scenario('invoice list', 'get', 'invoice-list-create',
+                     query=f"?company={company.pk}&financial_year={year.pk}"),
+            scenario('invoice create', 'post', 'invoice-list-create',
+                     body={'company': company.pk, 'financial_year': year.pk,
+                           'party': party.pk}),
+            scenario('cache stats', 'get', 'reference-cache-stats'),
+            scenario('job list', 'get', 'job-list-create', query='?status=queued'),
+            scenario('job detail', 'get', 'job-detail-cancel',
+                     lambda new: {'job_id': new.pk},
+                     setup=lambda: Job.objects.create(kind='rebuild_rollups')),
+            scenario('job create', 'post', 'job-list-create',
+                     body={'kind': 'rebuild_rollups', 'params': {'company': company.pk}}),
+            scenario('job cancel', 'delete', 'job-detail-cancel',
+                     lambda new: {'job_id': new.pk},
+                     setup=lambda: Job.objects.create(kind='rebuild_rollups')),
+            scenario('gst list', 'get', 'gst-list-create'),
+            scenario('gst create', 'post', 'gst-list-create', body=gst_body),
+            scenario('transaction detail', 'get', 'transaction-detail-update-delete',
+                     {'trnx_id': trnx.pk}),
+            scenario('transaction detail expanded', 'get',
+                     'transaction-detail-update-delete', {'trnx_id': trnx.pk},
+                     query='?expand=' + ','.join(TransactionSerializer.expandable_fields)),
+            scenario('transaction create', 'post', 'transaction-list-create',
+                     body=transaction_body),
+            scenario('transaction create numbered', 'post', 'transaction-list-create',
+                     body={**transaction_body, 'bill_no': None}),
+            scenario('transaction update', 'put', 'transaction-detail-update-delete',
+                     {'trnx_id': trnx.pk}, body=transaction_body),
+            scenario('transaction delete', 'delete', 'transaction-detail-update-delete',
+                     lambda new: {'trnx_id': new.pk}, setup=lambda: copy_of(trnx)),
+            scenario('transaction bulk create 100', 'post', 'transaction-bulk-create',
+                     body=[transaction_body] * 100),
+            scenario('party summary month', 'get', 'report-party-summary',
+                     query=f"{report_query}&from_date={month_start}&to_date={month_end}"),
+            scenario('party summary year', 'get', 'report-party-summary',
+                     query=report_query),
+            scenario('gst summary year', 'get', 'report-gst-summary',
+                     query=report_query),
+            scenario('gst summary month', 'get', 'report-gst-summary',
+                     query=f"{report_query}&month={month_start}"),
+            scenario('party search', 'get', 'party-search',
+                     query='?' + urlencode({'q': party.name[:6]})),
+            scenario('party search typo', 'get', 'party-search',
+                     query='?' + urlencode({'q': swapped(party.name[:8])})),
+            scenario('item search', 'get', 'item-search',
+                     query='?' + urlencode({'q': item.item_name[:6]})),
+            scenario('async party list', 'get', 'async-party-list'),
+            scenario('async party detail', 'get', 'async-party-detail',
+                     {'party_id': party.pk}),
+            scenario('async transaction detail', 'get', 'async-transaction-detail',
+                     {'trnx_id': trnx.pk}),
+        ]
+        if gst is not None:
+            scenarios += [
+                scenario('gst detail', 'get', 'gst-detail-update-delete',
+                         {'gst_id': gst.pk}),
+                scenario('gst update', 'put', 'gst-detail-update-delete',
+                         {'gst_id': gst.pk}, body=gst_body),
+            ]
+        scenarios.append(scenario(
+            'gst delete', 'delete', 'gst-detail-update-delete',
+            lambda new: {'gst_id': new.pk},
+            setup=lambda: GSTDetails.objects.create(
+                company=company, financial_year=year, gst="BENCH")))
+
+        for prefix, model, instance, key in [
+                ('item', Items, item, 'item_id'), ('remark', Remarks, remark, 'remark_id'),
+                ('tax', Tax, tax, 'tax_id')]:
+            body = {'item': {'item_name': "Bench Item"},
+                    'remark': {'remark': "Bench Remark"},
+                    'tax': {'tax_percentage': "5.00"}}[prefix]
+            scenarios += [
+                scenario(f"{prefix} list", 'get', f"{prefix}-list-create"),
+                scenario(f"{prefix} detail", 'get', f"{prefix}-detail-update-delete",
+                         {key: instance.pk}),
+                scenario(f"{prefix} create", 'post', f"{prefix}-list-create", body=body),
+                scenario(f"{prefix} update", 'put', f"{prefix}-detail-update-delete",
+                         {key: instance.pk}, body=body),
+                scenario(f"{prefix} delete", 'delete', f"{prefix}-detail-update-delete",
+                         lambda new, key=key: {key: new.pk},
+                         setup=lambda model=model, body=body: model.objects.create(**body)),
+                scenario(f"async {prefix} list", 'get', f"async-{prefix}-list"),
+                scenario(f"async {prefix} detail", 'get', f"async-{prefix}-detail",
+                         {'pk': instance.pk}),
+            ]
+
+        for page_size in page_sizes:
+            scenarios += [
+                scenario(f"transaction list {page_size}", 'get', 'transaction-list-create',
+                         query=f"?page_size={page_size}"),
+                scenario(f"async transaction list {page_size}", 'get',
+                         'async-transaction-list', query=f"?page_size={page_size}"),
+            ]
+        scenarios += [
+            scenario(f"transaction list {page_sizes[-1]} expanded", 'get',
+                     'transaction-list-create',
+                     query=f"?page_size={page_sizes[-1]}&expand="
+                           + ','.join(TransactionSerializer.expandable_fields)),
+            scenario(f"transaction list {page_sizes[-1]} with total", 'get',
+                     'transaction-list-create',
+                     query=f"?page_size={page_sizes[-1]}&approx_total=1"),
+            scenario('transaction list party month', 'get', 'transaction-list-create',
+                     query=f"?party={party.pk}&company={company.pk}"
+                           f"&from_date={month_start}&to_date={month_end}"),
+            scenario('transaction list by bill_no desc', 'get', 'transaction-list-create',
+                     query=f"?company={company.pk}&ordering=-bill_no"),
+            scenario('transaction list bill_no lookup', 'get', 'transaction-list-create',
+                     query='?' + urlencode({'bill_no': trnx.bill_no or ''})),
+        ]
+        return scenarios
+
+    def send(self, client, item):
+        """
+        Issues the scenario's request once and returns the response, its
+        latency and its query count. Requests other than GET run in a
+        transaction that is rolled back, so the data stays as seeded.
+        """
+        if item['method'] == 'get':
+            return self.request(client, item, None)
+        try:
+            with transaction.atomic():
+                created = item['setup']() if item['setup'] else None
+                result = self.request(client, item, created)
+                raise Rollback
+        except Rollback:
+            return result
+
+    def request(self, client, item, created):
+        kwargs = item['kwargs']
+        if callable(kwargs):
+            kwargs = kwargs(created)
+        path = reverse(item['url_name'], kwargs=kwargs) + item['query']
+        method = getattr(client, item['method'])
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            if item['body'] is None:
+                response = method(path)
+            else:
+                response = method(path, data=json.dumps(item['body'], default=str),
+                                  content_type='application/json')
+            seconds = time.perf_counter() - started
+        return response, seconds, len(captured)
+
+    def run_scenario(self, client, item, options):
+        for _ in range(options['warmup']):
+            self.send(client, item)
+
+        latencies, queries, statuses = [], [], set()
+        for _ in range(options['iterations']):
+            response, seconds, query_count = self.send(client, item)
+            latencies.append(seconds)
+            queries.append(query_count)
+            statuses.add(response.status_code)
+
+        tracemalloc.start()
+        try:
+            self.send(client, item)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'iterations': options['iterations'],
+            'status': sorted(statuses),
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'mean_ms': statistics.fmean(latencies) * 1000,
+            'queries': max(queries),
+            'peak_memory_kb': peak / 1024,
+        }
+
+    def write_result(self, name, result):
+        self.stdout.write(
+            f"{name:<40} p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+            f"p99 {result['p99_ms']:8.2f} ms  {result['queries']:3d} queries  "
+            f"{result['peak_memory_kb']:9.0f} KiB  status {result['status']}")
+
+    def compare(self, baseline, results, options):
+        regressions = []
+        threshold = 1 + options['threshold']
+        for name, result in results.items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            if (result['p95_ms'] > before['p95_ms'] * threshold
+                    and result['p95_ms'] - before['p95_ms'] > options['min_delta_ms']):
+                regressions.append(
+                    f"{name}: p95 {before['p95_ms']:.2f} ms -> {result['p95_ms']:.2f} ms")
+            if result['queries'] > before['queries']:
+                regressions.append(
+                    f"{name}: {before['queries']} -> {result['queries']} queries per request")
+            if result['peak_memory_kb'] > before['peak_memory_kb'] * threshold:
+                regressions.append(
+                    f"{name}: peak memory {before['peak_memory_kb']:.0f} KiB -> "
+                    f"{result['peak_memory_kb']:.0f} KiB")
+            if result['status'] != before['status']:
+                regressions.append(
+                    f"{name}: status {before['status']} -> {result['status']}")
+        return regressions
@@ -0,0 +1,94 @@
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import urlopen
+from django.core.management.base import BaseCommand
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Command(BaseCommand):
+    help = ("Measures cheap-lookup latency under mixed load against a running "
+            "deployment. Run it once against the sync routes served by a WSGI "
+            "server and once against the async/ routes served by an ASGI "
+            "server, e.g. `gunicorn bms.wsgi` and `uvicorn bms.asgi:application`.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000/api/v1/',
+                            help="Prefix of the routes, e.g. .../api/v1/async/")
+        parser.add_argument('--cheap-path', action='append',
+                            help="Cheap route to poll, repeatable (default: items/ and parties/1/)")
+        parser.add_argument('--heavy-path', default='transaction/?page_size=1000',
+                            help="Slow route kept busy in the background")
+        parser.add_argument('--clients', type=int, default=200,
+                            help="Concurrent clients issuing cheap requests")
+        parser.add_argument('--heavy-clients', type=int, default=4,
+                            help="Concurrent clients issuing heavy requests")
+        parser.add_argument('--duration', type=float, default=30.0,
+                            help="Seconds to run")
+        parser.add_argument('--timeout', type=float, default=30.0,
+                            help="Per-request timeout in seconds")
+        parser.add_argument('--output', help="Write the summary as JSON to this file")
+
+    def handle(self, *args, **options):
+        base_url = options['base_url'].rstrip('/') + '/'
+        cheap_paths = options['cheap_path'] or ['items/', 'parties/1/']
+        deadline = time.monotonic() + options['duration']
+        results = {'cheap': [], 'heavy': []}
+        errors = {'cheap': 0, 'heavy': 0}
+        lock = threading.Lock()
+
+        def client(kind, paths):
+            latencies, failures, index = [], 0, 0
+            while time.monotonic() < deadline:
+                url = base_url + paths[index % len(paths)]
+                index += 1
+                started = time.perf_counter()
+                try:
+                    with urlopen(url, timeout=options['timeout']) as response:
+                        response.read()
+                    latencies.append(time.perf_counter() - started)
+                except (HTTPError, URLError, OSError):
+                    failures += 1
+            with lock:
+                results[kind].extend(latencies)
+                errors[kind] += failures
+
+        workers = options['clients'] + options['heavy_clients']
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for _ in range(options['heavy_clients']):
+                pool.submit(client, 'heavy', [options['heavy_path']])
+            for _ in range(options['clients']):
+                pool.submit(client, 'cheap', cheap_paths)
+
+        summary = {'base_url': base_url, 'clients': options['clients'],
+                   'heavy_clients': options['heavy_clients'],
+                   'duration': options['duration']}
+        for kind, samples in results.items():
+            summary[kind] = {
+                'requests': len(samples),
+                'errors': errors[kind],
+                'throughput': len(samples) / options['duration'],
+                'mean_ms': statistics.fmean(samples) * 1000 if samples else None,
+                'p50_ms': (percentile(samples, 0.50) or 0) * 1000,
+                'p95_ms': (percentile(samples, 0.95) or 0) * 1000,
+                'p99_ms': (percentile(samples, 0.99) or 0) * 1000,
+            }
+            self.stdout.write(
+                f"{kind:>5}: {summary[kind]['requests']} ok, {errors[kind]} errors, "
+                f"{summary[kind]['throughput']:.1f} req/s, "
+                f"p50 {summary[kind]['p50_ms']:.1f} ms, "
+                f"p95 {summary[kind]['p95_ms']:.1f} ms, "
+                f"p99 {summary[kind]['p99_ms']:.1f} ms")
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(summary, f, indent=2)
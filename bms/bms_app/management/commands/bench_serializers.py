@@ -0,0 +1,105 @@
+import json
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from bms_app.models import Party, Transactions
+from bms_app.rowencoders import row_encoder
+from bms_app.serializers import PartySerializer, TransactionSerializer
+
+
+def money(rng, low, high):
+    return Decimal(rng.randint(low * 100, high * 100)) / 100
+
+
+def transaction_row(rng, pk):
+    quantity = rng.randint(1, 500)
+    rate = money(rng, 10, 5000)
+    amount = rate * quantity
+    percentage = money(rng, 0, 3)
+    brokerage = (amount * percentage / 100).quantize(Decimal('0.01'))
+    return (pk, f"B{pk}", None if pk % 50 == 0 else date(2024, 4, 1) + timedelta(pk % 365),
+            rng.choice([None, f"PB{pk}"]), quantity, rate, amount, percentage,
+            brokerage, (brokerage * Decimal('0.18')).quantize(Decimal('0.01')),
+            (amount * Decimal('0.05')).quantize(Decimal('0.01')),
+            rng.choice(['active', 'inactive']), rng.randint(1, 5000),
+            rng.randint(1, 5000), rng.randint(1, 200), rng.randint(1, 5),
+            rng.randint(1, 20), rng.randint(1, 3), rng.randint(1, 9))
+
+
+def party_row(rng, pk):
+    return (pk, f"Party {pk}", f"{pk} Market Road", rng.choice([None, "Near Station"]),
+            rng.choice(["Surat", "Mumbai", None]), "Gujarat", "395003",
+            f"98{pk:08d}"[:10], None, rng.choice([None, f"party{pk}@example.com"]),
+            rng.choice([None, "Manager"]), "buyer", f"24AAACB{pk % 10000:04d}F1Z5",
+            rng.choice([None, f"INV{pk}"]), rng.choice([None, date(2024, 4, 1)]))
+
+
+BENCHMARKS = {
+    'transactions': (Transactions, TransactionSerializer, transaction_row),
+    'party': (Party, PartySerializer, party_row),
+}
+
+
+class Command(BaseCommand):
+    help = ("Compares the list serializer with the values_list() row encoders "
+            "on in-memory rows: checks the JSON is byte-identical and reports "
+            "rows per second for each path.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+',
+                            default=[1000, 100000, 1000000],
+                            help="Row counts to benchmark")
+        parser.add_argument('--model', choices=sorted(BENCHMARKS), action='append',
+                            help="Model to benchmark, repeatable (default: all)")
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help="Rows generated and encoded at a time")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help="Write the results as JSON to this file")
+
+    def handle(self, *args, **options):
+        results = []
+        for name in options['model'] or sorted(BENCHMARKS):
+            model, serializer_class, make_row = BENCHMARKS[name]
+            encoder = row_encoder(serializer_class)
+            for total in options['rows']:
+                rng = random.Random(options['seed'])
+                serializer_seconds = encoder_seconds = 0.0
+                for start in range(0, total, options['chunk_size']):
+                    stop = min(total, start + options['chunk_size'])
+                    rows = [make_row(rng, pk) for pk in range(start + 1, stop + 1)]
+                    instances = [model(**dict(zip(encoder.columns, row))) for row in rows]
+
+                    started = time.perf_counter()
+                    expected = serializer_class(instances, many=True).data
+                    serializer_seconds += time.perf_counter() - started
+
+                    started = time.perf_counter()
+                    actual = encoder.encode_rows(rows)
+                    encoder_seconds += time.perf_counter() - started
+
+                    if (json.dumps(expected, cls=DjangoJSONEncoder)
+                            != json.dumps(actual, cls=DjangoJSONEncoder)):
+                        raise CommandError(
+                            f"{name}: encoder output differs from the serializer "
+                            f"in rows {start + 1}-{stop}")
+
+                result = {
+                    'model': name,
+                    'rows': total,
+                    'serializer_rows_per_second': total / serializer_seconds,
+                    'encoder_rows_per_second': total / encoder_seconds,
+                    'speedup': serializer_seconds / encoder_seconds,
+                }
+                results.append(result)
+                self.stdout.write(
+                    f"{name:>12} {total:>8} rows: serializer "
+                    f"{result['serializer_rows_per_second']:>10,.0f} rows/s, encoder "
+                    f"{result['encoder_rows_per_second']:>10,.0f} rows/s "
+                    f"({result['speedup']:.1f}x), output identical")
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
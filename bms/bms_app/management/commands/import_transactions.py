@@ -0,0 +1,292 @@
+import csv
+import json
+import os
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from bms_app.models import FinancialYear, Items, Party, Remarks, Tax, TransactionArchive, Transactions, TransactionImport
+from bms_app.pgcopy import copy_rows
+from bms_app.rollup import rollup_merge_sql
+
+STAGING_TABLE = "transactions_import_staging"
+
+COPY_COLUMNS = [
+    'bill_no', 'bill_date', 'party_id', 'party_bill_no', 'seller_party_id',
+    'product_id', 'quantity', 'rate', 'amount', 'brokerage_percentage',
+    'brokerage_amount', 'brokerage_gst', 'tax_id', 'tax_amount', 'remark_id',
+    'status', 'company_id', 'company_financial_year_id',
+]
+
+DECIMAL_COLUMNS = ['rate', 'amount', 'brokerage_percentage',
+                   'brokerage_amount', 'brokerage_gst', 'tax_amount']
+
+
+def lookup_key(value):
+    if isinstance(value, Decimal):
+        value = format(value.normalize(), 'f')
+    return ' '.join(str(value).split()).casefold()
+
+
+def build_lookup(queryset, *fields):
+    """
+    Maps the normalised value of each field to the row's primary key.
+    When names repeat, the oldest row wins.
+    """
+    lookup = {}
+    for pk, *values in queryset.order_by('-pk').values_list('pk', *fields):
+        for value in values:
+            if value is not None:
+                lookup[lookup_key(value)] = pk
+    return lookup
+
+
+class Command(BaseCommand):
+    help = ("Loads transactions from a CSV or NDJSON file into a financial "
+            "year through PostgreSQL COPY.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help="CSV or NDJSON file to import")
+        parser.add_argument('--financial-year', type=int, required=True,
+                            help="FinancialYear ID the rows belong to")
+        parser.add_argument('--format', choices=['csv', 'ndjson'],
+                            help="Input format, guessed from the extension by default")
+        parser.add_argument('--batch-size', type=int, default=50000,
+                            help="Rows committed per batch")
+        parser.add_argument('--date-format', default='%Y-%m-%d',
+                            help="strptime format of bill_date")
+        parser.add_argument('--rejects',
+                            help="File for rejected rows, defaults to <source>.rejected")
+        parser.add_argument('--resume', action='store_true',
+                            help="Continue the unfinished import of this file")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("import_transactions requires PostgreSQL")
+
+        source = os.path.abspath(options['source'])
+        if not os.path.exists(source):
+            raise CommandError(f"{source} does not exist")
+        file_format = options['format'] or (
+            'csv' if source.lower().endswith('.csv') else 'ndjson')
+
+        financial_year = FinancialYear.objects.filter(
+            pk=options['financial_year']).first()
+        if financial_year is None:
+            raise CommandError(
+                f"Financial Year with ID {options['financial_year']} not found")
+        if TransactionArchive.objects.filter(financial_year=financial_year).exists():
+            raise CommandError(
+                f"Financial Year with ID {options['financial_year']} is archived")
+        if financial_year.company.status != 'active':
+            raise CommandError(
+                f"Company with ID {financial_year.company_id} is inactive")
+
+        run = self.get_import_run(source, financial_year, options['resume'])
+        self.date_format = options['date_format']
+        # Inactive rows, including those pending deletion, take no new
+        # transactions.
+        self.lookups = {
+            'party': build_lookup(Party.objects.filter(status='active'), 'name'),
+            'product': build_lookup(Items.objects.filter(status='active'), 'item_name'),
+            'tax': build_lookup(Tax.objects.filter(status='active'),
+                                'tax_percentage', 'description'),
+            'remark': build_lookup(Remarks.objects.filter(status='active'), 'remark'),
+        }
+        self.max_lengths = {
+            field.name: field.max_length for field in Transactions._meta.fields
+            if getattr(field, 'max_length', None)}
+        self.decimal_fields = {
+            name: Transactions._meta.get_field(name) for name in DECIMAL_COLUMNS}
+
+        rejects_path = options['rejects'] or f"{source}.rejected"
+        records = islice(self.read_records(source, file_format),
+                         run.records_done, None)
+        started = time.monotonic()
+        processed = 0
+
+        with open(rejects_path, 'a' if options['resume'] else 'w',
+                  newline='') as rejects_file:
+            while True:
+                batch = list(islice(records, options['batch_size']))
+                if not batch:
+                    break
+
+                rows, rejected = [], []
+                for record in batch:
+                    try:
+                        rows.append(self.convert(record, financial_year))
+                    except KeyError as e:
+                        rejected.append((record, f"Missing column: {e.args[0]}"))
+                    except (ValueError, TypeError, InvalidOperation) as e:
+                        rejected.append((record, str(e) or "Invalid number"))
+
+                with transaction.atomic():
+                    self.load_batch(rows)
+                    run.records_done += len(batch)
+                    run.rows_imported += len(rows)
+                    run.rows_rejected += len(rejected)
+                    run.save()
+                    # On disk before the progress commits, so --resume never
+                    # skips a batch whose rejects were lost. A crash before
+                    # the commit repeats them instead.
+                    self.write_rejects(rejects_file, file_format, rejected)
+                processed += len(batch)
+                rate = processed / max(time.monotonic() - started, 1e-6)
+                self.stdout.write(
+                    f"{run.records_done} records read, {run.rows_imported} imported, "
+                    f"{run.rows_rejected} rejected ({rate:.0f} records/s)")
+
+        run.status = 'completed'
+        run.save()
+        self.stdout.write(self.style.SUCCESS(
+            f"Import {run.import_id} completed: {run.rows_imported} rows imported, "
+            f"{run.rows_rejected} rejected"))
+        if run.rows_rejected:
+            self.stdout.write(f"Rejected rows written to {rejects_path}")
+
+    def get_import_run(self, source, financial_year, resume):
+        unfinished = TransactionImport.objects.filter(
+            source=source, financial_year=financial_year,
+            status='running').order_by('-import_id').first()
+        if resume:
+            if unfinished is None:
+                raise CommandError(f"No unfinished import of {source} to resume")
+            self.stdout.write(
+                f"Resuming import {unfinished.import_id} after "
+                f"{unfinished.records_done} records")
+            return unfinished
+        if unfinished is not None:
+            raise CommandError(
+                f"Import {unfinished.import_id} of {source} is unfinished; "
+                "pass --resume to continue it")
+        return TransactionImport.objects.create(
+            source=source, financial_year=financial_year)
+
+    def read_records(self, source, file_format):
+        with open(source, newline='', encoding='utf-8') as f:
+            if file_format == 'csv':
+                yield from csv.DictReader(f)
+            else:
+                for line in f:
+                    if line.strip():
+                        try:
+                            yield json.loads(line)
+                        except ValueError:
+                            yield line.rstrip('\n')
+
+    def convert(self, record, financial_year):
+        """
+        Turns one input record into a row of COPY_COLUMNS, resolving names
+        to IDs. Raises KeyError, ValueError or TypeError for rows to reject.
+        """
+        if not isinstance(record, dict):
+            raise ValueError("Not a JSON object")
+        values = {}
+        for name in ('bill_no', 'party_bill_no'):
+            value = self.text(record, name)
+            if value is not None and len(value) > self.max_lengths[name]:
+                raise ValueError(f"{name} is longer than {self.max_lengths[name]}")
+            values[name] = value
+
+        bill_date = self.text(record, 'bill_date')
+        values['bill_date'] = datetime.strptime(
+            bill_date, self.date_format).date() if bill_date else None
+
+        for column, lookup in (('party', 'party'), ('seller_party', 'party'),
+                               ('product', 'product'), ('tax', 'tax'),
+                               ('remark', 'remark')):
+            name = record.get(column)
+            pk = self.resolve(lookup, name) if name else None
+            if pk is None:
+                raise ValueError(f"Unknown or inactive {column}: {name!r}")
+            values[f"{column}_id"] = pk
+
+        values['quantity'] = self.integer(record, 'quantity')
+        for name, field in self.decimal_fields.items():
+            value = Decimal(str(record[name]).strip())
+            if not value.is_finite():
+                raise ValueError(f"{name} {value} is not a number")
+            value = value.quantize(Decimal(1).scaleb(-field.decimal_places))
+            if value.adjusted() >= field.max_digits - field.decimal_places:
+                raise ValueError(f"{name} {value} is out of range")
+            values[name] = value
+
+        values['status'] = self.text(record, 'status') or 'active'
+        if values['status'] not in ('active', 'inactive'):
+            raise ValueError(f"Invalid status: {values['status']!r}")
+        values['company_id'] = financial_year.company_id
+        values['company_financial_year_id'] = financial_year.financial_year_id
+        return [values[column] for column in COPY_COLUMNS]
+
+    def text(self, record, name):
+        """
+        The record's `name` value, or None when it is missing or empty.
+        NDJSON values must be strings, not numbers or nested objects.
+        """
+        value = record.get(name)
+        if value is None or value == '':
+            return None
+        if not isinstance(value, str):
+            raise ValueError(f"{name} must be a string, not {value!r}")
+        return value
+
+    def integer(self, record, name):
+        """
+        The record's `name` value as an int. Fractions and booleans are
+        rejected rather than truncated or read as 0 and 1.
+        """
+        value = record[name]
+        if value is None or isinstance(value, bool):
+            raise ValueError(f"Invalid {name}: {value!r}")
+        number = Decimal(str(value).strip())
+        if not number.is_finite() or number != number.to_integral_value():
+            raise ValueError(f"{name} must be a whole number, not {value!r}")
+        return int(number)
+
+    def resolve(self, lookup, name):
+        pk = self.lookups[lookup].get(lookup_key(name))
+        if pk is None and lookup == 'tax':
+            try:
+                pk = self.lookups[lookup].get(
+                    lookup_key(Decimal(str(name).strip().rstrip('%'))))
+            except InvalidOperation:
+                pass
+        return pk
+
+    def load_batch(self, rows):
+        """
+        COPYs a batch into a temporary staging table shaped like
+        `transactions`, then merges it into transactions and the brokerage
+        rollup with one INSERT ... SELECT each.
+        """
+        if not rows:
+            return
+        columns = ', '.join(COPY_COLUMNS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMP TABLE {STAGING_TABLE} ON COMMIT DROP AS "
+                f"SELECT {columns} FROM transactions WITH NO DATA")
+            copy_rows(cursor, STAGING_TABLE, COPY_COLUMNS, rows)
+            cursor.execute(
+                f"INSERT INTO transactions ({columns}) "
+                f"SELECT {columns} FROM {STAGING_TABLE}")
+            cursor.execute(rollup_merge_sql(STAGING_TABLE))
+
+    def write_rejects(self, rejects_file, file_format, rejected):
+        writer = csv.writer(rejects_file)
+        for record, reason in rejected:
+            if file_format == 'csv':
+                if rejects_file.tell() == 0:
+                    writer.writerow([*record.keys(), 'error'])
+                writer.writerow([*record.values(), reason])
+            elif isinstance(record, dict):
+                rejects_file.write(json.dumps(
+                    {**record, "error": reason}, default=str) + '\n')
+            else:
+                rejects_file.write(json.dumps(
+                    {"record": record, "error": reason}) + '\n')
+        rejects_file.flush()
+        os.fsync(rejects_file.fileno())
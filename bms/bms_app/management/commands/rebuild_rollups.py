@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from bms_app.rollup import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the brokerage_rollup table from transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int,
+                            help="Only rebuild the rollups of this company ID")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("rebuild_rollups requires PostgreSQL")
+        groups = rebuild_rollups(options['company'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt brokerage rollups: {groups} groups"))
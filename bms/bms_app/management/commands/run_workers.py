@@ -0,0 +1,74 @@
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from bms_app.jobs import JOB_HANDLERS, claim_job, run_job
+
+
+def work(options, name):
+    """
+    One worker's loop: claim a due job, run it, repeat. SIGTERM and SIGINT
+    let the running job finish before the worker exits.
+    """
+    # A forked worker must not share its parent's database connection.
+    connections.close_all()
+    stopping = []
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *args: stopping.append(True))
+
+    while not stopping:
+        job = claim_job(name, options['kinds'])
+        if job is None:
+            if options['once']:
+                break
+            time.sleep(options['poll'])
+            continue
+        run_job(job)
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = ("Runs background jobs (deletions, rollup rebuilds, archive runs) "
+            "from the job table in a pool of worker processes. Any number "
+            "of run_workers may run at once, on one host or several.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int,
+                            help="Worker processes, BMS_JOB_WORKERS by default")
+        parser.add_argument('--kinds', nargs='+', choices=sorted(JOB_HANDLERS),
+                            help="Only run jobs of these kinds")
+        parser.add_argument('--poll', type=float, default=5,
+                            help="Seconds a worker waits between checks for new jobs")
+        parser.add_argument('--once', action='store_true',
+                            help="Exit when no job is due instead of polling")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("run_workers requires PostgreSQL")
+        workers = options['workers'] or settings.BMS_JOB_WORKERS
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        if workers == 1:
+            work(options, f"{prefix}:0")
+            return
+
+        context = multiprocessing.get_context('fork')
+        processes = [context.Process(target=work, args=(options, f"{prefix}:{index}"))
+                     for index in range(workers)]
+        connections.close_all()
+        for process in processes:
+            process.start()
+        self.stdout.write(f"Started {workers} workers")
+
+        def stop(signum, frame):
+            for process in processes:
+                if process.is_alive():
+                    os.kill(process.pid, signal.SIGTERM)
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        for process in processes:
+            process.join()
+        self.stdout.write(self.style.SUCCESS("Workers stopped"))
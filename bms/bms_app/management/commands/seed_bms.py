@@ -0,0 +1,296 @@
+import calendar
+import multiprocessing
+import random
+import time
+from datetime import date
+from itertools import accumulate
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from bms_app.models import Company, FinancialYear, GSTDetails, Items, Party, Remarks, Tax
+from bms_app.pgcopy import copy_rows
+from bms_app.rollup import rebuild_rollups
+
+TRANSACTION_COLUMNS = [
+    'bill_no', 'bill_date', 'party_id', 'party_bill_no', 'seller_party_id',
+    'product_id', 'quantity', 'rate', 'amount', 'brokerage_percentage',
+    'brokerage_amount', 'brokerage_gst', 'tax_id', 'tax_amount', 'remark_id',
+    'status', 'company_id', 'company_financial_year_id',
+]
+
+# Relative bill volume per month of the financial year, April first: quiet
+# during the monsoon, busy through the festive season and at year end.
+MONTH_WEIGHTS = [0.8, 0.7, 0.6, 0.7, 0.9, 1.1, 1.4, 1.5, 1.1, 1.0, 1.0, 1.3]
+
+# GST rates on goods, with the share of bills charged at each.
+TAX_RATES = [(0, 0.05), (5, 0.55), (12, 0.25), (18, 0.12), (28, 0.03)]
+
+# Brokerage charged on the bill amount, in basis points.
+BROKERAGE_RATES = [50, 75, 100, 100, 100, 150, 200]
+
+# GST on the broker's own service, in basis points.
+BROKERAGE_GST_RATE = 1800
+
+FIRMS = ["Shree", "Jai", "Om", "Laxmi", "Ganesh", "Krishna", "Balaji", "Ambika",
+         "Mahalaxmi", "Sai", "Shiv", "Radhe", "Navkar", "Parshwa", "Ashapura"]
+TRADES = ["Textiles", "Fabrics", "Silk Mills", "Synthetics", "Traders",
+          "Creations", "Fashions", "Weaving", "Prints", "Yarns"]
+CITIES = [("Surat", "Gujarat", "24"), ("Ahmedabad", "Gujarat", "24"),
+          ("Mumbai", "Maharashtra", "27"), ("Bhiwandi", "Maharashtra", "27"),
+          ("Ichalkaranji", "Maharashtra", "27"), ("Erode", "Tamil Nadu", "33"),
+          ("Tiruppur", "Tamil Nadu", "33"), ("Ludhiana", "Punjab", "03"),
+          ("Panipat", "Haryana", "06"), ("Bhilwara", "Rajasthan", "08"),
+          ("Kolkata", "West Bengal", "19"), ("Delhi", "Delhi", "07")]
+FABRICS = ["Cotton", "Rayon", "Viscose", "Polyester", "Georgette", "Chiffon",
+           "Crepe", "Satin", "Linen", "Denim", "Lycra", "Net", "Velvet", "Khadi"]
+FINISHES = ["Grey", "Dyed", "Printed", "Embroidered", "Jacquard", "Dobby",
+            "Bleached", "Mercerised"]
+REMARKS = ["Delivered", "Pending delivery", "Part delivery", "Payment due",
+           "Paid", "Goods returned", "Rate difference", "Urgent",
+           "Transport by seller", "Transport by buyer", "Sample approved",
+           "Against order", "Cash discount", "Credit 30 days", "Credit 60 days"]
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+# Set in each worker process by init_worker.
+plan = None
+
+
+def zipf_cum_weights(count, exponent):
+    return list(accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def gstin(rng, state_code):
+    pan = ''.join(rng.choices(LETTERS, k=5)) + f"{rng.randint(0, 9999):04d}" + rng.choice(LETTERS)
+    return f"{state_code}{pan}1Z{rng.choice(LETTERS + '0123456789')}"
+
+
+def money(paise):
+    return f"{paise // 100}.{paise % 100:02d}"
+
+
+def percent_of(paise, basis_points):
+    """
+    `basis_points` hundredths of a percent of `paise`, rounded half up.
+    """
+    return (paise * basis_points + 5000) // 10000
+
+
+def generate_chunk(chunk, size):
+    """
+    Rows of TRANSACTION_COLUMNS for one chunk. Each chunk has its own
+    random stream derived from the seed, so the data does not depend on
+    how chunks are spread over workers.
+    """
+    rng = random.Random(f"{plan['seed']}:{chunk}")
+    parties = plan['parties']
+    party_weights = plan['party_weights']
+    items = plan['items']
+    taxes = plan['taxes']
+    remarks = plan['remarks']
+    years = rng.choices(plan['years'], cum_weights=plan['year_weights'], k=size)
+    buyers = rng.choices(parties, cum_weights=party_weights, k=size)
+    sellers = rng.choices(parties, cum_weights=party_weights, k=size)
+    products = rng.choices(items, cum_weights=plan['item_weights'], k=size)
+    tax_picks = rng.choices(taxes, cum_weights=plan['tax_weights'], k=size)
+    months = rng.choices(range(12), cum_weights=plan['month_weights'], k=size)
+
+    rows = []
+    for index in range(size):
+        company_id, year_id, first_year = years[index]
+        month_index = months[index]
+        year = first_year + (month_index + 3) // 12
+        month = (month_index + 3) % 12 + 1
+        bill_date = date(year, month, rng.randint(1, calendar.monthrange(year, month)[1]))
+
+        buyer, seller = buyers[index], sellers[index]
+        while seller == buyer:
+            seller = rng.choice(parties)
+        product_id, base_rate = products[index]
+        tax_id, tax_rate = tax_picks[index]
+
+        quantity = max(1, int(rng.lognormvariate(3.5, 1.0)))
+        rate = max(100, int(base_rate * rng.uniform(0.9, 1.1)))
+        amount = quantity * rate
+        brokerage_rate = rng.choice(BROKERAGE_RATES)
+        brokerage = percent_of(amount, brokerage_rate)
+
+        rows.append([
+            f"{company_id}/{chunk}/{index + 1}",
+            bill_date.isoformat(),
+            buyer,
+            f"PB{rng.randint(1, 999999)}" if rng.random() < 0.7 else None,
+            seller,
+            product_id,
+            quantity,
+            money(rate),
+            money(amount),
+            money(brokerage_rate),
+            money(brokerage),
+            money(percent_of(brokerage, BROKERAGE_GST_RATE)),
+            tax_id,
+            money(percent_of(amount, tax_rate)),
+            rng.choice(remarks),
+            'active' if rng.random() < 0.98 else 'inactive',
+            company_id,
+            year_id,
+        ])
+    return rows
+
+
+def init_worker(worker_plan):
+    global plan
+    plan = worker_plan
+    connections.close_all()
+
+
+def load_chunk(task):
+    chunk, size = task
+    rows = generate_chunk(chunk, size)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SET LOCAL synchronous_commit = off")
+        copy_rows(cursor, 'transactions', TRANSACTION_COLUMNS, rows)
+    return size
+
+
+class Command(BaseCommand):
+    help = ("Fills the database with synthetic companies, reference data and "
+            "transactions for scale testing. Transactions are loaded with "
+            "COPY by parallel worker processes; the same seed and sizes "
+            "always produce the same data.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--companies', type=int, default=3)
+        parser.add_argument('--years', type=int, default=3,
+                            help="Financial years per company")
+        parser.add_argument('--first-year', type=int, default=2022,
+                            help="Calendar year the first financial year starts in")
+        parser.add_argument('--parties', type=int, default=5000)
+        parser.add_argument('--items', type=int, default=200)
+        parser.add_argument('--remarks', type=int, default=len(REMARKS))
+        parser.add_argument('--transactions', type=int, default=1000000)
+        parser.add_argument('--skew', type=float, default=1.0,
+                            help="Zipf exponent of party and item activity")
+        parser.add_argument('--workers', type=int,
+                            default=multiprocessing.cpu_count(),
+                            help="Parallel COPY worker processes")
+        parser.add_argument('--chunk-size', type=int, default=100000,
+                            help="Transactions generated and committed per COPY")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("seed_bms requires PostgreSQL")
+        if options['parties'] < 2:
+            raise CommandError("--parties must be at least 2")
+        for name in ('companies', 'years', 'items', 'remarks', 'workers', 'chunk_size'):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be at least 1")
+
+        started = time.monotonic()
+        rng = random.Random(options['seed'])
+        seed_plan = self.create_reference_data(rng, options)
+        seed_plan['seed'] = options['seed']
+        self.stdout.write(
+            f"Created {options['companies']} companies, {options['parties']} "
+            f"parties, {options['items']} items, {len(TAX_RATES)} taxes and "
+            f"{options['remarks']} remarks")
+
+        total = options['transactions']
+        chunk_size = options['chunk_size']
+        tasks = [(chunk, min(chunk_size, total - start))
+                 for chunk, start in enumerate(range(0, total, chunk_size))]
+        loaded = 0
+        if options['workers'] > 1 and len(tasks) > 1:
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            with context.Pool(options['workers'], init_worker, (seed_plan,)) as pool:
+                for size in pool.imap_unordered(load_chunk, tasks):
+                    loaded += size
+                    self.report(loaded, total, started)
+        else:
+            global plan
+            plan = seed_plan
+            for task in tasks:
+                loaded += load_chunk(task)
+                self.report(loaded, total, started)
+
+        groups = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {loaded} transactions and {groups} rollup groups "
+            f"in {time.monotonic() - started:.0f}s"))
+
+    def report(self, loaded, total, started):
+        rate = loaded / max(time.monotonic() - started, 1e-6)
+        self.stdout.write(f"{loaded}/{total} transactions ({rate:.0f} rows/s)")
+
+    @transaction.atomic
+    def create_reference_data(self, rng, options):
+        """
+        Creates the companies, years and reference tables, and returns what
+        the workers need to generate transactions against them.
+        """
+        companies, years, year_weights = [], [], []
+        for number in range(1, options['companies'] + 1):
+            city, state, state_code = rng.choice(CITIES)
+            name = f"{rng.choice(FIRMS)} {rng.choice(TRADES)} Brokers {number}"
+            company = Company.objects.create(
+                name=name, city=city, state=state, phone=f"9{rng.randint(0, 10**9 - 1):09d}",
+                gst=gstin(rng, state_code), short_name=f"C{number}",
+                invoice_head=f"C{number}")
+            companies.append(company)
+            # Bigger companies trade more, and every company grows each year.
+            company_weight = 1 / number ** options['skew']
+            for offset in range(options['years']):
+                first_year = options['first_year'] + offset
+                year = FinancialYear.objects.create(
+                    company=company, from_date=date(first_year, 4, 1),
+                    to_date=date(first_year + 1, 3, 31),
+                    description=f"FY {first_year}-{str(first_year + 1)[-2:]}")
+                GSTDetails.objects.create(company=company, financial_year=year,
+                                          gst=company.gst)
+                years.append((company.company_id, year.financial_year_id, first_year))
+                year_weights.append(company_weight * 1.15 ** offset)
+
+        party_rows = []
+        for number in range(1, options['parties'] + 1):
+            city, state, state_code = rng.choice(CITIES)
+            party_rows.append(Party(
+                name=f"{rng.choice(FIRMS)} {rng.choice(TRADES)} {number}",
+                address1=f"{rng.randint(1, 999)}, Textile Market", city=city,
+                state=state, pincode=f"{rng.randint(110001, 855999)}",
+                phone=f"9{rng.randint(0, 10**9 - 1):09d}",
+                contact_person=f"{rng.choice(FIRMS)}bhai",
+                type=rng.choice(['buyer', 'seller', 'both']),
+                gst=gstin(rng, state_code)))
+        parties = [party.party_id for party in
+                   Party.objects.bulk_create(party_rows, batch_size=1000)]
+        # Activity follows the Zipf ranks in a seeded shuffle, so the busiest
+        # parties are not simply the oldest ones.
+        rng.shuffle(parties)
+
+        item_rows = [Items(item_name=f"{rng.choice(FINISHES)} {rng.choice(FABRICS)} {number}")
+                     for number in range(1, options['items'] + 1)]
+        items = [(item.item_id, int(rng.lognormvariate(5.5, 0.8) * 100))
+                 for item in Items.objects.bulk_create(item_rows, batch_size=1000)]
+        rng.shuffle(items)
+
+        taxes = [(Tax.objects.create(tax_percentage=rate, default_tax=5,
+                                     description=f"GST {rate}%").tax_id, rate * 100)
+                 for rate, share in TAX_RATES]
+
+        remark_rows = [Remarks(remark=REMARKS[number % len(REMARKS)] + (
+            f" {number // len(REMARKS)}" if number >= len(REMARKS) else ""))
+            for number in range(options['remarks'])]
+        remarks = [remark.remark_id for remark in Remarks.objects.bulk_create(remark_rows)]
+
+        return {
+            'years': years,
+            'year_weights': list(accumulate(year_weights)),
+            'parties': parties,
+            'party_weights': zipf_cum_weights(len(parties), options['skew']),
+            'items': items,
+            'item_weights': zipf_cum_weights(len(items), options['skew']),
+            'taxes': taxes,
+            'tax_weights': list(accumulate(share for rate, share in TAX_RATES)),
+            'remarks': remarks,
+            'month_weights': list(accumulate(MONTH_WEIGHTS)),
+        }
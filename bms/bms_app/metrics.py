@@ -0,0 +1,270 @@
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+from .cache import REFERENCE_CACHES
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Methods labelled by name; anything else a client sends is counted as
+# OTHER so it cannot add label values without bound.
+HTTP_METHODS = frozenset(['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE',
+                          'OPTIONS', 'TRACE', 'CONNECT'])
+
+# QueryTimer of the request being handled. Context variables follow the
+# request into the threads sync_to_async runs its queries in.
+current_timer = ContextVar('current_timer', default=None)
+
+
+class QueryTimer:
+    """
+    connection.execute_wrapper callable counting the queries of one
+    request and the time spent in them.
+    """
+    __slots__ = ('count', 'seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += perf_counter() - started
+            self.count += 1
+
+
+class EndpointStats:
+    __slots__ = ('lock', 'buckets', 'requests', 'seconds', 'queries',
+                 'query_seconds', 'response_bytes', 'statuses')
+
+    def __init__(self, bucket_count):
+        self.lock = threading.Lock()
+        self.buckets = [0] * (bucket_count + 1)
+        self.requests = 0
+        self.seconds = 0.0
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.response_bytes = 0
+        self.statuses = {}
+
+    def add_streamed(self, size, queries, query_seconds):
+        with self.lock:
+            self.response_bytes += size
+            self.queries += queries
+            self.query_seconds += query_seconds
+
+
+class MetricsRegistry:
+    """
+    Per-process request metrics, keyed by URL name and HTTP method.
+    """
+
+    def __init__(self, latency_buckets):
+        self.latency_buckets = tuple(latency_buckets)
+        self.endpoints = {}
+        self.lock = threading.Lock()
+
+    def endpoint(self, view, method):
+        key = (view, method)
+        stats = self.endpoints.get(key)
+        if stats is None:
+            with self.lock:
+                stats = self.endpoints.setdefault(
+                    key, EndpointStats(len(self.latency_buckets)))
+        return stats
+
+    def record(self, stats, seconds, timer, status, size):
+        bucket = bisect_left(self.latency_buckets, seconds)
+        with stats.lock:
+            stats.buckets[bucket] += 1
+            stats.requests += 1
+            stats.seconds += seconds
+            stats.queries += timer.count
+            stats.query_seconds += timer.seconds
+            stats.response_bytes += size
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            endpoints = list(self.endpoints.items())
+        rows = []
+        for (view, method), stats in sorted(endpoints):
+            with stats.lock:
+                rows.append((view, method, list(stats.buckets), stats.requests,
+                             stats.seconds, stats.queries, stats.query_seconds,
+                             stats.response_bytes, dict(stats.statuses)))
+        return rows
+
+    def render(self):
+        lines = []
+
+        def metric(name, kind, description):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        rows = self.snapshot()
+        metric('bms_http_request_duration_seconds', 'histogram',
+               "Request latency by URL name and method.")
+        for view, method, buckets, requests, seconds, *_ in rows:
+            labels = f'view="{view}",method="{method}"'
+            cumulative = 0
+            for bound, count in zip(self.latency_buckets, buckets):
+                cumulative += count
+                lines.append(f'bms_http_request_duration_seconds_bucket'
+                             f'{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'bms_http_request_duration_seconds_bucket'
+                         f'{{{labels},le="+Inf"}} {requests}')
+            lines.append(f'bms_http_request_duration_seconds_sum{{{labels}}} {seconds}')
+            lines.append(f'bms_http_request_duration_seconds_count{{{labels}}} {requests}')
+
+        metric('bms_http_responses_total', 'counter',
+               "Responses by URL name, method and status code.")
+        for view, method, *_, statuses in rows:
+            for status, count in sorted(statuses.items()):
+                lines.append(f'bms_http_responses_total{{view="{view}",'
+                             f'method="{method}",status="{status}"}} {count}')
+
+        for name, index, description in [
+                ('bms_db_queries_total', 5, "SQL queries run by requests."),
+                ('bms_db_query_duration_seconds_total', 6,
+                 "Time spent in SQL queries by requests."),
+                ('bms_http_response_bytes_total', 7, "Response body bytes sent.")]:
+            metric(name, 'counter', description)
+            for row in rows:
+                lines.append(f'{name}{{view="{row[0]}",method="{row[1]}"}} {row[index]}')
+
+        caches = [cache.stats() for cache in REFERENCE_CACHES.values()]
+        for key, kind in [('hits', 'counter'), ('misses', 'counter'),
+                          ('invalidations', 'counter'), ('entries', 'gauge')]:
+            name = f"bms_reference_cache_{key}" + ('_total' if kind == 'counter' else '')
+            metric(name, kind, f"Reference cache {key}.")
+            for stats in caches:
+                lines.append(f'{name}{{cache="{stats["name"]}"}} {stats[key]}')
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry(settings.BMS_METRICS_LATENCY_BUCKETS)
+
+
+def method_label(method):
+    return method if method in HTTP_METHODS else 'OTHER'
+
+
+def time_queries(execute, sql, params, many, context):
+    timer = current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    """
+    Wraps every database connection once, in whichever thread opens it,
+    so a request's queries are timed without touching the connection
+    per request.
+    """
+    if time_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_queries)
+
+
+def counted(chunks, stats, timer):
+    """
+    Passes a streaming response through, adding its size and the queries
+    run to produce it once it is sent.
+    """
+    size = 0
+    current_timer.set(timer)
+    queries, query_seconds = timer.count, timer.seconds
+    try:
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+    finally:
+        current_timer.set(None)
+        stats.add_streamed(size, timer.count - queries, timer.seconds - query_seconds)
+
+
+async def acounted(chunks, stats, timer):
+    """
+    counted() for the async iterators of async streaming responses.
+    """
+    size = 0
+    current_timer.set(timer)
+    queries, query_seconds = timer.count, timer.seconds
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+    finally:
+        current_timer.set(None)
+        stats.add_streamed(size, timer.count - queries, timer.seconds - query_seconds)
+
+
+class MetricsMiddleware:
+    """
+    Records latency, SQL query count and time, response size and status of
+    every request against the URL name it resolved to.
+
+    It runs in both modes so that async views stay async under ASGI.
+    Queries are timed by the wrapper install_query_timer puts on every
+    connection, which finds the request's timer in current_timer. The
+    queries and bytes of a streamed body are added once it is sent.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer = QueryTimer()
+        started = perf_counter()
+        current_timer.set(timer)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timer.set(None)
+        self.record(request, response, perf_counter() - started, timer)
+        return response
+
+    async def __acall__(self, request):
+        timer = QueryTimer()
+        started = perf_counter()
+        current_timer.set(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timer.set(None)
+        self.record(request, response, perf_counter() - started, timer)
+        return response
+
+    def record(self, request, response, seconds, timer):
+        match = request.resolver_match
+        stats = registry.endpoint(
+            (match.url_name or match.view_name) if match else 'unmatched',
+            method_label(request.method))
+        if response.streaming:
+            size = 0
+            response.streaming_content = (acounted if response.is_async else counted)(
+                response.streaming_content, stats, timer)
+        else:
+            size = len(response.content)
+        registry.record(stats, seconds, timer, response.status_code, size)
+
+
+def metrics_view(request):
+    return HttpResponse(registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:51
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bms_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transactions',
+            index=models.Index(fields=['company', 'company_financial_year', 'bill_date'], name='trnx_company_fy_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transactions',
+            index=models.Index(fields=['party', 'bill_date'], name='trnx_party_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transactions',
+            index=models.Index(fields=['seller_party', 'bill_date'], name='trnx_seller_party_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transactions',
+            index=models.Index(fields=['bill_date', 'transaction_id'], name='trnx_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transactions',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['bill_date'], name='trnx_bill_date_brin'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bms_app', '0002_transactions_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionImport',
+            fields=[
+                ('import_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('source', models.CharField(max_length=500)),
+                ('records_done', models.BigIntegerField(default=0)),
+                ('rows_imported', models.BigIntegerField(default=0)),
+                ('rows_rejected', models.BigIntegerField(default=0)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed')], default='running', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('financial_year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transaction_imports', to='bms_app.financialyear')),
+            ],
+            options={
+                'db_table': 'transaction_import',
+            },
+        ),
+    ]
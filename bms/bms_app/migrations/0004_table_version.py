@@ -0,0 +1,65 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:55
+
+from django.db import migrations, models
+
+VERSIONED_TABLES = [
+    'company', 'financial_year', 'gst_details', 'company_party_invoice_details',
+    'party', 'items', 'remarks', 'tax', 'transactions',
+]
+
+VERSION_SLOTS = 16
+
+
+def create_version_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f"""
+        CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO table_version (table_name, slot, version)
+            VALUES (TG_TABLE_NAME, mod(pg_backend_pid(), {VERSION_SLOTS}), 1)
+            ON CONFLICT (table_name, slot)
+            DO UPDATE SET version = table_version.version + 1;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    for table in VERSIONED_TABLES:
+        schema_editor.execute(f"""
+            CREATE TRIGGER {table}_bump_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()
+        """)
+
+
+def drop_version_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in VERSIONED_TABLES:
+        schema_editor.execute(
+            f"DROP TRIGGER IF EXISTS {table}_bump_version ON {table}")
+    schema_editor.execute("DROP FUNCTION IF EXISTS bump_table_version()")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bms_app', '0003_transaction_import'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableVersion',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('table_name', models.CharField(max_length=63)),
+                ('slot', models.SmallIntegerField()),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'table_version',
+                'constraints': [models.UniqueConstraint(fields=('table_name', 'slot'), name='table_version_table_slot_uniq')],
+            },
+        ),
+        migrations.RunPython(create_version_triggers, drop_version_triggers),
+    ]
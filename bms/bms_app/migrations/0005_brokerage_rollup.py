@@ -0,0 +1,54 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_rollups(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("""
+        INSERT INTO brokerage_rollup (company_id, financial_year_id, month, party_id,
+            seller_party_id, product_id, quantity, amount, brokerage_amount,
+            brokerage_gst, tax_amount, transaction_count, revision)
+        SELECT company_id, company_financial_year_id,
+               COALESCE(date_trunc('month', bill_date)::date, DATE '0001-01-01'),
+               party_id, seller_party_id, product_id, SUM(quantity), SUM(amount),
+               SUM(brokerage_amount), SUM(brokerage_gst), SUM(tax_amount), COUNT(*), 1
+        FROM transactions
+        GROUP BY 1, 2, 3, 4, 5, 6
+    """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bms_app', '0004_table_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BrokerageRollup',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('month', models.DateField()),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('brokerage_amount', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('brokerage_gst', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('tax_amount', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('transaction_count', models.BigIntegerField(default=0)),
+                ('revision', models.BigIntegerField(default=0)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='brokerage_rollups', to='bms_app.company')),
+                ('financial_year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='brokerage_rollups', to='bms_app.financialyear')),
+                ('party', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups_as_party', to='bms_app.party')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='bms_app.items')),
+                ('seller_party', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups_as_seller_party', to='bms_app.party')),
+            ],
+            options={
+                'db_table': 'brokerage_rollup',
+                'constraints': [models.UniqueConstraint(fields=('company', 'financial_year', 'month', 'party', 'seller_party', 'product'), name='brokerage_rollup_key_uniq')],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
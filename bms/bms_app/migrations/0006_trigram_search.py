@@ -0,0 +1,36 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:15
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bms_app', '0005_brokerage_rollup'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='items',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['item_name'], name='items_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='party',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='party_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='party',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['contact_person'], name='party_contact_person_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='party',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['city'], name='party_city_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='party',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['gst'], name='party_gst_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
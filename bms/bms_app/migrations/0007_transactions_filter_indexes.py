@@ -0,0 +1,25 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bms_app', '0006_trigram_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transactions',
+            index=models.Index(fields=['product', 'bill_date'], name='trnx_product_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transactions',
+            index=models.Index(fields=['bill_no', 'transaction_id'], name='trnx_bill_no_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transactions',
+            index=models.Index(fields=['party_bill_no'], name='trnx_party_bill_no_idx'),
+        ),
+    ]
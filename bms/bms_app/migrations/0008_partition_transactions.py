@@ -0,0 +1,120 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:25
+
+import re
+from django.db import migrations
+
+PARTITION_PREFIX = 'transactions_fy_'
+
+
+def rebuild_transactions(schema_editor, partition_by, primary_key):
+    """
+    Recreates transactions with the same columns, foreign keys, indexes and
+    triggers, partitioned by `partition_by` (or not, when it is empty), and
+    moves every row across. Indexes and keys are built after the rows are
+    loaded, and keep their names.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("LOCK TABLE transactions IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = 'transactions'::regclass AND contype IN ('f', 'c')")
+        constraints = cursor.fetchall()
+        cursor.execute(
+            "SELECT pg_get_indexdef(indexrelid) FROM pg_index "
+            "WHERE indrelid = 'transactions'::regclass AND NOT indisprimary")
+        indexes = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT pg_get_triggerdef(oid) FROM pg_trigger "
+            "WHERE tgrelid = 'transactions'::regclass AND NOT tgisinternal")
+        triggers = [row[0] for row in cursor.fetchall()]
+
+    schema_editor.execute("ALTER TABLE transactions RENAME TO transactions_old")
+    schema_editor.execute(
+        "CREATE TABLE transactions (LIKE transactions_old INCLUDING DEFAULTS) "
+        f"{partition_by}")
+    # The ID sequence belongs to the old table and goes with it; a new one
+    # is created below. Identity columns are not used because partitioned
+    # tables only support them from PostgreSQL 17.
+    schema_editor.execute(
+        "ALTER TABLE transactions ALTER COLUMN transaction_id DROP DEFAULT")
+    if partition_by:
+        schema_editor.execute(
+            "CREATE TABLE transactions_default PARTITION OF transactions DEFAULT")
+        schema_editor.execute(f"""
+            DO $$
+            DECLARE year_id bigint;
+            BEGIN
+                FOR year_id IN SELECT financial_year_id FROM financial_year LOOP
+                    EXECUTE format(
+                        'CREATE TABLE %I PARTITION OF transactions FOR VALUES IN (%s)',
+                        '{PARTITION_PREFIX}' || year_id, year_id);
+                END LOOP;
+            END $$
+        """, params=None)
+    schema_editor.execute("INSERT INTO transactions SELECT * FROM transactions_old")
+    schema_editor.execute("DROP TABLE transactions_old")
+
+    schema_editor.execute(
+        "CREATE SEQUENCE transactions_transaction_id_seq "
+        "OWNED BY transactions.transaction_id")
+    schema_editor.execute(
+        "ALTER TABLE transactions ALTER COLUMN transaction_id "
+        "SET DEFAULT nextval('transactions_transaction_id_seq')")
+    schema_editor.execute(
+        "SELECT setval('transactions_transaction_id_seq', "
+        "COALESCE(MAX(transaction_id), 0) + 1, false) FROM transactions")
+    schema_editor.execute(
+        "ALTER TABLE transactions ADD CONSTRAINT transactions_pkey "
+        f"PRIMARY KEY ({primary_key})")
+    for name, definition in constraints:
+        schema_editor.execute(
+            f'ALTER TABLE transactions ADD CONSTRAINT "{name}" {definition}')
+    # The definitions were read from the old table: drop ONLY, which
+    # pg_get_indexdef adds for partitioned tables, so indexes cascade to
+    # the partitions.
+    on_table = re.compile(r'\bON (ONLY )?(\w+\.)?transactions\b')
+    for definition in indexes + triggers:
+        schema_editor.execute(on_table.sub('ON transactions', definition, count=1))
+
+
+def partition_transactions(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    rebuild_transactions(
+        schema_editor, "PARTITION BY LIST (company_financial_year_id)",
+        "transaction_id, company_financial_year_id")
+    schema_editor.execute(f"""
+        CREATE OR REPLACE FUNCTION create_transactions_partition() RETURNS trigger AS $$
+        BEGIN
+            EXECUTE format(
+                'CREATE TABLE IF NOT EXISTS %I PARTITION OF transactions FOR VALUES IN (%s)',
+                '{PARTITION_PREFIX}' || NEW.financial_year_id, NEW.financial_year_id);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """, params=None)
+    schema_editor.execute("""
+        CREATE TRIGGER financial_year_create_partition
+        AFTER INSERT ON financial_year
+        FOR EACH ROW EXECUTE FUNCTION create_transactions_partition()
+    """)
+
+
+def unpartition_transactions(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "DROP TRIGGER IF EXISTS financial_year_create_partition ON financial_year")
+    schema_editor.execute("DROP FUNCTION IF EXISTS create_transactions_partition()")
+    rebuild_transactions(schema_editor, "", "transaction_id")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bms_app', '0007_transactions_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_transactions, unpartition_transactions),
+    ]
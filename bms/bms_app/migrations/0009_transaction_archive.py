@@ -0,0 +1,29 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bms_app', '0008_partition_transactions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionArchive',
+            fields=[
+                ('archive_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('path', models.CharField(max_length=500)),
+                ('rows', models.BigIntegerField(default=0)),
+                ('min_transaction_id', models.BigIntegerField(blank=True, null=True)),
+                ('max_transaction_id', models.BigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('financial_year', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='transaction_archive', to='bms_app.financialyear')),
+            ],
+            options={
+                'db_table': 'transaction_archive',
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bms_app', '0009_transaction_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='items',
+            name='status',
+            field=models.CharField(choices=[('active', 'Active'), ('inactive', 'Inactive')], default='active', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='party',
+            name='status',
+            field=models.CharField(choices=[('active', 'Active'), ('inactive', 'Inactive')], default='active', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='remarks',
+            name='status',
+            field=models.CharField(choices=[('active', 'Active'), ('inactive', 'Inactive')], default='active', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='tax',
+            name='status',
+            field=models.CharField(choices=[('active', 'Active'), ('inactive', 'Inactive')], default='active', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='DeletionJob',
+            fields=[
+                ('job_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('target', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('step', models.IntegerField(default=0)),
+                ('rows_deleted', models.BigIntegerField(default=0)),
+                ('progress', models.JSONField(default=dict)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'deletion_job',
+                'indexes': [models.Index(fields=['status', 'job_id'], name='deletion_job_status_idx')],
+            },
+        ),
+    ]
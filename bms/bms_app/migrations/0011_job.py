@@ -0,0 +1,63 @@
+# Generated by Django 5.1.4 on 2026-10-18 21:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def copy_deletion_jobs(apps, schema_editor):
+    DeletionJob = apps.get_model('bms_app', 'DeletionJob')
+    Job = apps.get_model('bms_app', 'Job')
+    Job.objects.bulk_create([Job(
+        kind='delete',
+        # A completed company deletion has removed its company.
+        company_id=(job.object_id if job.target == 'company' and job.status != 'completed'
+                    else None),
+        params={'target': job.target, 'object_id': job.object_id},
+        status=job.status,
+        attempts=1 if job.status != 'queued' else 0,
+        progress={'step': job.step, 'rows_deleted': job.rows_deleted, 'rows': job.progress},
+        error=job.error,
+        locked_until=job.locked_until,
+    ) for job in DeletionJob.objects.order_by('job_id')])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bms_app', '0010_deletion_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('job_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(max_length=50)),
+                ('params', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='queued', max_length=10)),
+                ('attempts', models.IntegerField(default=0)),
+                ('max_attempts', models.IntegerField(default=1)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('progress', models.JSONField(default=dict)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('cancel_requested', models.BooleanField(default=False)),
+                ('worker', models.CharField(blank=True, max_length=100, null=True)),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to='bms_app.company')),
+            ],
+            options={
+                'db_table': 'job',
+                'indexes': [models.Index(fields=['status', 'run_after', 'job_id'], name='job_status_idx'), models.Index(fields=['company', 'status'], name='job_company_status_idx')],
+            },
+        ),
+        migrations.RunPython(copy_deletion_jobs, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='DeletionJob',
+        ),
+    ]
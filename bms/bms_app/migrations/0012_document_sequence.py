@@ -0,0 +1,51 @@
+# Generated by Django 5.1.4 on 2026-10-18 21:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TRAILING_NUMBER = r'([0-9]{1,18})$'
+
+
+def seed_sequences(apps, schema_editor):
+    """
+    Starts each existing year's sequences after the highest number its
+    bills and invoices already end with.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for kind, table, number, year in [
+            ('bill', 'transactions', 'bill_no', 'company_financial_year_id'),
+            ('invoice', 'company_party_invoice_details', 'invoice_number', 'financial_year_id')]:
+        schema_editor.execute(f"""
+            INSERT INTO document_sequence (company_id, financial_year_id, kind, last_value)
+            SELECT company_id, {year}, %s,
+                   MAX(substring({number} from %s)::bigint)
+            FROM {table}
+            WHERE substring({number} from %s) IS NOT NULL
+            GROUP BY company_id, {year}
+        """, [kind, TRAILING_NUMBER, TRAILING_NUMBER])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bms_app', '0011_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSequence',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('bill', 'Bill'), ('invoice', 'Invoice')], max_length=10)),
+                ('last_value', models.BigIntegerField(default=0)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='document_sequences', to='bms_app.company')),
+                ('financial_year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='document_sequences', to='bms_app.financialyear')),
+            ],
+            options={
+                'db_table': 'document_sequence',
+                'constraints': [models.UniqueConstraint(fields=('company', 'financial_year', 'kind'), name='document_sequence_uniq')],
+            },
+        ),
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-18 22:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bms_app', '0012_document_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GSTMonthSummary',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('month', models.DateField()),
+                ('rollup_rows', models.BigIntegerField()),
+                ('rollup_revision', models.BigIntegerField()),
+                ('groups', models.JSONField(default=list)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='gst_month_summaries', to='bms_app.company')),
+                ('financial_year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='gst_month_summaries', to='bms_app.financialyear')),
+            ],
+            options={
+                'db_table': 'gst_month_summary',
+                'constraints': [models.UniqueConstraint(fields=('company', 'financial_year', 'month'), name='gst_month_summary_uniq')],
+            },
+        ),
+    ]
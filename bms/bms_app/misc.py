@@ -1,9 +1,15 @@
 import logging
 import traceback
-from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from rest_framework.views import APIView
+from .cache import REFERENCE_CACHES, item_cache, remark_cache, tax_cache
+from .fieldsets import InvalidFieldset, only_fields, requested_fields, trim_rows
 from .models import GSTDetails, Items, Remarks, Tax
-from .serializers import GSTDetailSerializer, ItemSerializer, RemarkSerializer, TaxSerializer
+from .purge import enqueue_deletion
+from .responses import api_response
+from .serializers import GSTDetailSerializer, ItemSerializer, JobSerializer, RemarkSerializer, TaxSerializer
+from .versions import versioned_etag
 
 # Setup logger
 logger = logging.getLogger(__name__)
@@ -12,49 +18,57 @@ logging.basicConfig(level=logging.INFO,
 
 
 class ItemsAPIView(APIView):
+    @method_decorator(condition(etag_func=versioned_etag('items')))
     def get(self, request, item_id=None, *args, **kwargs):
         try:
+            fields = requested_fields(request, ItemSerializer)
             if item_id:
-                item = Items.objects.filter(item_id=item_id).first()
+                item = item_cache.get(item_id)
                 if item is None:
-                    return JsonResponse({
+                    return api_response(request, {
                         "error_code": 404,
                         "message": "Item not found",
                         "data": [],
                         "error": []
                     }, status=404)
 
-                serializer = ItemSerializer(item)
-                logger.info(f"Fetched item: {item.item_name}")
-                return JsonResponse({
+                logger.info(f"Fetched item: {item['item_name']}")
+                return api_response(request, {
                     "error_code": 200,
                     "message": "Item found",
-                    "data": [serializer.data],
+                    "data": trim_rows([item], fields),
                     "error": []
                 }, status=200)
 
             else:
-                items = Items.objects.all()
+                items = item_cache.all()
                 logger.warning("No Items found")
                 if not items:
-                    return JsonResponse({
+                    return api_response(request, {
                         "error_code": 400,
                         "message": "No items found",
                         "data": [],
                         "error": []
                     }, status=400)
 
-                serializer = ItemSerializer(items, many=True)
                 logger.info("Fetched all items")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 200,
                     "message": "Data found",
-                    "data": serializer.data,
+                    "data": trim_rows(items, fields),
                     "error": []
                 }, status=200)
 
+        except InvalidFieldset as e:
+            return api_response(request, {
+                "error_code": 400,
+                "message": "Invalid fields",
+                "data": [],
+                "error": [str(e)]
+            }, status=400)
+
         except Exception as e:
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -66,9 +80,10 @@ class ItemsAPIView(APIView):
             serializer = ItemSerializer(data=request.data)
             if serializer.is_valid():
                 serializer.save()
+                item_cache.invalidate()
                 logger.info(f"Created Item: {serializer.data['item_name']}")
 
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 200,
                     "message": "Item created successfully",
                     "data": [serializer.data],
@@ -76,7 +91,7 @@ class ItemsAPIView(APIView):
                 }, status=201)
 
             logger.error(f"Failed to create item: {serializer.errors}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 400,
                 "message": "Validation failed",
                 "data": [],
@@ -84,7 +99,7 @@ class ItemsAPIView(APIView):
             }, status=400)
 
         except Exception as e:
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -96,7 +111,7 @@ class ItemsAPIView(APIView):
             item = Items.objects.filter(pk=item_id).first()
             if item is None:
                 logger.error(f"Item with ID {item_id} not found")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 404,
                     "message": "Item not found",
                     "data": [],
@@ -106,8 +121,9 @@ class ItemsAPIView(APIView):
             serializer = ItemSerializer(item, data=request.data)
             if serializer.is_valid():
                 serializer.save()
+                item_cache.invalidate()
                 logger.info(f"Updated item: {item.item_name}")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 200,
                     "message": "Item updated successfully",
                     "data": [serializer.data],
@@ -115,7 +131,7 @@ class ItemsAPIView(APIView):
                 }, status=200)
 
             logger.error(f"Failed to update Item: {serializer.errors}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 400,
                 "message": "Validation failed",
                 "data": [],
@@ -124,7 +140,7 @@ class ItemsAPIView(APIView):
 
         except Exception as e:
             logger.error(f"Internal Server Error: {str(e)}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -136,26 +152,26 @@ class ItemsAPIView(APIView):
             item = Items.objects.filter(pk=item_id).first()
             if item is None:
                 logger.error(f"Item with ID {item} not found")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 404,
                     "message": "Item not found",
                     "data": [],
                     "error": []
                 }, status=404)
 
-            item_name = item.item_name
-            item.delete()
-            logger.info(f"Deleted item: {item_name}")
-            return JsonResponse({
-                "error_code": 200,
-                "message": "Item deleted successfully",
-                "data": [],
+            job = enqueue_deletion('item', item.pk)
+            item_cache.invalidate()
+            logger.info(f"Queued deletion of item {item.item_name}: job {job.job_id}")
+            return api_response(request, {
+                "error_code": 202,
+                "message": "Item deletion queued",
+                "data": JobSerializer(job).data,
                 "error": []
-            }, status=200)
+            }, status=202)
 
         except Exception as e:
             logger.error(f"Internal Server Error: {str(e)}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -164,49 +180,57 @@ class ItemsAPIView(APIView):
 
 
 class RemarkAPIView(APIView):
+    @method_decorator(condition(etag_func=versioned_etag('remarks')))
     def get(self, request, remark_id=None, *args, **kwargs):
         try:
+            fields = requested_fields(request, RemarkSerializer)
             if remark_id:
-                remark = Remarks.objects.filter(remark_id=remark_id).first()
+                remark = remark_cache.get(remark_id)
                 if remark is None:
-                    return JsonResponse({
+                    return api_response(request, {
                         "error_code": 404,
                         "message": "Remark not found",
                         "data": [],
                         "error": []
                     }, status=404)
 
-                serializer = RemarkSerializer(remark)
-                logger.info(f"Fetched remark: {remark.remark}")
-                return JsonResponse({
+                logger.info(f"Fetched remark: {remark['remark']}")
+                return api_response(request, {
                     "error_code": 200,
                     "message": "Remark found",
-                    "data": [serializer.data],
+                    "data": trim_rows([remark], fields),
                     "error": []
                 }, status=200)
 
             else:
-                remarks = Remarks.objects.all()
+                remarks = remark_cache.all()
                 logger.warning("No Remarks found")
                 if not remarks:
-                    return JsonResponse({
+                    return api_response(request, {
                         "error_code": 400,
                         "message": "No remarks found",
                         "data": [],
                         "error": []
                     }, status=400)
 
-                serializer = RemarkSerializer(remarks, many=True)
                 logger.info("Fetched all remarks")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 200,
                     "message": "Data found",
-                    "data": serializer.data,
+                    "data": trim_rows(remarks, fields),
                     "error": []
                 }, status=200)
 
+        except InvalidFieldset as e:
+            return api_response(request, {
+                "error_code": 400,
+                "message": "Invalid fields",
+                "data": [],
+                "error": [str(e)]
+            }, status=400)
+
         except Exception as e:
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -218,9 +242,10 @@ class RemarkAPIView(APIView):
             serializer = RemarkSerializer(data=request.data)
             if serializer.is_valid():
                 serializer.save()
+                remark_cache.invalidate()
                 logger.info(f"Created Remark: {serializer.data['remark']}")
 
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 200,
                     "message": "Remark created successfully",
                     "data": [serializer.data],
@@ -228,7 +253,7 @@ class RemarkAPIView(APIView):
                 }, status=201)
 
             logger.error(f"Failed to create remark: {serializer.errors}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 400,
                 "message": "Validation failed",
                 "data": [],
@@ -236,7 +261,7 @@ class RemarkAPIView(APIView):
             }, status=400)
 
         except Exception as e:
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -248,7 +273,7 @@ class RemarkAPIView(APIView):
             remark = Remarks.objects.filter(pk=remark_id).first()
             if remark is None:
                 logger.error(f"Remark with ID {remark_id} not found")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 404,
                     "message": "Remark not found",
                     "data": [],
@@ -258,8 +283,9 @@ class RemarkAPIView(APIView):
             serializer = RemarkSerializer(remark, data=request.data)
             if serializer.is_valid():
                 serializer.save()
+                remark_cache.invalidate()
                 logger.info(f"Updated remark: {remark.remark}")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 200,
                     "message": "Remark updated successfully",
                     "data": [serializer.data],
@@ -267,7 +293,7 @@ class RemarkAPIView(APIView):
                 }, status=200)
 
             logger.error(f"Failed to update Remark: {serializer.errors}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 400,
                 "message": "Validation failed",
                 "data": [],
@@ -276,7 +302,7 @@ class RemarkAPIView(APIView):
 
         except Exception as e:
             logger.error(f"Internal Server Error: {str(e)}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -288,26 +314,26 @@ class RemarkAPIView(APIView):
             remark = Remarks.objects.filter(pk=remark_id).first()
             if remark is None:
                 logger.error(f"Remark with ID {remark} not found")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 404,
                     "message": "Remark not found",
                     "data": [],
                     "error": []
                 }, status=404)
 
-            remark_name = remark.remark
-            remark.delete()
-            logger.info(f"Deleted remark: {remark_name}")
-            return JsonResponse({
-                "error_code": 200,
-                "message": "Remark deleted successfully",
-                "data": [],
+            job = enqueue_deletion('remark', remark.pk)
+            remark_cache.invalidate()
+            logger.info(f"Queued deletion of remark {remark.remark}: job {job.job_id}")
+            return api_response(request, {
+                "error_code": 202,
+                "message": "Remark deletion queued",
+                "data": JobSerializer(job).data,
                 "error": []
-            }, status=200)
+            }, status=202)
 
         except Exception as e:
             logger.error(f"Internal Server Error: {str(e)}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -316,49 +342,57 @@ class RemarkAPIView(APIView):
 
 
 class TaxAPIView(APIView):
+    @method_decorator(condition(etag_func=versioned_etag('tax')))
     def get(self, request, tax_id=None, *args, **kwargs):
         try:
+            fields = requested_fields(request, TaxSerializer)
             if tax_id:
-                tax = Tax.objects.filter(tax_id=tax_id).first()
+                tax = tax_cache.get(tax_id)
                 if tax is None:
-                    return JsonResponse({
+                    return api_response(request, {
                         "error_code": 404,
                         "message": "Tax not found",
                         "data": [],
                         "error": []
                     }, status=404)
 
-                serializer = TaxSerializer(tax)
-                logger.info(f"Fetched tax: {tax.tax_id}")
-                return JsonResponse({
+                logger.info(f"Fetched tax: {tax['tax_id']}")
+                return api_response(request, {
                     "error_code": 200,
                     "message": "Tax found",
-                    "data": [serializer.data],
+                    "data": trim_rows([tax], fields),
                     "error": []
                 }, status=200)
 
             else:
-                taxs = Tax.objects.all()
+                taxs = tax_cache.all()
                 logger.warning("No Taxs found")
                 if not taxs:
-                    return JsonResponse({
+                    return api_response(request, {
                         "error_code": 400,
                         "message": "No taxs found",
                         "data": [],
                         "error": []
                     }, status=400)
 
-                serializer = TaxSerializer(taxs, many=True)
                 logger.info("Fetched all taxs")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 200,
                     "message": "Data found",
-                    "data": serializer.data,
+                    "data": trim_rows(taxs, fields),
                     "error": []
                 }, status=200)
 
+        except InvalidFieldset as e:
+            return api_response(request, {
+                "error_code": 400,
+                "message": "Invalid fields",
+                "data": [],
+                "error": [str(e)]
+            }, status=400)
+
         except Exception as e:
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -370,9 +404,10 @@ class TaxAPIView(APIView):
             serializer = TaxSerializer(data=request.data)
             if serializer.is_valid():
                 serializer.save()
+                tax_cache.invalidate()
                 logger.info(f"Created Tax: {serializer.data['tax_id']}")
 
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 200,
                     "message": "Tax created successfully",
                     "data": [serializer.data],
@@ -380,7 +415,7 @@ class TaxAPIView(APIView):
                 }, status=201)
 
             logger.error(f"Failed to create tax: {serializer.errors}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 400,
                 "message": "Validation failed",
                 "data": [],
@@ -388,7 +423,7 @@ class TaxAPIView(APIView):
             }, status=400)
 
         except Exception as e:
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -400,7 +435,7 @@ class TaxAPIView(APIView):
             tax = Tax.objects.filter(pk=tax_id).first()
             if tax is None:
                 logger.error(f"Tax with ID {tax_id} not found")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 404,
                     "message": "Tax not found",
                     "data": [],
@@ -410,8 +445,9 @@ class TaxAPIView(APIView):
             serializer = TaxSerializer(tax, data=request.data)
             if serializer.is_valid():
                 serializer.save()
+                tax_cache.invalidate()
                 logger.info(f"Updated tax: {tax.tax_id}")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 200,
                     "message": "Tax updated successfully",
                     "data": [serializer.data],
@@ -419,7 +455,7 @@ class TaxAPIView(APIView):
                 }, status=200)
 
             logger.error(f"Failed to update Tax: {serializer.errors}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 400,
                 "message": "Validation failed",
                 "data": [],
@@ -428,7 +464,7 @@ class TaxAPIView(APIView):
 
         except Exception as e:
             logger.error(f"Internal Server Error: {str(e)}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -440,26 +476,26 @@ class TaxAPIView(APIView):
             tax = Tax.objects.filter(pk=tax_id).first()
             if tax is None:
                 logger.error(f"Tax with ID {tax} not found")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 404,
                     "message": "Tax not found",
                     "data": [],
                     "error": []
                 }, status=404)
 
-            tax_id = tax.tax_id
-            tax.delete()
-            logger.info(f"Deleted tax: {tax_id}")
-            return JsonResponse({
-                "error_code": 200,
-                "message": "Tax deleted successfully",
-                "data": [],
+            job = enqueue_deletion('tax', tax.pk)
+            tax_cache.invalidate()
+            logger.info(f"Queued deletion of tax {tax.pk}: job {job.job_id}")
+            return api_response(request, {
+                "error_code": 202,
+                "message": "Tax deletion queued",
+                "data": JobSerializer(job).data,
                 "error": []
-            }, status=200)
+            }, status=202)
 
         except Exception as e:
             logger.error(f"Internal Server Error: {str(e)}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -468,21 +504,24 @@ class TaxAPIView(APIView):
 
 
 class GSTAPIView(APIView):
+    @method_decorator(condition(etag_func=versioned_etag('gst_details')))
     def get(self, request, gst_id=None, *args, **kwargs):
         try:
+            fields = requested_fields(request, GSTDetailSerializer)
             if gst_id:
-                gst = GSTDetails.objects.filter(gst_id=gst_id).first()
+                gst = only_fields(GSTDetails.objects.filter(
+                    gst_id=gst_id), fields).first()
                 if gst is None:
-                    return JsonResponse({
+                    return api_response(request, {
                         "error_code": 404,
                         "message": "GST not found",
                         "data": [],
                         "error": []
                     }, status=404)
 
-                serializer = GSTDetailSerializer(gst)
+                serializer = GSTDetailSerializer(gst, fields=fields)
                 logger.info(f"Fetched GST: {gst.gst_id}")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 200,
                     "message": "GST found",
                     "data": [serializer.data],
@@ -490,27 +529,35 @@ class GSTAPIView(APIView):
                 }, status=200)
 
             else:
-                gsts = GSTDetails.objects.all()
+                gsts = only_fields(GSTDetails.objects.all(), fields)
                 logger.warning("No GST's found")
                 if not gsts:
-                    return JsonResponse({
+                    return api_response(request, {
                         "error_code": 400,
                         "message": "No GST's found",
                         "data": [],
                         "error": []
                     }, status=400)
 
-                serializer = GSTDetailSerializer(gsts, many=True)
+                serializer = GSTDetailSerializer(gsts, many=True, fields=fields)
                 logger.info("Fetched all GST's")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 200,
                     "message": "Data found",
                     "data": serializer.data,
                     "error": []
                 }, status=200)
 
+        except InvalidFieldset as e:
+            return api_response(request, {
+                "error_code": 400,
+                "message": "Invalid fields",
+                "data": [],
+                "error": [str(e)]
+            }, status=400)
+
         except Exception as e:
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -524,7 +571,7 @@ class GSTAPIView(APIView):
                 serializer.save()
                 logger.info(f"Created GST: {serializer.data['gst_id']}")
 
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 200,
                     "message": "GST created successfully",
                     "data": [serializer.data],
@@ -532,7 +579,7 @@ class GSTAPIView(APIView):
                 }, status=201)
 
             logger.error(f"Failed to create GST: {serializer.errors}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 400,
                 "message": "Validation failed",
                 "data": [],
@@ -540,7 +587,7 @@ class GSTAPIView(APIView):
             }, status=400)
 
         except Exception as e:
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -552,7 +599,7 @@ class GSTAPIView(APIView):
             gst = GSTDetails.objects.filter(pk=gst_id).first()
             if gst is None:
                 logger.error(f"GST with ID {gst_id} not found")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 404,
                     "message": "GST not found",
                     "data": [],
@@ -563,7 +610,7 @@ class GSTAPIView(APIView):
             if serializer.is_valid():
                 serializer.save()
                 logger.info(f"Updated GST: {gst.gst_id}")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 200,
                     "message": "GST updated successfully",
                     "data": [serializer.data],
@@ -571,7 +618,7 @@ class GSTAPIView(APIView):
                 }, status=200)
 
             logger.error(f"Failed to update GST: {serializer.errors}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 400,
                 "message": "Validation failed",
                 "data": [],
@@ -580,7 +627,7 @@ class GSTAPIView(APIView):
 
         except Exception as e:
             logger.error(f"Internal Server Error: {str(e)}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -592,7 +639,7 @@ class GSTAPIView(APIView):
             gst = GSTDetails.objects.filter(pk=gst_id).first()
             if gst is None:
                 logger.error(f"GST with ID {gst_id} not found")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 404,
                     "message": "GST not found",
                     "data": [],
@@ -602,7 +649,7 @@ class GSTAPIView(APIView):
             gst_id = gst.gst_id
             gst.delete()
             logger.info(f"Deleted GST: {gst_id}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 200,
                 "message": "GST deleted successfully",
                 "data": [],
@@ -611,9 +658,30 @@ class GSTAPIView(APIView):
 
         except Exception as e:
             logger.error(f"Internal Server Error: {str(e)}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
                 "error": traceback.format_exc().splitlines()
             }, status=500)
+
+
+class ReferenceCacheStatsAPIView(APIView):
+    def get(self, request, *args, **kwargs):
+        try:
+            return api_response(request, {
+                "error_code": 200,
+                "message": "Data found",
+                "data": [cache.stats() for cache in REFERENCE_CACHES.values()],
+                "error": []
+            }, status=200)
+
+        except Exception as e:
+            logger.error(f"Internal Server Error: {str(e)}")
+            return api_response(request, {
+                "error_code": 500,
+                "message": "Internal Server Error",
+                "data": [],
+                "error": traceback.format_exc().splitlines()
+            }, status=500)
+
@@ -1,17 +1,42 @@
+from django.contrib.postgres.indexes import BrinIndex, GinIndex
 from django.db import models
+from django.utils import timezone
 
 STATUS_CHOICES = [
     ('active', 'Active'),
     ('inactive', 'Inactive'),
 ]
 
+JOB_STATUS_CHOICES = [
+    ('queued', 'Queued'),
+    ('running', 'Running'),
+    ('completed', 'Completed'),
+    ('failed', 'Failed'),
+    ('cancelled', 'Cancelled'),
+]
+
+DOCUMENT_KIND_CHOICES = [
+    ('bill', 'Bill'),
+    ('invoice', 'Invoice'),
+]
+
+IMPORT_STATUS_CHOICES = [
+    ('running', 'Running'),
+    ('completed', 'Completed'),
+]
+
 
 class Items(models.Model):
     item_id = models.BigAutoField(primary_key=True)
     item_name = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
 
     class Meta:
         db_table = "items"
+        indexes = [
+            GinIndex(fields=['item_name'], opclasses=['gin_trgm_ops'],
+                     name='items_name_trgm'),
+        ]
 
     def __str__(self):
         return self.item_name
@@ -20,6 +45,7 @@ class Items(models.Model):
 class Remarks(models.Model):
     remark_id = models.BigAutoField(primary_key=True)
     remark = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
 
     class Meta:
         db_table = "remarks"
@@ -33,6 +59,7 @@ class Tax(models.Model):
     tax_percentage = models.DecimalField(max_digits=5, decimal_places=2)
     default_tax = models.DecimalField(max_digits=5, decimal_places=2, default=5)
     description = models.TextField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
 
     class Meta:
         db_table = "tax"
@@ -57,9 +84,20 @@ class Party(models.Model):
     gst = models.CharField(max_length=20, null=True, blank=True)
     invoice_number = models.CharField(max_length=50, null=True, blank=True)
     invoice_date = models.DateField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
 
     class Meta:
         db_table = "party"
+        indexes = [
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'],
+                     name='party_name_trgm'),
+            GinIndex(fields=['contact_person'], opclasses=['gin_trgm_ops'],
+                     name='party_contact_person_trgm'),
+            GinIndex(fields=['city'], opclasses=['gin_trgm_ops'],
+                     name='party_city_trgm'),
+            GinIndex(fields=['gst'], opclasses=['gin_trgm_ops'],
+                     name='party_gst_trgm'),
+        ]
 
     def __str__(self):
         return self.name
@@ -142,6 +180,13 @@ class CompanyPartyInvoiceDetails(models.Model):
 
 
 class Transactions(models.Model):
+    """
+    Stored as a table partitioned by company_financial_year, one partition
+    per financial year, created when the year is inserted. The database
+    primary key is (transaction_id, company_financial_year_id), since a
+    partitioned table's keys must include the partition column;
+    transaction_id alone is still unique, being drawn from one sequence.
+    """
     transaction_id = models.BigAutoField(primary_key=True)
     bill_no = models.CharField(max_length=100, null=True, blank=True)
     bill_date = models.DateField(null=True, blank=True)
@@ -164,6 +209,202 @@ class Transactions(models.Model):
 
     class Meta:
         db_table = "transactions"
+        indexes = [
+            models.Index(fields=['company', 'company_financial_year', 'bill_date'],
+                         name='trnx_company_fy_date_idx'),
+            models.Index(fields=['party', 'bill_date'],
+                         name='trnx_party_date_idx'),
+            models.Index(fields=['seller_party', 'bill_date'],
+                         name='trnx_seller_party_date_idx'),
+            models.Index(fields=['bill_date', 'transaction_id'],
+                         name='trnx_date_id_idx'),
+            models.Index(fields=['product', 'bill_date'],
+                         name='trnx_product_date_idx'),
+            models.Index(fields=['bill_no', 'transaction_id'],
+                         name='trnx_bill_no_id_idx'),
+            models.Index(fields=['party_bill_no'],
+                         name='trnx_party_bill_no_idx'),
+            BrinIndex(fields=['bill_date'], name='trnx_bill_date_brin'),
+        ]
 
     def __str__(self):
         return f"Transaction {self.transaction_id} - {self.party.name if self.party else 'Unknown'}"
+
+
+class BrokerageRollup(models.Model):
+    """
+    Transaction totals per company, financial year, month, party, seller
+    party and product, kept up to date by every write to transactions.
+    Bills without a date are counted under bms_app.rollup.UNDATED_MONTH.
+    """
+    id = models.BigAutoField(primary_key=True)
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name="brokerage_rollups")
+    financial_year = models.ForeignKey(FinancialYear, on_delete=models.CASCADE, related_name="brokerage_rollups")
+    month = models.DateField()
+    party = models.ForeignKey(Party, on_delete=models.CASCADE, related_name="rollups_as_party")
+    seller_party = models.ForeignKey(Party, on_delete=models.CASCADE, related_name="rollups_as_seller_party")
+    product = models.ForeignKey(Items, on_delete=models.CASCADE, related_name="rollups")
+    quantity = models.BigIntegerField(default=0)
+    amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    brokerage_amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    brokerage_gst = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    tax_amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    transaction_count = models.BigIntegerField(default=0)
+    revision = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = "brokerage_rollup"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['company', 'financial_year', 'month', 'party', 'seller_party', 'product'],
+                name='brokerage_rollup_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Rollup {self.company_id}/{self.financial_year_id}/{self.month}"
+
+class TransactionImport(models.Model):
+    import_id = models.BigAutoField(primary_key=True)
+    source = models.CharField(max_length=500)
+    financial_year = models.ForeignKey(FinancialYear, on_delete=models.CASCADE, related_name="transaction_imports")
+    records_done = models.BigIntegerField(default=0)
+    rows_imported = models.BigIntegerField(default=0)
+    rows_rejected = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=IMPORT_STATUS_CHOICES, default='running')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "transaction_import"
+
+    def __str__(self):
+        return f"Import {self.import_id} of {self.source}"
+
+
+class TransactionArchive(models.Model):
+    """
+    A financial year whose transactions were moved out of the transactions
+    table into a Parquet file by archive_financial_year.
+    """
+    archive_id = models.BigAutoField(primary_key=True)
+    financial_year = models.OneToOneField(FinancialYear, on_delete=models.CASCADE, related_name="transaction_archive")
+    path = models.CharField(max_length=500)
+    rows = models.BigIntegerField(default=0)
+    min_transaction_id = models.BigIntegerField(null=True, blank=True)
+    max_transaction_id = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "transaction_archive"
+
+    def __str__(self):
+        return f"Archive of financial year {self.financial_year_id}"
+
+
+class GSTMonthSummary(models.Model):
+    """
+    Cached GST totals of one completed month, per (tax, party), as the GST
+    summary report computed them. They stay valid while the month's
+    brokerage rollup rows keep the same count and revision total, which
+    change with every write to a transaction of the month.
+    """
+    id = models.BigAutoField(primary_key=True)
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name="gst_month_summaries")
+    financial_year = models.ForeignKey(FinancialYear, on_delete=models.CASCADE, related_name="gst_month_summaries")
+    month = models.DateField()
+    rollup_rows = models.BigIntegerField()
+    rollup_revision = models.BigIntegerField()
+    groups = models.JSONField(default=list)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "gst_month_summary"
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'financial_year', 'month'],
+                                    name='gst_month_summary_uniq'),
+        ]
+
+    def __str__(self):
+        return f"GST summary {self.company_id}/{self.financial_year_id}/{self.month}"
+
+
+class DocumentSequence(models.Model):
+    """
+    Last bill or invoice number handed out for a company and financial
+    year, see numbering.allocate_numbers.
+    """
+    id = models.BigAutoField(primary_key=True)
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name="document_sequences")
+    financial_year = models.ForeignKey(FinancialYear, on_delete=models.CASCADE, related_name="document_sequences")
+    kind = models.CharField(max_length=10, choices=DOCUMENT_KIND_CHOICES)
+    last_value = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = "document_sequence"
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'financial_year', 'kind'],
+                                    name='document_sequence_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.financial_year_id}: {self.last_value}"
+
+
+class Job(models.Model):
+    """
+    Background job run by the run_workers command. `kind` names the
+    handler and `params` its arguments; handlers save `progress` as they
+    go, which also renews the worker's lease. A job whose worker stopped
+    renewing it is taken over once `locked_until` passes. Failed attempts
+    are retried after a growing delay until `max_attempts` is reached.
+    """
+    job_id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=50)
+    company = models.ForeignKey(Company, on_delete=models.SET_NULL, null=True, blank=True, related_name="jobs")
+    params = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=JOB_STATUS_CHOICES, default='queued')
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=1)
+    run_after = models.DateTimeField(default=timezone.now)
+    progress = models.JSONField(default=dict)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+    cancel_requested = models.BooleanField(default=False)
+    worker = models.CharField(max_length=100, null=True, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "job"
+        indexes = [
+            models.Index(fields=['status', 'run_after', 'job_id'], name='job_status_idx'),
+            models.Index(fields=['company', 'status'], name='job_company_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Job {self.job_id} {self.kind}: {self.status}"
+
+
+class TableVersion(models.Model):
+    """
+    Per-table change counter, bumped by a statement-level trigger on every
+    write. Each table has several slots so concurrent writers rarely wait
+    on the same row; the table's version is the sum of its slots.
+    """
+    id = models.BigAutoField(primary_key=True)
+    table_name = models.CharField(max_length=63)
+    slot = models.SmallIntegerField()
+    version = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = "table_version"
+        constraints = [
+            models.UniqueConstraint(fields=['table_name', 'slot'],
+                                    name='table_version_table_slot_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.table_name}[{self.slot}]: {self.version}"
@@ -0,0 +1,57 @@
+from django.db import connection
+from .models import Company
+
+
+def allocate_numbers(company_id, financial_year_id, kind, count=1):
+    """
+    Takes the next `count` numbers of the (company, financial year) `kind`
+    sequence, 'bill' or 'invoice', and returns the first.
+
+    The counter row is created on first use and stays locked until the
+    calling transaction ends, so numbers of a rolled back transaction are
+    handed out again and the sequence has no gaps. Writers to other years
+    or companies never wait; writers to the same one wait only for the
+    rest of each other's transaction, so allocate just before saving.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO document_sequence (company_id, financial_year_id, kind, last_value)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (company_id, financial_year_id, kind)
+            DO UPDATE SET last_value = document_sequence.last_value + EXCLUDED.last_value
+            RETURNING last_value
+        """, [company_id, financial_year_id, kind, count])
+        return cursor.fetchone()[0] - count + 1
+
+
+def format_number(head, number):
+    return f"{head}{number}" if head else str(number)
+
+
+def next_number(company, financial_year_id, kind):
+    """
+    The next formatted number of the sequence, prefixed with the
+    company's invoice_head.
+    """
+    return format_number(company.invoice_head,
+                         allocate_numbers(company.pk, financial_year_id, kind))
+
+
+def assign_bill_numbers(transactions):
+    """
+    Gives every unsaved transaction without a bill_no the next number of
+    its company and year, with one allocation per (company, year). Years
+    are allocated in sorted order so concurrent bulk writers cannot
+    deadlock.
+    """
+    groups = {}
+    for trnx in transactions:
+        if not trnx.bill_no:
+            key = (trnx.company_id, trnx.company_financial_year_id)
+            groups.setdefault(key, []).append(trnx)
+    heads = dict(Company.objects.filter(pk__in={company for company, _ in groups})
+                 .values_list('pk', 'invoice_head'))
+    for (company_id, financial_year_id), rows in sorted(groups.items()):
+        first = allocate_numbers(company_id, financial_year_id, 'bill', len(rows))
+        for offset, trnx in enumerate(rows):
+            trnx.bill_no = format_number(heads[company_id], first + offset)
@@ -0,0 +1,165 @@
+import base64
+import binascii
+import json
+from datetime import date
+from operator import attrgetter
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+
+
+class InvalidPageRequest(ValueError):
+    pass
+
+
+# ?ordering= columns of the transaction list, with how their values are
+# written to and read from a cursor. Each has an index ending in
+# transaction_id, which breaks ties so every row has a unique position.
+SORT_KEYS = {
+    'bill_date': (date.isoformat, date.fromisoformat),
+    'bill_no': (str, str),
+    'transaction_id': (int, int),
+}
+
+DEFAULT_ORDERING = 'bill_date'
+
+
+def get_ordering(request):
+    """
+    The request's ?ordering=, a SORT_KEYS column prefixed with '-' for
+    descending order.
+    """
+    ordering = request.GET.get('ordering') or DEFAULT_ORDERING
+    if ordering.removeprefix('-') not in SORT_KEYS:
+        raise InvalidPageRequest(
+            f"ordering must be one of: {', '.join(SORT_KEYS)}, optionally prefixed with '-'")
+    return ordering
+
+
+def sort_column(ordering):
+    return ordering.removeprefix('-')
+
+
+def encode_cursor(value, transaction_id, ordering=DEFAULT_ORDERING):
+    """
+    Packs the sort key of the last row on a page into an opaque token.
+    """
+    dump = SORT_KEYS[sort_column(ordering)][0]
+    raw = json.dumps([ordering, None if value is None else dump(value),
+                      transaction_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, ordering=DEFAULT_ORDERING):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_ordering, value, transaction_id = json.loads(
+            base64.urlsafe_b64decode(padded))
+        load = SORT_KEYS[sort_column(ordering)][1]
+        key = (None if value is None else load(value), int(transaction_id))
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidPageRequest("Invalid cursor")
+    if cursor_ordering != ordering:
+        raise InvalidPageRequest("Cursor belongs to a different ordering")
+    return key
+
+
+def get_page_size(request):
+    value = request.GET.get('page_size')
+    if value in (None, ''):
+        return settings.BMS_PAGE_SIZE
+    try:
+        page_size = int(value)
+    except ValueError:
+        raise InvalidPageRequest("page_size must be an integer")
+    if page_size < 1:
+        raise InvalidPageRequest("page_size must be positive")
+    return min(page_size, settings.BMS_MAX_PAGE_SIZE)
+
+
+def after_cursor(value, transaction_id, ordering=DEFAULT_ORDERING):
+    """
+    Rows that sort after (value, transaction_id) in `ordering`: ascending
+    with NULLs last, or descending with NULLs first, then transaction_id
+    in the same direction.
+    """
+    column = sort_column(ordering)
+    descending = ordering.startswith('-')
+    after_id = Q(transaction_id__lt=transaction_id) if descending else Q(
+        transaction_id__gt=transaction_id)
+    if column == 'transaction_id':
+        return after_id
+    if value is None:
+        if descending:
+            return (Q(**{f"{column}__isnull": True}) & after_id
+                    | Q(**{f"{column}__isnull": False}))
+        return Q(**{f"{column}__isnull": True}) & after_id
+    if descending:
+        return (Q(**{f"{column}__lt": value})
+                | Q(**{column: value}) & after_id)
+    return (Q(**{f"{column}__gt": value})
+            | Q(**{column: value}) & after_id
+            | Q(**{f"{column}__isnull": True}))
+
+
+def order_by_key(queryset, ordering=DEFAULT_ORDERING):
+    column = sort_column(ordering)
+    if column == 'transaction_id':
+        return queryset.order_by(ordering)
+    if ordering.startswith('-'):
+        return queryset.order_by(F(column).desc(nulls_first=True), '-transaction_id')
+    return queryset.order_by(F(column).asc(nulls_last=True), 'transaction_id')
+
+
+def keyset_queryset(queryset, request, ordering=DEFAULT_ORDERING):
+    """
+    Orders the queryset for keyset pagination and seeks past the request's
+    cursor. Returns the queryset sliced to one row more than the page size,
+    so a full page tells whether another one follows, and the page size.
+    """
+    page_size = get_page_size(request)
+    cursor = request.GET.get('cursor')
+
+    queryset = order_by_key(queryset, ordering)
+    if cursor:
+        queryset = queryset.filter(
+            after_cursor(*decode_cursor(cursor, ordering), ordering))
+    return queryset[:page_size + 1], page_size
+
+
+PAGE_KEY = attrgetter('bill_date', 'transaction_id')
+
+
+def split_page(rows, page_size, key=PAGE_KEY, ordering=DEFAULT_ORDERING):
+    """
+    Trims the extra look-ahead row. `key` returns the sort column value
+    and transaction_id of a row; pass an itemgetter for values_list() rows.
+    """
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(*key(rows[-1]), ordering)
+    return rows, next_cursor
+
+
+def keyset_page(queryset, request, key=PAGE_KEY, ordering=DEFAULT_ORDERING):
+    """
+    Returns one page of transactions, the cursor for the next one and the
+    page size.
+
+    Seeks past the cursor instead of using OFFSET, so every page costs
+    the same index range scan no matter how deep the client has paged.
+    """
+    queryset, page_size = keyset_queryset(queryset, request, ordering)
+    rows, next_cursor = split_page(list(queryset), page_size, key, ordering)
+    return rows, next_cursor, page_size
+
+
+def approximate_count(queryset):
+    """
+    Row estimate from the planner statistics instead of COUNT(*).
+    """
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
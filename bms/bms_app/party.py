@@ -1,9 +1,17 @@
 import logging
 import traceback
-from django.http import JsonResponse
+from django.db import transaction
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from rest_framework.views import APIView
+from .fieldsets import InvalidFieldset, only_fields, requested_fields
 from .models import Party, CompanyPartyInvoiceDetails
-from .serializers import PartySerializer, CompanyPartyInvoiceSerializer
+from .numbering import next_number
+from .purge import enqueue_deletion
+from .responses import api_response
+from .rowencoders import row_encoder
+from .serializers import PartySerializer, CompanyPartyInvoiceSerializer, InvoiceFilterSerializer, JobSerializer
+from .versions import versioned_etag
 
 # Setup logger
 logger = logging.getLogger(__name__)
@@ -12,21 +20,24 @@ logging.basicConfig(level=logging.INFO,
 
 
 class PartyAPIView(APIView):
+    @method_decorator(condition(etag_func=versioned_etag('party')))
     def get(self, request, party_id=None, *args, **kwargs):
         try:
+            fields = requested_fields(request, PartySerializer)
             if party_id:
-                party = Party.objects.filter(party_id=party_id).first()
+                party = only_fields(Party.objects.filter(
+                    party_id=party_id), fields).first()
                 if party is None:
-                    return JsonResponse({
+                    return api_response(request, {
                         "error_code": 404,
                         "message": "Party not found",
                         "data": [],
                         "error": []
                     }, status=404)
 
-                serializer = PartySerializer(party)
+                serializer = PartySerializer(party, fields=fields)
                 logger.info(f"Fetched party: {party.party_id}")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 200,
                     "message": "Party found",
                     "data": [serializer.data],
@@ -34,27 +45,35 @@ class PartyAPIView(APIView):
                 }, status=200)
 
             else:
-                partys = Party.objects.all()
+                encoder = row_encoder(PartySerializer, fields)
+                partys = list(encoder.values(Party.objects.all()))
                 logger.warning("No Partys found")
                 if not partys:
-                    return JsonResponse({
+                    return api_response(request, {
                         "error_code": 400,
                         "message": "No partys found",
                         "data": [],
                         "error": []
                     }, status=400)
 
-                serializer = PartySerializer(partys, many=True)
                 logger.info("Fetched all partys")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 200,
                     "message": "Data found",
-                    "data": serializer.data,
+                    "data": encoder.encode_rows(partys),
                     "error": []
                 }, status=200)
 
+        except InvalidFieldset as e:
+            return api_response(request, {
+                "error_code": 400,
+                "message": "Invalid fields",
+                "data": [],
+                "error": [str(e)]
+            }, status=400)
+
         except Exception as e:
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -68,7 +87,7 @@ class PartyAPIView(APIView):
                 serializer.save()
                 logger.info(f"Created Party: {serializer.data['party_id']}")
 
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 200,
                     "message": "Party created successfully",
                     "data": [serializer.data],
@@ -76,7 +95,7 @@ class PartyAPIView(APIView):
                 }, status=201)
 
             logger.error(f"Failed to create party: {serializer.errors}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 400,
                 "message": "Validation failed",
                 "data": [],
@@ -84,7 +103,7 @@ class PartyAPIView(APIView):
             }, status=400)
 
         except Exception as e:
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -96,7 +115,7 @@ class PartyAPIView(APIView):
             party = Party.objects.filter(pk=party_id).first()
             if party is None:
                 logger.error(f"Party with ID {party_id} not found")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 404,
                     "message": "Party not found",
                     "data": [],
@@ -107,7 +126,7 @@ class PartyAPIView(APIView):
             if serializer.is_valid():
                 serializer.save()
                 logger.info(f"Updated party: {party.party_id}")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 200,
                     "message": "Party updated successfully",
                     "data": [serializer.data],
@@ -115,7 +134,7 @@ class PartyAPIView(APIView):
                 }, status=200)
 
             logger.error(f"Failed to update Party: {serializer.errors}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 400,
                 "message": "Validation failed",
                 "data": [],
@@ -124,7 +143,7 @@ class PartyAPIView(APIView):
 
         except Exception as e:
             logger.error(f"Internal Server Error: {str(e)}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -136,26 +155,99 @@ class PartyAPIView(APIView):
             party = Party.objects.filter(pk=party_id).first()
             if party is None:
                 logger.error(f"Tax with ID {party_id} not found")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 404,
                     "message": "Party not found",
                     "data": [],
                     "error": []
                 }, status=404)
 
-            party_id = party.party_id
-            party.delete()
-            logger.info(f"Deleted party: {party_id}")
-            return JsonResponse({
-                "error_code": 200,
-                "message": "Party deleted successfully",
+            job = enqueue_deletion('party', party.pk)
+            logger.info(f"Queued deletion of party {party.pk}: job {job.job_id}")
+            return api_response(request, {
+                "error_code": 202,
+                "message": "Party deletion queued",
+                "data": JobSerializer(job).data,
+                "error": []
+            }, status=202)
+
+        except Exception as e:
+            logger.error(f"Internal Server Error: {str(e)}")
+            return api_response(request, {
+                "error_code": 500,
+                "message": "Internal Server Error",
                 "data": [],
+                "error": traceback.format_exc().splitlines()
+            }, status=500)
+
+
+class CompanyPartyInvoiceAPIView(APIView):
+    """
+    Lists a company's party invoices, filtered by ?company=,
+    ?financial_year= and ?party=, and creates them. An invoice posted
+    without an invoice_number gets the next one of its company and year.
+    """
+
+    def get(self, request, *args, **kwargs):
+        try:
+            filters = InvoiceFilterSerializer(data=request.GET)
+            if not filters.is_valid():
+                return api_response(request, {
+                    "error_code": 400,
+                    "message": "Validation failed",
+                    "data": [],
+                    "error": filters.errors
+                }, status=400)
+
+            invoices = CompanyPartyInvoiceDetails.objects.filter(
+                **filters.validated_data).order_by('id')
+            data = CompanyPartyInvoiceSerializer(invoices, many=True).data
+            return api_response(request, {
+                "error_code": 200,
+                "message": "Data found" if data else "No invoices found",
+                "data": data,
                 "error": []
             }, status=200)
 
         except Exception as e:
             logger.error(f"Internal Server Error: {str(e)}")
-            return JsonResponse({
+            return api_response(request, {
+                "error_code": 500,
+                "message": "Internal Server Error",
+                "data": [],
+                "error": traceback.format_exc().splitlines()
+            }, status=500)
+
+    def post(self, request, *args, **kwargs):
+        try:
+            serializer = CompanyPartyInvoiceSerializer(data=request.data)
+            if serializer.is_valid():
+                data = serializer.validated_data
+                with transaction.atomic():
+                    if data.get('invoice_number'):
+                        serializer.save()
+                    else:
+                        serializer.save(invoice_number=next_number(
+                            data['company'], data['financial_year'].pk, 'invoice'))
+                logger.info(f"Created invoice: {serializer.data['invoice_number']}")
+                return api_response(request, {
+                    "error_code": 200,
+                    "message": "Invoice created successfully",
+                    "data": [serializer.data],
+                    "error": []
+                }, status=201)
+
+            logger.error(f"Failed to create invoice: {serializer.errors}")
+            return api_response(request, {
+                "error_code": 400,
+                "message": "Validation failed",
+                "data": [],
+                "error": serializer.errors
+            }, status=400)
+
+        except Exception as e:
+            logger.error(f"Internal Server Error: {str(e)}")
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -0,0 +1,38 @@
+import io
+
+ESCAPES = str.maketrans({
+    '\\': '\\\\',
+    '\t': '\\t',
+    '\n': '\\n',
+    '\r': '\\r',
+})
+
+
+def format_copy_row(values):
+    """
+    Formats one row in PostgreSQL COPY text format.
+    """
+    return '\t'.join(
+        r'\N' if value is None else str(value).translate(ESCAPES)
+        for value in values) + '\n'
+
+
+def copy_rows(cursor, table, columns, rows):
+    """
+    Loads rows into `table` with COPY FROM STDIN on a Django cursor.
+
+    Works with both psycopg2 and psycopg 3 connections.
+    """
+    quote_name = cursor.db.ops.quote_name
+    sql = "COPY {} ({}) FROM STDIN".format(
+        quote_name(table), ', '.join(quote_name(column) for column in columns))
+    buffer = io.StringIO()
+    buffer.writelines(format_copy_row(row) for row in rows)
+    buffer.seek(0)
+
+    raw_cursor = cursor.cursor
+    if hasattr(raw_cursor, 'copy_expert'):
+        raw_cursor.copy_expert(sql, buffer)
+    else:
+        with raw_cursor.copy(sql) as copy:
+            copy.write(buffer.getvalue())
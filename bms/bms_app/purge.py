@@ -0,0 +1,186 @@
+import logging
+import os
+from functools import partial
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from .archive import PARTITION_PREFIX, drop_partition
+from .jobs import enqueue_job, job_handler, save_progress
+from .models import (BrokerageRollup, Company, CompanyPartyInvoiceDetails, DocumentSequence,
+                     FinancialYear, GSTDetails, GSTMonthSummary, Items, Job, Party, Remarks,
+                     Tax, TransactionArchive, TransactionImport)
+from .rollup import rollup_merge_sql
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+DELETION_TARGETS = {
+    'company': Company,
+    'party': Party,
+    'item': Items,
+    'tax': Tax,
+    'remark': Remarks,
+}
+
+# What each target is purged of, in order, before the row itself is
+# deleted. ('partitions', ...) drops the transactions partitions of the
+# company's years whole; ('transactions', column) deletes the transactions
+# with that column set to the row; (model, lookup) deletes rows of model.
+PURGE_PLANS = {
+    'company': [
+        ('partitions', 'company'),
+        ('transactions', 'company_id'),
+        (BrokerageRollup, 'company'),
+        (GSTDetails, 'company'),
+        (CompanyPartyInvoiceDetails, 'company'),
+        (TransactionImport, 'financial_year__company'),
+        (TransactionArchive, 'financial_year__company'),
+        (DocumentSequence, 'company'),
+        (GSTMonthSummary, 'company'),
+        (FinancialYear, 'company'),
+    ],
+    'party': [
+        ('transactions', 'party_id'),
+        ('transactions', 'seller_party_id'),
+        (BrokerageRollup, 'party'),
+        (BrokerageRollup, 'seller_party'),
+        (CompanyPartyInvoiceDetails, 'party'),
+    ],
+    'item': [
+        ('transactions', 'product_id'),
+        (BrokerageRollup, 'product'),
+    ],
+    'tax': [
+        ('transactions', 'tax_id'),
+    ],
+    'remark': [
+        ('transactions', 'remark_id'),
+    ],
+}
+
+
+def step_label(step):
+    target, lookup = step
+    if isinstance(target, str):
+        return f"{target}.{lookup}"
+    return f"{target._meta.db_table}.{lookup}"
+
+
+def purge_batch(step, object_id, batch_size):
+    """
+    Deletes one batch of the rows `step` covers in its own transaction and
+    returns how many went, 0 once the step is done. Deleted transactions
+    are taken out of the brokerage rollup in the same statement.
+    """
+    target, lookup = step
+    with transaction.atomic(), connection.cursor() as cursor:
+        if target == 'partitions':
+            year_ids = FinancialYear.objects.filter(
+                company_id=object_id).values_list('pk', flat=True)
+            for year_id in year_ids:
+                partition = f"{PARTITION_PREFIX}{year_id}"
+                cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [partition])
+                if cursor.fetchone()[0]:
+                    drop_partition(cursor, partition)
+                    return 1
+            return 0
+
+        if target == 'transactions':
+            cursor.execute(f"""
+                WITH deleted AS (
+                    DELETE FROM transactions WHERE transaction_id IN (
+                        SELECT transaction_id FROM transactions
+                        WHERE {lookup} = %s LIMIT %s)
+                    RETURNING *
+                ), merged AS ({rollup_merge_sql('deleted', sign=-1)})
+                SELECT COUNT(*) FROM deleted
+            """, [object_id, batch_size])
+            return cursor.fetchone()[0]
+
+        pks = list(target.objects.filter(**{lookup: object_id})
+                   .values_list('pk', flat=True)[:batch_size])
+        if pks:
+            if target is TransactionArchive:
+                # The Parquet files go once their rows are gone for good.
+                paths = list(target.objects.filter(pk__in=pks).values_list('path', flat=True))
+                transaction.on_commit(partial(remove_files, paths))
+            target.objects.filter(pk__in=pks).delete()
+        return len(pks)
+
+
+def remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        logger.info(f"Removed archive {path}")
+
+
+def enqueue_deletion(target, object_id):
+    """
+    Marks the row inactive and queues the job that deletes it. A job
+    already queued or running for the row is returned as it is; a failed
+    or cancelled one is queued again and resumes where it stopped.
+    """
+    with transaction.atomic():
+        DELETION_TARGETS[target].objects.filter(pk=object_id).update(status='inactive')
+        job = Job.objects.select_for_update().filter(
+            kind='delete', params__target=target, params__object_id=object_id) \
+            .exclude(status='completed').order_by('-job_id').first()
+        if job is None:
+            return enqueue_job('delete', {'target': target, 'object_id': object_id},
+                               company_id=object_id if target == 'company' else None)
+        if job.status in ('failed', 'cancelled'):
+            job.status = 'queued'
+            job.attempts = 0
+            job.cancel_requested = False
+            job.run_after = timezone.now()
+            job.save(update_fields=['status', 'attempts', 'cancel_requested',
+                                    'run_after', 'updated_at'])
+        return job
+
+
+@job_handler('delete')
+def delete_job(job, batch_size=None):
+    """
+    Runs the remaining steps of a deletion batch by batch, saving the step
+    and the rows deleted so far after each batch, then deletes the row.
+    A cancelled deletion leaves the row inactive and part purged.
+
+    The row goes with a plain DELETE, since everything that referenced it
+    is purged by then. Should a write that began before the row turned
+    inactive have added a reference since, the foreign key check stops
+    the DELETE at commit and the plan runs again from the start.
+    """
+    batch_size = batch_size or settings.BMS_DELETE_BATCH_SIZE
+    target, object_id = job.params['target'], job.params['object_id']
+    plan = PURGE_PLANS[target]
+    step = job.progress.get('step', 0)
+    rows_deleted = job.progress.get('rows_deleted', 0)
+    rows = job.progress.get('rows', {})
+    model = DELETION_TARGETS[target]
+    while True:
+        while step < len(plan):
+            # The batch and the progress it made commit together.
+            with transaction.atomic():
+                deleted = purge_batch(plan[step], object_id, batch_size)
+                if deleted:
+                    label = step_label(plan[step])
+                    rows[label] = rows.get(label, 0) + deleted
+                    rows_deleted += deleted
+                else:
+                    step += 1
+                save_progress(job, step=step, rows_deleted=rows_deleted, rows=rows)
+
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {model._meta.db_table} "
+                               f"WHERE {model._meta.pk.column} = %s", [object_id])
+            break
+        except IntegrityError:
+            logger.warning(f"{target} {object_id} gained references while purged, purging again")
+            step = 0
+
+    logger.info(f"Deleted {target} {object_id}: {rows_deleted} rows")
+    return {'rows_deleted': rows_deleted}
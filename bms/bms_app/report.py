@@ -0,0 +1,350 @@
+import logging
+import traceback
+from datetime import timedelta
+from decimal import Decimal
+from django.db.models import Count, DateField, Q, Sum, Value
+from django.db.models.functions import Cast, Coalesce, TruncMonth
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from rest_framework.views import APIView
+from .archive import archived_gst_groups, archived_party_pairs, year_archive
+from .models import BrokerageRollup, GSTDetails, GSTMonthSummary, Party, Tax, Transactions
+from .responses import api_response
+from .rollup import UNDATED_MONTH
+from .serializers import GSTDetailSerializer, GSTSummaryQuerySerializer, PartySummaryQuerySerializer
+from .versions import versioned_etag
+
+# Setup logger
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+SUMMARY_TOTALS = {
+    'quantity': Sum('quantity'),
+    'amount': Sum('amount'),
+    'brokerage_amount': Sum('brokerage_amount'),
+    'brokerage_gst': Sum('brokerage_gst'),
+    'tax_amount': Sum('tax_amount'),
+    'transactions': Count('transaction_id'),
+}
+
+ROLLUP_SUMMARY_TOTALS = {
+    'quantity': Sum('quantity'),
+    'amount': Sum('amount'),
+    'brokerage_amount': Sum('brokerage_amount'),
+    'brokerage_gst': Sum('brokerage_gst'),
+    'tax_amount': Sum('tax_amount'),
+    'transactions': Sum('transaction_count'),
+}
+
+
+def empty_totals():
+    return {
+        'quantity': 0,
+        'amount': Decimal('0.00'),
+        'brokerage_amount': Decimal('0.00'),
+        'brokerage_gst': Decimal('0.00'),
+        'tax_amount': Decimal('0.00'),
+        'transactions': 0,
+    }
+
+
+def add_totals(target, row):
+    for key in target:
+        target[key] += row[key]
+
+
+def covers_whole_months(params):
+    from_date = params.get('from_date')
+    to_date = params.get('to_date')
+    return ((from_date is None or from_date.day == 1)
+            and (to_date is None or (to_date + timedelta(days=1)).day == 1))
+
+
+def party_summary(params):
+    """
+    Totals per party as buyer and as seller for one company and year.
+
+    When the date range is whole months the totals come from the brokerage
+    rollup, so the cost depends on the number of groups rather than the
+    number of transactions; otherwise transactions are aggregated directly,
+    from the archive's Parquet file when the year is archived.
+    Either way the rows are grouped by (party, seller_party) pair in a
+    single aggregation, and the pairs are folded into per-party totals here.
+    """
+    archive = None if covers_whole_months(params) else year_archive(params['financial_year'])
+    if archive is not None:
+        lookups = {'company_id': params['company']}
+        if 'from_date' in params:
+            lookups['bill_date__gte'] = params['from_date']
+        if 'to_date' in params:
+            lookups['bill_date__lte'] = params['to_date']
+        if 'item' in params:
+            lookups['product_id'] = params['item']
+        pairs = archived_party_pairs(archive, lookups, params.get('party'))
+    else:
+        pairs = summary_pairs(params)
+    return party_totals(pairs, params)
+
+
+def summary_pairs(params):
+    if covers_whole_months(params):
+        queryset = BrokerageRollup.objects.filter(
+            company_id=params['company'],
+            financial_year_id=params['financial_year'])
+        date_field, totals = 'month', ROLLUP_SUMMARY_TOTALS
+    else:
+        queryset = Transactions.objects.filter(
+            company_id=params['company'],
+            company_financial_year_id=params['financial_year'])
+        date_field, totals = 'bill_date', SUMMARY_TOTALS
+
+    if 'from_date' in params:
+        queryset = queryset.filter(**{f"{date_field}__gte": params['from_date']})
+    if 'to_date' in params:
+        queryset = queryset.filter(**{f"{date_field}__lte": params['to_date']})
+    if 'item' in params:
+        queryset = queryset.filter(product_id=params['item'])
+    if 'party' in params:
+        queryset = queryset.filter(
+            Q(party_id=params['party']) | Q(seller_party_id=params['party']))
+
+    return queryset.values('party_id', 'seller_party_id').annotate(
+        **totals).filter(transactions__gt=0).order_by()
+
+
+def party_totals(pairs, params):
+    """
+    Folds (party, seller_party) totals into totals per party as buyer and
+    as seller, named and sorted by party name.
+    """
+    summary = {}
+    for row in pairs:
+        for party_id, role in ((row['party_id'], 'as_buyer'),
+                               (row['seller_party_id'], 'as_seller')):
+            if party_id not in summary:
+                summary[party_id] = {'party_id': party_id, 'name': None,
+                                     'as_buyer': empty_totals(),
+                                     'as_seller': empty_totals()}
+            add_totals(summary[party_id][role], row)
+
+    if 'party' in params:
+        summary = {party_id: totals for party_id, totals in summary.items()
+                   if party_id == params['party']}
+
+    names = dict(Party.objects.filter(pk__in=summary).values_list('pk', 'name'))
+    for party_id, totals in summary.items():
+        totals['name'] = names.get(party_id)
+    return sorted(summary.values(), key=lambda totals: (totals['name'] or '',
+                                                        totals['party_id']))
+
+
+GST_TOTALS = ['amount', 'tax_amount', 'brokerage_gst']
+
+
+def empty_gst_totals():
+    return {'amount': Decimal('0.00'), 'tax_amount': Decimal('0.00'),
+            'brokerage_gst': Decimal('0.00'), 'transactions': 0}
+
+
+def next_month(month):
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def month_versions(company_id, financial_year_id):
+    """
+    (rows, revision total) of the brokerage rollup per month of the year.
+    Every write to a transaction bumps the revision of its month's rollup
+    row, so a month's pair changes whenever one of its transactions does.
+    """
+    return {row['month']: (row['rows'], row['revision']) for row in
+            BrokerageRollup.objects.filter(company_id=company_id,
+                                           financial_year_id=financial_year_id)
+            .values('month').annotate(rows=Count('pk'), revision=Sum('revision')).order_by()}
+
+
+def gst_groups(company_id, financial_year_id, months):
+    """
+    Totals per (month, tax, party) of the company's transactions in
+    `months`, in one aggregation over the year's partition.
+    """
+    in_months = Q()
+    for month in months:
+        if month == UNDATED_MONTH:
+            in_months |= Q(bill_date__isnull=True)
+        else:
+            in_months |= Q(bill_date__gte=month, bill_date__lt=next_month(month))
+    return Transactions.objects.filter(
+        in_months, company_id=company_id, company_financial_year_id=financial_year_id
+    ).annotate(
+        # TruncMonth gives a timestamp in SQL and only Coalesce's value
+        # comes back, so cast it to the date the months are keyed by.
+        month=Coalesce(Cast(TruncMonth('bill_date'), DateField()),
+                       Value(UNDATED_MONTH, output_field=DateField()))
+    ).values('month', 'tax_id', 'party_id').annotate(
+        **{column: Sum(column) for column in GST_TOTALS},
+        transactions=Count('transaction_id')).order_by()
+
+
+def cached_gst_groups(company_id, financial_year_id, months):
+    """
+    The (tax, party) totals of each of `months`, keyed by month. Completed
+    months are kept in gst_month_summary and recomputed only once their
+    rollup version moves; the rest are computed together in one query.
+    """
+    versions = month_versions(company_id, financial_year_id)
+    months = [month for month in months if month in versions]
+    groups = {}
+    for summary in GSTMonthSummary.objects.filter(
+            company_id=company_id, financial_year_id=financial_year_id, month__in=months):
+        if (summary.rollup_rows, summary.rollup_revision) == versions[summary.month]:
+            groups[summary.month] = summary.groups
+
+    missing = [month for month in months if month not in groups]
+    if missing:
+        computed = {month: [] for month in missing}
+        archive = year_archive(financial_year_id)
+        rows = (archived_gst_groups(archive, company_id, missing) if archive is not None
+                else gst_groups(company_id, financial_year_id, missing))
+        for row in rows:
+            month = row.pop('month')
+            computed[month].append({key: str(value) if isinstance(value, Decimal) else value
+                                    for key, value in row.items()})
+
+        current = timezone.localdate().replace(day=1)
+        GSTMonthSummary.objects.bulk_create([
+            GSTMonthSummary(company_id=company_id, financial_year_id=financial_year_id,
+                            month=month, rollup_rows=versions[month][0],
+                            rollup_revision=versions[month][1], groups=computed[month])
+            for month in missing if UNDATED_MONTH < month < current
+        ], update_conflicts=True, unique_fields=['company', 'financial_year', 'month'],
+            update_fields=['rollup_rows', 'rollup_revision', 'groups', 'computed_at'])
+        groups.update(computed)
+        logger.info(f"GST summary for company {company_id}: {len(months) - len(missing)} "
+                    f"months cached, {len(missing)} computed")
+    return groups
+
+
+def gst_month(month, groups, rates, gstins):
+    """
+    Folds one month's (tax, party) totals into totals per tax rate and per
+    party GSTIN; parties without a GSTIN are grouped under null.
+    """
+    totals, by_rate, by_gst = empty_gst_totals(), {}, {}
+    for row in groups:
+        amounts = {**{column: Decimal(row[column] or 0) for column in GST_TOTALS},
+                   'transactions': row['transactions']}
+        add_totals(totals, amounts)
+        add_totals(by_rate.setdefault(rates.get(row['tax_id']), empty_gst_totals()), amounts)
+        add_totals(by_gst.setdefault(gstins.get(row['party_id']), empty_gst_totals()), amounts)
+    return {
+        'month': None if month == UNDATED_MONTH else month,
+        'totals': totals,
+        'by_tax_rate': [{'tax_percentage': rate, **by_rate[rate]}
+                        for rate in sorted(by_rate, key=lambda rate: (rate is None, rate or 0))],
+        'by_party_gst': [{'gst': gst, **by_gst[gst]}
+                         for gst in sorted(by_gst, key=lambda gst: (gst is None, gst or ''))],
+    }
+
+
+def gst_summary(params):
+    """
+    Monthly taxable amount, tax and brokerage GST of a company and year,
+    by tax rate and by party GSTIN, with the company's GST details for
+    the year. Parties are the bills' parties (buyers).
+    """
+    company_id, financial_year_id = params['company'], params['financial_year']
+    months = sorted(month_versions(company_id, financial_year_id))
+    if 'month' in params:
+        months = [month for month in months if month == params['month'].replace(day=1)]
+    groups = cached_gst_groups(company_id, financial_year_id, months)
+
+    rows = [row for month_rows in groups.values() for row in month_rows]
+    rates = dict(Tax.objects.filter(pk__in={row['tax_id'] for row in rows})
+                 .values_list('pk', 'tax_percentage'))
+    gstins = dict(Party.objects.filter(pk__in={row['party_id'] for row in rows})
+                  .values_list('pk', 'gst'))
+    return {
+        'company': company_id,
+        'financial_year': financial_year_id,
+        'gst_details': GSTDetailSerializer(GSTDetails.objects.filter(
+            company_id=company_id, financial_year_id=financial_year_id), many=True).data,
+        'months': [gst_month(month, groups[month], rates, gstins)
+                   for month in months if groups.get(month)],
+    }
+
+
+class PartySummaryAPIView(APIView):
+    """
+    Party-wise quantity, amount, brokerage and tax totals for a company and
+    financial year.
+    """
+
+    @method_decorator(condition(etag_func=versioned_etag('transactions', 'party')))
+    def get(self, request, *args, **kwargs):
+        try:
+            query = PartySummaryQuerySerializer(data=request.GET)
+            if not query.is_valid():
+                return api_response(request, {
+                    "error_code": 400,
+                    "message": "Validation failed",
+                    "data": [],
+                    "error": query.errors
+                }, status=400)
+
+            data = party_summary(query.validated_data)
+            logger.info(f"Party summary for company {
+                        query.validated_data['company']}: {len(data)} parties")
+            return api_response(request, {
+                "error_code": 200,
+                "message": "Data found",
+                "data": data,
+                "error": []
+            }, status=200)
+
+        except Exception as e:
+            logger.error(f"Internal Server Error: {str(e)}")
+            return api_response(request, {
+                "error_code": 500,
+                "message": "Internal Server Error",
+                "data": [],
+                "error": traceback.format_exc().splitlines()
+            }, status=500)
+
+
+class GSTSummaryAPIView(APIView):
+    """
+    GST filing summary of a company and financial year, month by month,
+    or for one ?month=.
+    """
+
+    @method_decorator(condition(etag_func=versioned_etag(
+        'transactions', 'party', 'tax', 'gst_details')))
+    def get(self, request, *args, **kwargs):
+        try:
+            query = GSTSummaryQuerySerializer(data=request.GET)
+            if not query.is_valid():
+                return api_response(request, {
+                    "error_code": 400,
+                    "message": "Validation failed",
+                    "data": [],
+                    "error": query.errors
+                }, status=400)
+
+            data = gst_summary(query.validated_data)
+            return api_response(request, {
+                "error_code": 200,
+                "message": "Data found" if data['months'] else "No transactions found",
+                "data": data,
+                "error": []
+            }, status=200)
+
+        except Exception as e:
+            logger.error(f"Internal Server Error: {str(e)}")
+            return api_response(request, {
+                "error_code": 500,
+                "message": "Internal Server Error",
+                "data": [],
+                "error": traceback.format_exc().splitlines()
+            }, status=500)
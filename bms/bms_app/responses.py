@@ -0,0 +1,99 @@
+import json
+from decimal import Decimal
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import BaseRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_TYPE = 'application/json'
+MSGPACK_TYPE = 'application/msgpack'
+
+django_encoder = DjangoJSONEncoder()
+
+
+def encode_default(value):
+    """
+    Types neither encoder handles natively. Decimals become strings so no
+    precision is lost, the rest are encoded as DjangoJSONEncoder does.
+    """
+    if isinstance(value, Decimal):
+        return str(value)
+    return django_encoder.default(value)
+
+
+def dumps_json(data):
+    """
+    Encodes `data` as JSON bytes, with orjson when it is installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, default=encode_default,
+                            option=orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+
+def dumps_msgpack(data):
+    return msgpack.packb(data, default=encode_default, use_bin_type=True)
+
+
+def media_quality(media_type):
+    try:
+        return float(media_type.params.get('q', 1))
+    except ValueError:
+        return 0.0
+
+
+def wants_msgpack(request):
+    """
+    True when the Accept header names MessagePack at least as strongly as
+    JSON. Wildcards alone never select it.
+    """
+    if msgpack is None:
+        return False
+    msgpack_quality = json_quality = 0.0
+    for media_type in request.accepted_types:
+        quality = media_quality(media_type)
+        if f"{media_type.main_type}/{media_type.sub_type}" == MSGPACK_TYPE:
+            msgpack_quality = max(msgpack_quality, quality)
+        elif media_type.match(JSON_TYPE):
+            json_quality = max(json_quality, quality)
+    return msgpack_quality > 0 and msgpack_quality >= json_quality
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Lets DRF content negotiation accept `Accept: application/msgpack`.
+    """
+    media_type = MSGPACK_TYPE
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return dumps_msgpack(data)
+
+
+def api_response(request, data, status=200):
+    """
+    Renders the response envelope as MessagePack or JSON, depending on
+    what the client accepts.
+    """
+    if wants_msgpack(request):
+        response = HttpResponse(dumps_msgpack(data), status=status,
+                                content_type=MSGPACK_TYPE)
+    else:
+        response = HttpResponse(dumps_json(data), status=status,
+                                content_type=JSON_TYPE)
+    patch_vary_headers(response, ['Accept'])
+    return response
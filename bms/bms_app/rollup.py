@@ -0,0 +1,119 @@
+from datetime import date
+from django.db import connection, transaction
+
+UNDATED_MONTH = date(1, 1, 1)
+
+ROLLUP_KEY = ['company_id', 'financial_year_id', 'month',
+              'party_id', 'seller_party_id', 'product_id']
+
+ROLLUP_TOTALS = ['quantity', 'amount', 'brokerage_amount',
+                 'brokerage_gst', 'tax_amount', 'transaction_count']
+
+ROLLUP_CONFLICT = """
+    ON CONFLICT (company_id, financial_year_id, month, party_id, seller_party_id, product_id)
+    DO UPDATE SET
+        quantity = brokerage_rollup.quantity + EXCLUDED.quantity,
+        amount = brokerage_rollup.amount + EXCLUDED.amount,
+        brokerage_amount = brokerage_rollup.brokerage_amount + EXCLUDED.brokerage_amount,
+        brokerage_gst = brokerage_rollup.brokerage_gst + EXCLUDED.brokerage_gst,
+        tax_amount = brokerage_rollup.tax_amount + EXCLUDED.tax_amount,
+        transaction_count = brokerage_rollup.transaction_count + EXCLUDED.transaction_count,
+        revision = brokerage_rollup.revision + 1
+"""
+
+
+def rollup_month(bill_date):
+    return bill_date.replace(day=1) if bill_date else UNDATED_MONTH
+
+
+def add_rollup_delta(deltas, trnx, sign=1):
+    """
+    Adds (sign=1) or removes (sign=-1) one transaction's contribution to
+    the pending `deltas`, keyed like the rollup rows.
+    """
+    key = (trnx.company_id, trnx.company_financial_year_id,
+           rollup_month(trnx.bill_date), trnx.party_id,
+           trnx.seller_party_id, trnx.product_id)
+    values = (trnx.quantity, trnx.amount, trnx.brokerage_amount,
+              trnx.brokerage_gst, trnx.tax_amount, 1)
+    current = deltas.get(key)
+    if current is None:
+        deltas[key] = [sign * value for value in values]
+    else:
+        for index, value in enumerate(values):
+            current[index] += sign * value
+    return deltas
+
+
+def apply_rollup_deltas(deltas, batch_size=1000):
+    """
+    Upserts pending deltas into brokerage_rollup, `batch_size` keys per
+    statement. Keys are written in sorted order so concurrent writers
+    cannot deadlock. Call it inside the transaction that changed the rows.
+    """
+    rows = sorted(deltas.items())
+    columns = ROLLUP_KEY + ROLLUP_TOTALS + ['revision']
+    row_placeholder = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            params = [value for key, totals in batch
+                      for value in (*key, *totals, 1)]
+            cursor.execute(
+                f"INSERT INTO brokerage_rollup ({', '.join(columns)}) "
+                f"VALUES {', '.join([row_placeholder] * len(batch))} "
+                f"{ROLLUP_CONFLICT}", params)
+
+
+def rollup_merge_sql(source, sign=1):
+    """
+    SQL that folds every transaction row of `source` (a table name or a
+    CTE) into brokerage_rollup, adding them or, with sign=-1, taking them
+    out.
+    """
+    return f"""
+        INSERT INTO brokerage_rollup ({', '.join(ROLLUP_KEY + ROLLUP_TOTALS)}, revision)
+        SELECT company_id, company_financial_year_id,
+               COALESCE(date_trunc('month', bill_date)::date, DATE '{UNDATED_MONTH.isoformat()}'),
+               party_id, seller_party_id, product_id,
+               {sign} * SUM(quantity), {sign} * SUM(amount),
+               {sign} * SUM(brokerage_amount), {sign} * SUM(brokerage_gst),
+               {sign} * SUM(tax_amount), {sign} * COUNT(*), 1
+        FROM {source}
+        GROUP BY 1, 2, 3, 4, 5, 6
+        ORDER BY 1, 2, 3, 4, 5, 6
+        {ROLLUP_CONFLICT}
+    """
+
+
+# Rollup rows of archived years have no transactions left to rebuild them
+# from, so rebuilds keep them.
+NOT_ARCHIVED = """
+    financial_year_id NOT IN (SELECT financial_year_id FROM transaction_archive)
+"""
+
+
+def rebuild_rollups(company_id=None):
+    """
+    Recomputes brokerage_rollup from transactions, for one company or all.
+    Writers to transactions wait until the rebuild commits.
+
+    The rebuilt rows restart at revision 1, so the month versions cached GST
+    summaries are checked against may repeat; those summaries are dropped too.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("LOCK TABLE transactions IN SHARE MODE")
+        if company_id is None:
+            for table in ('gst_month_summary', 'brokerage_rollup'):
+                cursor.execute(f"DELETE FROM {table} WHERE {NOT_ARCHIVED}")
+            cursor.execute(rollup_merge_sql("transactions"))
+        else:
+            for table in ('gst_month_summary', 'brokerage_rollup'):
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE company_id = %s AND {NOT_ARCHIVED}",
+                    [company_id])
+            cursor.execute(rollup_merge_sql(
+                "(SELECT * FROM transactions WHERE company_id = %s) AS t"),
+                [company_id])
+        cursor.execute("SELECT COUNT(*) FROM brokerage_rollup")
+        return cursor.fetchone()[0]
@@ -0,0 +1,114 @@
+import decimal
+from functools import lru_cache
+from operator import itemgetter
+from rest_framework import ISO_8601, relations
+from rest_framework import fields as drf_fields
+from rest_framework.serializers import BaseSerializer
+from rest_framework.settings import api_settings
+
+# Fields whose representation is the database value itself.
+PASSTHROUGH_FIELDS = (drf_fields.CharField, drf_fields.IntegerField,
+                      drf_fields.BooleanField, drf_fields.ChoiceField,
+                      relations.PrimaryKeyRelatedField)
+
+
+class RowEncoder:
+    """
+    Turns values_list() tuples straight into the dicts a serializer would
+    return for the same rows, without building model instances or running
+    the per-field machinery of the serializer for every row.
+
+    The encoding function is generated once per serializer and field set.
+    Fields it has no fast path for fall back to the serializer field's own
+    to_representation, so the output always matches serializer.data.
+    """
+
+    def __init__(self, serializer_class, fields=None, extra=(), expand=()):
+        serializer = serializer_class(fields=fields, expand=expand)
+        self.serializer_class = serializer_class
+        self.names = list(serializer.fields)
+        self.columns = []
+        namespace = {'_format': format}
+        body = self.compile_serializer(serializer, '', namespace)
+        for column in extra:
+            if column not in self.columns:
+                self.columns.append(column)
+
+        variables = ', '.join(f"c{index}" for index in range(len(self.columns)))
+        source = (f"def encode_rows(rows):\n"
+                  f"    return [{body} for ({variables},) in rows]\n")
+        exec(compile(source, f"<row encoder {serializer_class.__name__}>", 'exec'),
+             namespace)
+        self.encode_rows = namespace['encode_rows']
+        self.source = source
+
+    def compile_serializer(self, serializer, prefix, namespace):
+        """
+        Dict display for one serializer's fields. Nested serializers read
+        the related row's columns through the foreign key, so expanding
+        them joins in the same query instead of issuing one per row.
+        """
+        model = serializer.Meta.model
+        items = []
+        for name, field in serializer.fields.items():
+            model_field = model._meta.get_field(field.source)
+            if isinstance(field, BaseSerializer):
+                related_prefix = f"{prefix}{model_field.name}__"
+                nested = self.compile_serializer(field, related_prefix, namespace)
+                pk_column = related_prefix + model_field.related_model._meta.pk.attname
+                if pk_column not in self.columns:
+                    self.columns.append(pk_column)
+                expression = f"None if c{self.columns.index(pk_column)} is None else {nested}"
+            else:
+                self.columns.append(prefix + model_field.attname)
+                expression = self.compile_field(len(self.columns) - 1, field, namespace)
+            items.append(f"{name!r}: {expression}")
+        return '{' + ', '.join(items) + '}'
+
+    def compile_field(self, index, field, namespace):
+        value = f"c{index}"
+        if isinstance(field, drf_fields.DecimalField) and self.plain_decimal(field):
+            context = decimal.getcontext().copy()
+            if field.max_digits is not None:
+                context.prec = field.max_digits
+            namespace[f"_q{index}"] = decimal.Decimal('.1') ** field.decimal_places
+            namespace[f"_r{index}"] = field.rounding
+            namespace[f"_c{index}"] = context
+            quantized = f"{value}.quantize(_q{index}, rounding=_r{index}, context=_c{index})"
+            if getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING):
+                quantized = f"_format({quantized}, 'f')"
+            return f"None if {value} is None else {quantized}"
+        if isinstance(field, drf_fields.DateField) and str(
+                getattr(field, 'format', api_settings.DATE_FORMAT)).lower() == ISO_8601:
+            return f"None if {value} is None else {value}.isoformat()"
+        if isinstance(field, PASSTHROUGH_FIELDS):
+            return value
+        namespace[f"_f{index}"] = field.to_representation
+        return f"None if {value} is None else _f{index}({value})"
+
+    @staticmethod
+    def plain_decimal(field):
+        return (field.decimal_places is not None
+                and not field.normalize_output and not field.localize)
+
+    def values(self, queryset):
+        return queryset.values_list(*self.columns)
+
+    def getter(self, *columns):
+        return itemgetter(*[self.columns.index(column) for column in columns])
+
+
+@lru_cache(maxsize=256)
+def cached_encoder(serializer_class, fields, extra, expand):
+    return RowEncoder(serializer_class, fields, extra, expand)
+
+
+def row_encoder(serializer_class, fields=None, extra=(), expand=()):
+    """
+    Returns the encoder for `serializer_class` narrowed to `fields` with
+    the `expand` foreign keys inlined, also selecting the `extra` columns
+    a view needs, such as pagination keys.
+    """
+    return cached_encoder(serializer_class,
+                          None if fields is None else tuple(fields),
+                          tuple(extra), tuple(expand))
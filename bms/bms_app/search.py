@@ -0,0 +1,102 @@
+import logging
+import traceback
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.functions import Greatest
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from rest_framework.views import APIView
+from .models import Items, Party
+from .responses import api_response
+from .serializers import SearchQuerySerializer
+from .versions import versioned_etag
+
+# Setup logger
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Lowest word similarity a match may have. pg_trgm's default of 0.6 drops
+# most misspelt words, which is what typeahead has to cope with.
+SEARCH_THRESHOLD = 0.3
+
+
+def trigram_search(queryset, fields, columns, term, limit):
+    """
+    The `limit` rows of `queryset` that best match `term`, as dicts of
+    `columns` plus a `score`.
+
+    A row matches when `term` is similar to some run of words in any of
+    `fields`, so partial and misspelt input both match. Each condition is
+    served by the field's gin_trgm_ops index, and rows are ranked by their
+    best field's word similarity.
+    """
+    match = Q()
+    for field in fields:
+        match |= Q(**{f"{field}__trigram_word_similar": term})
+    scores = [TrigramWordSimilarity(term, field) for field in fields]
+    score = Greatest(*scores) if len(scores) > 1 else scores[0]
+    pk = queryset.model._meta.pk.name
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)",
+                       [str(SEARCH_THRESHOLD)])
+        return list(queryset.filter(match).annotate(score=score)
+                    .order_by('-score', pk).values(*columns, 'score')[:limit])
+
+
+class TrigramSearchAPIView(APIView):
+    """
+    Typeahead search with ?q= over the trigram indexed `search_fields` of
+    `model`, returning at most ?limit= rows, best match first.
+    """
+    model = None
+    search_fields = ()
+    columns = ()
+
+    def get(self, request, *args, **kwargs):
+        try:
+            query = SearchQuerySerializer(data=request.GET)
+            if not query.is_valid():
+                return api_response(request, {
+                    "error_code": 400,
+                    "message": "Validation failed",
+                    "data": [],
+                    "error": query.errors
+                }, status=400)
+
+            data = trigram_search(self.model.objects.all(), self.search_fields,
+                                  self.columns, query.validated_data['q'],
+                                  query.validated_data['limit'])
+            logger.info(f"Search {self.model._meta.db_table} for "
+                        f"{query.validated_data['q']!r}: {len(data)} matches")
+            return api_response(request, {
+                "error_code": 200,
+                "message": "Data found" if data else "No matches found",
+                "data": data,
+                "error": []
+            }, status=200)
+
+        except Exception as e:
+            logger.error(f"Internal Server Error: {str(e)}")
+            return api_response(request, {
+                "error_code": 500,
+                "message": "Internal Server Error",
+                "data": [],
+                "error": traceback.format_exc().splitlines()
+            }, status=500)
+
+
+@method_decorator(condition(etag_func=versioned_etag('party')), name='get')
+class PartySearchAPIView(TrigramSearchAPIView):
+    model = Party
+    search_fields = ('name', 'contact_person', 'city', 'gst')
+    columns = ('party_id', 'name', 'contact_person', 'city', 'gst', 'phone')
+
+
+@method_decorator(condition(etag_func=versioned_etag('items')), name='get')
+class ItemSearchAPIView(TrigramSearchAPIView):
+    model = Items
+    search_fields = ('item_name',)
+    columns = ('item_id', 'item_name')
@@ -1,57 +1,228 @@
 from rest_framework import serializers
-from .models import Company, CompanyPartyInvoiceDetails, FinancialYear, GSTDetails, Items, Party, Remarks, Tax, Transactions
+from .models import JOB_STATUS_CHOICES, STATUS_CHOICES, Company, CompanyPartyInvoiceDetails, FinancialYear, GSTDetails, Items, Job, Party, Remarks, Tax, TransactionArchive, Transactions
 
+ARCHIVED_YEAR_ERROR = "This financial year is archived and read-only."
+INACTIVE_ERROR = "This object is inactive or pending deletion."
 
-class ItemSerializer(serializers.ModelSerializer):
+# Foreign keys of a transaction that must point at active rows.
+ACTIVE_FOREIGN_KEYS = ('party', 'seller_party', 'product', 'tax', 'remark', 'company')
+
+
+class DynamicFieldsMixin:
+    """
+    Lets a serializer be narrowed with `fields` (keep only these) and
+    `exclude` (drop these) keyword arguments, and lets `expand` replace
+    foreign key IDs listed in `expandable_fields` with the nested object.
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, fields=None, exclude=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields).difference(fields):
+                self.fields.pop(name)
+        for name in exclude or ():
+            self.fields.pop(name, None)
+        for name in expand:
+            if name in self.fields:
+                self.fields[name] = self.expandable_fields[name](read_only=True)
+
+
+class ItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Items
-        fields = ['item_id', 'item_name']
+        fields = ['item_id', 'item_name', 'status']
 
 
-class RemarkSerializer(serializers.ModelSerializer):
+class RemarkSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Remarks
-        fields = ['remark_id', 'remark']
+        fields = ['remark_id', 'remark', 'status']
 
 
-class TaxSerializer(serializers.ModelSerializer):
+class TaxSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Tax
-        fields = ['tax_id', 'tax_percentage', 'default_tax', 'description']
+        fields = ['tax_id', 'tax_percentage', 'default_tax', 'description', 'status']
 
 
-class GSTDetailSerializer(serializers.ModelSerializer):
+class GSTDetailSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = GSTDetails
         fields = ['gst_id', 'company', 'financial_year', 'gst']
 
 
-class PartySerializer(serializers.ModelSerializer):
+class PartySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Party
         fields = '__all__'
 
 
-class CompanyPartyInvoiceSerializer(serializers.ModelSerializer):
+class CompanyPartyInvoiceSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = CompanyPartyInvoiceDetails
         fields = '__all__'
 
+    def validate(self, data):
+        if 'financial_year' in data and 'company' in data \
+                and data['financial_year'].company_id != data['company'].pk:
+            raise serializers.ValidationError(
+                {'financial_year': "Financial Year belongs to another company"})
+        return data
+
 
-class CompanySerializer(serializers.ModelSerializer):
+class CompanySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Company
         fields = '__all__'
 
 
-class FinancialYearSerializer(serializers.ModelSerializer):
+class CompanySummarySerializer(serializers.ModelSerializer):
+    """
+    The company as inlined by ?expand=company, without its password and
+    bank details.
+    """
+    class Meta:
+        model = Company
+        fields = ['company_id', 'name', 'gst', 'address1', 'address2', 'city',
+                  'state', 'pincode']
+
+
+class FinancialYearSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = FinancialYear
         fields = ['financial_year_id', 'company',
                   'from_date', 'to_date', 'description', 'status']
 
 
-class TransactionSerializer(serializers.ModelSerializer):
+class TransactionSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'party': PartySerializer,
+        'seller_party': PartySerializer,
+        'product': ItemSerializer,
+        'tax': TaxSerializer,
+        'remark': RemarkSerializer,
+        'company': CompanySummarySerializer,
+        'company_financial_year': FinancialYearSerializer,
+    }
+
     class Meta:
         model = Transactions
         fields = '__all__'
+
+    def validate_company_financial_year(self, value):
+        if TransactionArchive.objects.filter(financial_year=value).exists():
+            raise serializers.ValidationError(ARCHIVED_YEAR_ERROR)
+        return value
+
+    def validate(self, data):
+        errors = {name: [INACTIVE_ERROR] for name in ACTIVE_FOREIGN_KEYS
+                  if name in data and data[name].status != 'active'}
+        if errors:
+            raise serializers.ValidationError(errors)
+        return data
+
+
+class TransactionBulkSerializer(serializers.ModelSerializer):
+    """
+    Validates transactions for bulk insert. Foreign keys are accepted as raw
+    IDs and checked by the caller with one query per table instead of one
+    lookup per row and field.
+    """
+    party = serializers.IntegerField(source='party_id')
+    seller_party = serializers.IntegerField(source='seller_party_id')
+    product = serializers.IntegerField(source='product_id')
+    tax = serializers.IntegerField(source='tax_id')
+    remark = serializers.IntegerField(source='remark_id')
+    company = serializers.IntegerField(source='company_id')
+    company_financial_year = serializers.IntegerField(
+        source='company_financial_year_id')
+
+    class Meta:
+        model = Transactions
+        fields = '__all__'
+
+
+class PartySummaryQuerySerializer(serializers.Serializer):
+    company = serializers.IntegerField()
+    financial_year = serializers.IntegerField()
+    from_date = serializers.DateField(required=False)
+    to_date = serializers.DateField(required=False)
+    item = serializers.IntegerField(required=False)
+    party = serializers.IntegerField(required=False)
+
+
+class GSTSummaryQuerySerializer(serializers.Serializer):
+    company = serializers.IntegerField()
+    financial_year = serializers.IntegerField()
+    month = serializers.DateField(required=False)
+
+
+class TransactionFilterSerializer(serializers.Serializer):
+    company = serializers.IntegerField(required=False)
+    financial_year = serializers.IntegerField(required=False)
+    party = serializers.IntegerField(required=False)
+    seller_party = serializers.IntegerField(required=False)
+    product = serializers.IntegerField(required=False)
+    status = serializers.ChoiceField(choices=STATUS_CHOICES, required=False)
+    from_date = serializers.DateField(required=False)
+    to_date = serializers.DateField(required=False)
+    bill_no = serializers.CharField(required=False, max_length=100)
+    party_bill_no = serializers.CharField(required=False, max_length=100)
+
+    def validate(self, data):
+        if 'from_date' in data and 'to_date' in data and data['from_date'] > data['to_date']:
+            raise serializers.ValidationError("from_date must not be after to_date")
+        return data
+
+
+class InvoiceFilterSerializer(serializers.Serializer):
+    company = serializers.IntegerField(required=False)
+    financial_year = serializers.IntegerField(required=False)
+    party = serializers.IntegerField(required=False)
+
+
+class SearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(min_length=2, max_length=100)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = '__all__'
+
+
+class JobFilterSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=JOB_STATUS_CHOICES, required=False)
+    kind = serializers.CharField(required=False, max_length=50)
+    company = serializers.IntegerField(required=False)
+
+
+class JobCreateSerializer(serializers.Serializer):
+    kind = serializers.CharField(max_length=50)
+    params = serializers.DictField(required=False, default=dict)
+    max_attempts = serializers.IntegerField(min_value=1, max_value=20, required=False)
+
+
+class RebuildRollupsJobParamsSerializer(serializers.Serializer):
+    company = serializers.IntegerField(required=False)
+
+    def validate_company(self, value):
+        if not Company.objects.filter(pk=value).exists():
+            raise serializers.ValidationError("Company not found")
+        return value
+
+
+class ArchiveJobParamsSerializer(serializers.Serializer):
+    financial_year = serializers.IntegerField()
+
+    def validate_financial_year(self, value):
+        year = FinancialYear.objects.filter(pk=value).first()
+        if year is None:
+            raise serializers.ValidationError("Financial Year not found")
+        if year.status != 'inactive':
+            raise serializers.ValidationError("Only inactive financial years can be archived")
+        if TransactionArchive.objects.filter(financial_year=year).exists():
+            raise serializers.ValidationError("Financial Year is already archived")
+        return value
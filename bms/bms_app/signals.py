@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .cache import REFERENCE_CACHES
+from .models import Items, Remarks, Tax
+
+
+@receiver([post_save, post_delete], sender=Items)
+@receiver([post_save, post_delete], sender=Remarks)
+@receiver([post_save, post_delete], sender=Tax)
+def invalidate_reference_cache(sender, **kwargs):
+    REFERENCE_CACHES[sender].invalidate()
@@ -1,3 +1,1563 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, transaction as db_transaction
+from django.db.models import Count, F, Sum
+from django.http import HttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from .archive import archive_financial_year, pa, read_archive
+from .cache import item_cache
+from .jobs import JOB_HANDLERS, cancel_job, claim_job, enqueue_job, run_job, save_progress
+from .management.commands.bench_api import Command as BenchApiCommand
+from .metrics import MetricsMiddleware, registry
+from .models import (BrokerageRollup, Company, FinancialYear, GSTMonthSummary, Items, Job, Party,
+                     Remarks, Tax, Transactions)
+from .numbering import next_number
+from .pagination import after_cursor, decode_cursor, encode_cursor
+from .purge import PURGE_PLANS, purge_batch
+from .responses import dumps_json, msgpack
+from .rollup import rebuild_rollups
+from .rowencoders import row_encoder
+from .serializers import INACTIVE_ERROR, ItemSerializer, PartySerializer, TransactionSerializer
 
-# Create your tests here.
+EXPAND_ALL = ','.join(TransactionSerializer.expandable_fields)
+
+
+def seed_transactions(count, parties=20):
+    """
+    Creates one company with two financial years and `count` transactions
+    spread over `parties` parties and a year of bill dates.
+    """
+    company = Company.objects.create(name="Test Company", phone="0")
+    years = [
+        FinancialYear.objects.create(company=company, from_date=date(2023, 4, 1),
+                                     to_date=date(2024, 3, 31)),
+        FinancialYear.objects.create(company=company, from_date=date(2024, 4, 1),
+                                     to_date=date(2025, 3, 31)),
+    ]
+    party_list = Party.objects.bulk_create(
+        [Party(name=f"Party {i}", phone=str(i)) for i in range(parties)])
+    item = Items.objects.create(item_name="Cotton")
+    tax = Tax.objects.create(tax_percentage=Decimal("5.00"))
+    remark = Remarks.objects.create(remark="Ok")
+
+    rows = []
+    for i in range(count):
+        year = years[i % 2]
+        rows.append(Transactions(
+            bill_no=str(i), bill_date=year.from_date + timedelta(days=i % 365),
+            party=party_list[i % parties],
+            seller_party=party_list[(i + 1) % parties], product=item,
+            quantity=10, rate=Decimal("12.50"), amount=Decimal("125.00"),
+            brokerage_percentage=Decimal("1.00"),
+            brokerage_amount=Decimal("1.25"), brokerage_gst=Decimal("0.23"),
+            tax=tax, tax_amount=Decimal("6.25"), remark=remark,
+            company=company, company_financial_year=year))
+    Transactions.objects.bulk_create(rows, batch_size=1000)
+    return company, years, party_list
+
+
+def transaction_payload(transaction):
+    """
+    The JSON a client would post to create a copy of `transaction`.
+    """
+    payload = json.loads(json.dumps(TransactionSerializer(transaction).data,
+                                    cls=DjangoJSONEncoder))
+    del payload['transaction_id']
+    return payload
+
+
+def collect_pages(test, query):
+    """
+    Every row of the transaction list for `query`, following the cursors
+    seven rows at a time.
+    """
+    rows, cursor = [], None
+    while True:
+        path = f'/api/v1/transaction/?page_size=7&{query}'
+        response = test.client.get(path + (f'&cursor={cursor}' if cursor else ''))
+        test.assertEqual(response.status_code, 200)
+        body = response.json()
+        rows += body['data']
+        cursor = body['pagination']['next_cursor']
+        if not cursor:
+            return rows
+
+
+class TransactionPaginationTests(TestCase):
+    """
+    Following next_cursor visits every transaction once, in order, and
+    cursors that were not issued by the API are refused.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_transactions(60)
+
+    def test_cursor_round_trip(self):
+        key = (date(2024, 6, 1), 41)
+        self.assertEqual(decode_cursor(encode_cursor(*key)), key)
+        self.assertEqual(decode_cursor(encode_cursor(None, 41, '-bill_date'), '-bill_date'),
+                         (None, 41))
+
+    def test_pages_cover_every_row_once(self):
+        rows = collect_pages(self, '')
+        self.assertEqual([row['transaction_id'] for row in rows],
+                         list(Transactions.objects.order_by('bill_date', 'transaction_id')
+                              .values_list('transaction_id', flat=True)))
+
+    def test_tampered_cursor_is_rejected(self):
+        cursor = self.client.get('/api/v1/transaction/?page_size=5').json()[
+            'pagination']['next_cursor']
+        raw = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        raw[2] = "not an id"
+        tampered = base64.urlsafe_b64encode(json.dumps(raw).encode()).decode()
+        for value in (tampered, 'not-a-cursor', cursor[:-3]):
+            response = self.client.get(f'/api/v1/transaction/?cursor={value}')
+            self.assertEqual(response.status_code, 400, value)
+            self.assertEqual(response.json()['message'], "Invalid pagination parameters")
+
+
+class TransactionStreamTests(TestCase):
+    """
+    ?stream=1 sends the usual envelope with every transaction, as one
+    JSON document however many chunks it is written in.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_transactions(45)
+
+    @override_settings(BMS_STREAM_CHUNK_SIZE=10)
+    def test_stream_is_one_json_document(self):
+        response = self.client.get('/api/v1/transaction/?stream=1&fields=transaction_id,amount')
+        self.assertTrue(response.streaming)
+        body = json.loads(b''.join(response.streaming_content))
+        self.assertEqual((body['error_code'], body['message'], body['error']),
+                         (200, "Data found", []))
+        self.assertEqual([row['transaction_id'] for row in body['data']],
+                         list(Transactions.objects.order_by('transaction_id')
+                              .values_list('transaction_id', flat=True)))
+        self.assertEqual(set(body['data'][0]), {'transaction_id', 'amount'})
+
+    def test_empty_stream(self):
+        response = self.client.get('/api/v1/transaction/?stream=1&bill_no=missing')
+        self.assertEqual(json.loads(b''.join(response.streaming_content))['data'], [])
+
+
+class TransactionBulkTests(TestCase):
+    """
+    ?mode=atomic saves nothing unless every row is valid; ?mode=partial
+    saves the valid rows and reports the others by index.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_transactions(10)
+
+    def setUp(self):
+        valid = transaction_payload(Transactions.objects.order_by('pk').first())
+        self.rows = [valid, {**valid, 'party': 999999}, {**valid, 'bill_no': 'B-2'}]
+
+    def post(self, mode):
+        return self.client.post(f'/api/v1/transaction/bulk/?mode={mode}', self.rows,
+                                content_type='application/json')
+
+    def test_atomic_saves_nothing_on_error(self):
+        response = self.post('atomic')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([row['index'] for row in response.json()['error']], [1])
+        self.assertIn('party', response.json()['error'][0]['errors'])
+        self.assertEqual(Transactions.objects.count(), 10)
+
+    def test_partial_saves_valid_rows(self):
+        response = self.post('partial')
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual([row['index'] for row in body['data']], [0, 2])
+        self.assertEqual([row['index'] for row in body['error']], [1])
+        self.assertEqual(Transactions.objects.count(), 12)
+        self.assertTrue(Transactions.objects.filter(
+            pk=body['data'][1]['transaction_id'], bill_no='B-2').exists())
+
+    def test_atomic_saves_all_valid_rows(self):
+        del self.rows[1]
+        response = self.post('atomic')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Transactions.objects.count(), 12)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.post('some').status_code, 400)
+        response = self.client.post('/api/v1/transaction/bulk/', self.rows[0],
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+@skipUnless(connection.vendor == 'postgresql', "Query plans are PostgreSQL specific")
+class TransactionQueryPlanTests(TestCase):
+    """
+    Checks that the main transaction access paths have an index to use.
+
+    Sequential scans are disabled for the EXPLAIN so the planner only picks
+    one when no index can serve the query; on a small test table it would
+    otherwise prefer a sequential scan regardless of the indexes.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company, cls.years, cls.parties = seed_transactions(5000)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE transactions")
+
+    def plan_nodes(self, queryset):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = json.loads(queryset.explain(format='json'))
+        nodes = [plan[0]['Plan']]
+        while nodes:
+            node = nodes.pop()
+            yield node
+            nodes.extend(node.get('Plans', []))
+
+    def scanned_tables(self, queryset):
+        """
+        The transactions table or partitions each scan in the plan reads.
+        """
+        return [node for node in self.plan_nodes(queryset)
+                if node.get('Relation Name', '').startswith('transactions')]
+
+    def assertNoSeqScan(self, queryset):
+        for node in self.scanned_tables(queryset):
+            self.assertNotEqual(node['Node Type'], 'Seq Scan',
+                                f"Sequential scan in plan for {queryset.query}")
+
+    def table_index(self, name):
+        """
+        The transactions index a partition's index `name` was created from,
+        or `name` itself when it is not a partition's.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT parent.relname FROM pg_class child
+                JOIN pg_inherits ON inhrelid = child.oid
+                JOIN pg_class parent ON parent.oid = inhparent
+                WHERE child.relname = %s
+            """, [name])
+            row = cursor.fetchone()
+        return row[0] if row else name
+
+    def assertUsesIndex(self, queryset, index):
+        """
+        Any index serves the query once sequential scans are off, so check
+        that the planner picked the one it is meant to use.
+        """
+        self.assertNoSeqScan(queryset)
+        used = {self.table_index(node['Index Name'])
+                for node in self.plan_nodes(queryset) if 'Index Name' in node}
+        self.assertIn(index, used, f"{index} not used for {queryset.query}")
+
+    def test_list_first_page(self):
+        queryset = Transactions.objects.order_by(
+            F('bill_date').asc(nulls_last=True), 'transaction_id')[:101]
+        self.assertUsesIndex(queryset, 'trnx_date_id_idx')
+
+    def test_list_after_cursor(self):
+        queryset = Transactions.objects.filter(
+            after_cursor(date(2024, 6, 1), 2500)).order_by(
+            F('bill_date').asc(nulls_last=True), 'transaction_id')[:101]
+        self.assertUsesIndex(queryset, 'trnx_date_id_idx')
+
+    def test_company_year_report(self):
+        queryset = Transactions.objects.filter(
+            company=self.company, company_financial_year=self.years[1],
+            bill_date__range=(date(2024, 6, 1), date(2024, 6, 30)),
+        ).values('party').annotate(amount=Sum('amount'))
+        self.assertUsesIndex(queryset, 'trnx_company_fy_date_idx')
+
+    def test_party_ledger(self):
+        queryset = Transactions.objects.filter(
+            party=self.parties[3],
+            bill_date__range=(date(2024, 4, 1), date(2024, 9, 30)),
+        ).order_by('bill_date')
+        self.assertUsesIndex(queryset, 'trnx_party_date_idx')
+
+    def test_year_queries_read_one_partition(self):
+        year = self.years[1]
+        queryset = Transactions.objects.filter(
+            company_financial_year=year,
+            bill_date__range=(date(2024, 6, 1), date(2024, 6, 30)))
+        self.assertEqual({node['Relation Name'] for node in self.scanned_tables(queryset)},
+                         {f"transactions_fy_{year.pk}"})
+
+    def test_new_year_gets_a_partition(self):
+        year = FinancialYear.objects.create(company=self.company, from_date=date(2025, 4, 1),
+                                            to_date=date(2026, 3, 31))
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s)", [f"transactions_fy_{year.pk}"])
+            self.assertIsNotNone(cursor.fetchone()[0])
+
+    def test_seller_party_ledger(self):
+        queryset = Transactions.objects.filter(
+            seller_party=self.parties[3],
+            bill_date__range=(date(2024, 4, 1), date(2024, 9, 30)),
+        ).order_by('bill_date')
+        self.assertUsesIndex(queryset, 'trnx_seller_party_date_idx')
+
+
+class FieldsetTests(TestCase):
+    """
+    ?fields= and ?exclude= narrow both the response and the columns read.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_transactions(10)
+
+    def setUp(self):
+        item_cache.invalidate()
+
+    def transaction_columns(self, queries):
+        selects = [query['sql'] for query in queries
+                   if 'FROM "transactions"' in query['sql']]
+        self.assertEqual(len(selects), 1, selects)
+        return selects[0].split(' FROM ')[0]
+
+    def test_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/transaction/?fields=amount,transaction_id')
+        self.assertEqual(response.status_code, 200)
+        # Serializer order, whatever the order asked for.
+        self.assertEqual([list(row) for row in response.json()['data']],
+                         [['transaction_id', 'amount']] * 10)
+        columns = self.transaction_columns(queries.captured_queries)
+        self.assertIn('"amount"', columns)
+        self.assertNotIn('"rate"', columns)
+        self.assertNotIn('"brokerage_gst"', columns)
+
+    def test_exclude(self):
+        fields = [name for name in TransactionSerializer().fields if name != 'rate']
+        response = self.client.get('/api/v1/transaction/?exclude=rate&page_size=1')
+        self.assertEqual(list(response.json()['data'][0]), fields)
+
+        response = self.client.get('/api/v1/transaction/?fields=amount,rate&exclude=rate'
+                                   '&page_size=1')
+        self.assertEqual(list(response.json()['data'][0]), ['amount'])
+
+    def test_detail_and_cached_rows(self):
+        transaction = Transactions.objects.first()
+        response = self.client.get(f'/api/v1/transaction/{transaction.pk}/?fields=bill_no')
+        self.assertEqual(response.json()['data'], [{'bill_no': transaction.bill_no}])
+
+        party = Party.objects.first()
+        response = self.client.get(f'/api/v1/parties/{party.pk}/?fields=name,phone')
+        self.assertEqual(response.json()['data'], [{'name': party.name, 'phone': party.phone}])
+
+        self.assertEqual(self.client.get('/api/v1/items/?fields=item_name').json()['data'],
+                         [{'item_name': "Cotton"}])
+        # The cache keeps whole rows; trimming one response leaves the next intact.
+        self.assertIn('item_id', self.client.get('/api/v1/items/').json()['data'][0])
+
+    def test_invalid_fieldsets(self):
+        for query, error in (('fields=amount,owner,color', "Unknown fields: color, owner"),
+                             ('exclude=owner', "Unknown fields: owner"),
+                             ('fields=amount&exclude=amount', "No fields left to return")):
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/v1/transaction/?{query}')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['error'], [error])
+        self.assertEqual(self.client.get('/api/v1/parties/?fields=owner').status_code, 400)
+
+
+class RowEncoderTests(TestCase):
+    """
+    Rows encoded from values_list() must render to the very bytes the
+    serializer's own output does.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_transactions(20)
+        Transactions.objects.filter(pk=Transactions.objects.order_by('pk').first().pk).update(
+            bill_no=None, bill_date=None, party_bill_no="P/1", rate=Decimal("0.05"))
+        Party.objects.filter(pk=Party.objects.first().pk).update(
+            email="a@example.com", city="Surat")
+
+    def assertEncodesLikeSerializer(self, serializer_class, queryset, fields=None, expand=()):
+        encoder = row_encoder(serializer_class, fields, extra=('pk',), expand=expand)
+        rows = encoder.encode_rows(list(encoder.values(queryset)))
+        data = serializer_class(queryset.select_related(*expand), many=True,
+                                fields=fields, expand=expand).data
+        self.assertEqual(dumps_json(rows), dumps_json(data))
+
+    def test_transactions(self):
+        queryset = Transactions.objects.order_by('pk')
+        for fields, expand in ((None, ()),
+                               (['bill_no', 'bill_date', 'rate', 'party'], ()),
+                               (None, tuple(TransactionSerializer.expandable_fields)),
+                               (['amount', 'product', 'company'], ('product', 'company'))):
+            with self.subTest(fields=fields, expand=expand):
+                self.assertEncodesLikeSerializer(TransactionSerializer, queryset,
+                                                 fields, expand)
+
+    def test_reference_rows(self):
+        self.assertEncodesLikeSerializer(PartySerializer, Party.objects.order_by('pk'))
+        self.assertEncodesLikeSerializer(ItemSerializer, Items.objects.order_by('pk'))
+
+
+class ContentNegotiationTests(TestCase):
+    """
+    MessagePack is sent only to clients that prefer it to JSON, and holds
+    the same data as the JSON body.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_transactions(5)
+
+    def setUp(self):
+        item_cache.invalidate()
+
+    def get(self, path, accept):
+        response = self.client.get(path, HTTP_ACCEPT=accept)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Accept', response['Vary'])
+        return response
+
+    def test_json_by_default(self):
+        for accept in ('', '*/*', 'application/json', 'text/html, */*;q=0.8',
+                       'application/msgpack;q=0.5, application/json'):
+            with self.subTest(accept=accept):
+                response = self.get('/api/v1/items/', accept)
+                self.assertEqual(response['Content-Type'], 'application/json')
+                self.assertEqual(response.json()['data'][0]['item_name'], "Cotton")
+
+    @skipUnless(msgpack is not None, "msgpack is not installed")
+    def test_msgpack_when_preferred(self):
+        for path in ('/api/v1/items/', '/api/v1/transaction/?page_size=3',
+                     f'/api/v1/transaction/{Transactions.objects.first().pk}/?expand=party'):
+            for accept in ('application/msgpack', 'application/json;q=0.5, application/msgpack',
+                           'application/msgpack, application/json'):
+                with self.subTest(path=path, accept=accept):
+                    response = self.get(path, accept)
+                    self.assertEqual(response['Content-Type'], 'application/msgpack')
+                    self.assertEqual(msgpack.unpackb(response.content),
+                                     self.get(path, 'application/json').json())
+
+
+class TransactionExpandTests(TestCase):
+    """
+    ?expand= must inline related objects through joins in the transaction
+    query itself, never with follow-up queries per row.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_transactions(500)
+
+    def expected(self, transaction_id):
+        transaction = Transactions.objects.get(pk=transaction_id)
+        data = TransactionSerializer(
+            transaction, expand=tuple(TransactionSerializer.expandable_fields)).data
+        return json.loads(json.dumps(data, cls=DjangoJSONEncoder))
+
+    def assertSingleTransactionQuery(self, queries):
+        selects = [query['sql'] for query in queries
+                   if 'FROM "transactions"' in query['sql']]
+        self.assertEqual(len(selects), 1, selects)
+
+    def test_expanded_page_costs_one_query(self):
+        with CaptureQueriesContext(connection) as plain:
+            self.client.get('/api/v1/transaction/?page_size=500')
+        with CaptureQueriesContext(connection) as expanded:
+            response = self.client.get(
+                f'/api/v1/transaction/?page_size=500&expand={EXPAND_ALL}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(expanded), len(plain))
+        self.assertSingleTransactionQuery(expanded.captured_queries)
+        rows = response.json()['data']
+        self.assertEqual(len(rows), 500)
+        self.assertEqual(rows[0], self.expected(rows[0]['transaction_id']))
+        self.assertEqual(rows[-1], self.expected(rows[-1]['transaction_id']))
+
+    def test_expanded_detail_costs_one_query(self):
+        transaction_id = Transactions.objects.order_by('pk').first().pk
+        with CaptureQueriesContext(connection) as plain:
+            self.client.get(f'/api/v1/transaction/{transaction_id}/')
+        with CaptureQueriesContext(connection) as expanded:
+            response = self.client.get(
+                f'/api/v1/transaction/{transaction_id}/?expand={EXPAND_ALL}')
+
+        self.assertEqual(len(expanded), len(plain))
+        self.assertSingleTransactionQuery(expanded.captured_queries)
+        self.assertEqual(response.json()['data'], [self.expected(transaction_id)])
+
+    def test_expanded_company_hides_credentials(self):
+        Company.objects.update(password="secret", bank_account_no="1234567890",
+                               bank_ifsc="BANK0000001", gst="24AAAAA0000A1Z5")
+        transaction_id = Transactions.objects.order_by('pk').first().pk
+        for path in (f'/api/v1/transaction/{transaction_id}/?expand=company',
+                     '/api/v1/transaction/?page_size=2&expand=company'):
+            with self.subTest(path=path):
+                response = self.client.get(path)
+                company = response.json()['data'][0]['company']
+                self.assertEqual(company['gst'], "24AAAAA0000A1Z5")
+                self.assertEqual(set(company), {'company_id', 'name', 'gst', 'address1',
+                                                'address2', 'city', 'state', 'pincode'})
+                self.assertNotIn(b'secret', response.content)
+                self.assertNotIn(b'1234567890', response.content)
+                self.assertNotIn(b'BANK0000001', response.content)
+
+    def test_unknown_expansion_is_rejected(self):
+        response = self.client.get('/api/v1/transaction/?expand=party,owner')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], ["Cannot expand: owner"])
+
+
+@skipUnless(connection.vendor == 'postgresql', "Trigram search needs pg_trgm")
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Party.objects.bulk_create(
+            [Party(name=f"Party {i}", phone=str(i), city="Surat") for i in range(200)]
+            + [Party(name="Laxmi Textiles", phone="1", contact_person="Rameshbhai",
+                     city="Ahmedabad", gst="24ABCDE1234F1Z5"),
+               Party(name="Laxmi Silk Mills", phone="2", city="Surat")])
+        Items.objects.bulk_create([Items(item_name="Printed Georgette"),
+                                   Items(item_name="Dyed Cotton")])
+
+    def search(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['data']
+
+    def test_misspelt_name_ranks_best_match_first(self):
+        rows = self.search('/api/v1/search/parties/?q=laxmi+texitles')
+        self.assertEqual(rows[0]['name'], "Laxmi Textiles")
+
+    def test_matches_contact_person_and_gst(self):
+        self.assertEqual(self.search('/api/v1/search/parties/?q=ramesh')[0]['name'],
+                         "Laxmi Textiles")
+        self.assertEqual(self.search('/api/v1/search/parties/?q=24ABCDE')[0]['name'],
+                         "Laxmi Textiles")
+
+    def test_limit_caps_results(self):
+        self.assertEqual(len(self.search('/api/v1/search/parties/?q=surat&limit=5')), 5)
+        response = self.client.get('/api/v1/search/parties/?q=surat&limit=500')
+        self.assertEqual(response.status_code, 400)
+
+    def test_item_search(self):
+        rows = self.search('/api/v1/search/items/?q=georget')
+        self.assertEqual(rows[0]['item_name'], "Printed Georgette")
+
+    def test_uses_trigram_indexes(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = Party.objects.filter(name__trigram_word_similar="laxmi").explain()
+        self.assertIn("party_name_trgm", plan)
+
+
+@skipUnless(connection.vendor == 'postgresql', "The rollup is maintained with PostgreSQL upserts")
+class PartySummaryTests(TestCase):
+    """
+    The party summary equals a plain aggregation of the transactions,
+    whether it is read from the rollup (whole months) or not.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company, cls.years, cls.parties = seed_transactions(300)
+        rebuild_rollups()
+
+    def expected(self, from_date, to_date):
+        rows = Transactions.objects.filter(
+            company=self.company, company_financial_year=self.years[0],
+            bill_date__range=(from_date, to_date))
+        totals = {}
+        for role, column in (('as_buyer', 'party'), ('as_seller', 'seller_party')):
+            for row in rows.values(column).annotate(amount=Sum('amount'),
+                                                    transactions=Count('pk')):
+                totals.setdefault(row[column], {})[role] = (
+                    str(row['amount']), row['transactions'])
+        return totals
+
+    def summary(self, from_date, to_date):
+        response = self.client.get(
+            f'/api/v1/reports/party-summary/?company={self.company.pk}'
+            f'&financial_year={self.years[0].pk}&from_date={from_date}&to_date={to_date}')
+        self.assertEqual(response.status_code, 200)
+        return {row['party_id']: {role: (row[role]['amount'], row[role]['transactions'])
+                                  for role in ('as_buyer', 'as_seller')
+                                  if row[role]['transactions']}
+                for row in response.json()['data']}
+
+    def test_whole_months_from_rollup(self):
+        with CaptureQueriesContext(connection) as queries:
+            summary = self.summary(date(2023, 5, 1), date(2023, 8, 31))
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'FROM "transactions' in query['sql']])
+        self.assertEqual(summary, self.expected(date(2023, 5, 1), date(2023, 8, 31)))
+
+    def test_partial_months(self):
+        self.assertEqual(self.summary(date(2023, 5, 10), date(2023, 8, 20)),
+                         self.expected(date(2023, 5, 10), date(2023, 8, 20)))
+
+
+@skipUnless(connection.vendor == 'postgresql', "The rollup is maintained with PostgreSQL upserts")
+class RollupTests(TestCase):
+    """
+    Every write through the API leaves brokerage_rollup as a rebuild from
+    the transactions would.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company, cls.years, cls.parties = seed_transactions(40)
+        rebuild_rollups()
+
+    def rollup_rows(self):
+        return sorted(BrokerageRollup.objects.exclude(transaction_count=0).values_list(
+            'company_id', 'financial_year_id', 'month', 'party_id', 'seller_party_id',
+            'product_id', 'quantity', 'amount', 'brokerage_amount', 'transaction_count'))
+
+    def assert_matches_rebuild(self):
+        maintained = self.rollup_rows()
+        rebuild_rollups()
+        self.assertEqual(maintained, self.rollup_rows())
+
+    def test_post(self):
+        payload = transaction_payload(Transactions.objects.order_by('pk').first())
+        response = self.client.post('/api/v1/transaction/', payload,
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assert_matches_rebuild()
+
+    def test_put_moving_a_transaction_to_another_month_and_party(self):
+        trnx = Transactions.objects.order_by('pk').first()
+        payload = transaction_payload(trnx)
+        payload.update(bill_date=str(trnx.bill_date + timedelta(days=45)),
+                       party=self.parties[7].pk, quantity=99, amount='999.00')
+        response = self.client.put(f'/api/v1/transaction/{trnx.pk}/', payload,
+                                   content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assert_matches_rebuild()
+
+    def test_delete(self):
+        trnx = Transactions.objects.order_by('pk').last()
+        response = self.client.delete(f'/api/v1/transaction/{trnx.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assert_matches_rebuild()
+
+    def test_bulk(self):
+        payload = transaction_payload(Transactions.objects.order_by('pk').first())
+        response = self.client.post('/api/v1/transaction/bulk/', [payload] * 3,
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assert_matches_rebuild()
+
+
+class TransactionFilterTests(TestCase):
+    """
+    Filters and ?ordering= must narrow and order the keyset pages
+    consistently, so paging through a filtered list visits each matching
+    row exactly once.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company, cls.years, cls.parties = seed_transactions(300)
+
+    def collect(self, query):
+        return collect_pages(self, query)
+
+    def test_filters_combine_across_pages(self):
+        party = self.parties[3]
+        rows = self.collect(f'party={party.pk}&financial_year={self.years[1].pk}'
+                            '&from_date=2024-06-01&to_date=2024-12-31')
+        expected = Transactions.objects.filter(
+            party=party, company_financial_year=self.years[1],
+            bill_date__range=(date(2024, 6, 1), date(2024, 12, 31)))
+        self.assertEqual([row['transaction_id'] for row in rows],
+                         list(expected.order_by('bill_date', 'transaction_id')
+                              .values_list('transaction_id', flat=True)))
+
+    def test_descending_ordering(self):
+        rows = self.collect(f'party={self.parties[5].pk}&ordering=-bill_no')
+        keys = [(row['bill_no'], row['transaction_id']) for row in rows]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+        self.assertEqual(len(keys), Transactions.objects.filter(party=self.parties[5]).count())
+
+    def test_bill_no_filter(self):
+        rows = self.collect('bill_no=42')
+        self.assertEqual([row['bill_no'] for row in rows], ['42'])
+
+    def test_invalid_parameters_are_rejected(self):
+        for query in ('ordering=amount', 'from_date=2024-06-02&to_date=2024-06-01',
+                      'status=closed'):
+            response = self.client.get(f'/api/v1/transaction/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+    def test_cursor_is_tied_to_its_ordering(self):
+        cursor = self.client.get('/api/v1/transaction/?page_size=5').json()[
+            'pagination']['next_cursor']
+        response = self.client.get(
+            f'/api/v1/transaction/?ordering=-bill_date&cursor={cursor}')
+        self.assertEqual(response.status_code, 400)
+
+
+class ReferenceCacheTests(TestCase):
+    """
+    Items, remarks and tax are read from the database once, then served
+    from the cache until a write changes them.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.item = Items.objects.create(item_name="Cotton")
+
+    def setUp(self):
+        item_cache.invalidate()
+
+    def item_queries(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['data'], [query['sql'] for query in queries.captured_queries
+                                         if 'FROM "items"' in query['sql']]
+
+    def test_list_and_detail_are_cached(self):
+        rows, queries = self.item_queries('/api/v1/items/')
+        self.assertEqual((len(rows), len(queries)), (1, 1))
+        self.assertEqual(self.item_queries('/api/v1/items/'), (rows, []))
+        self.assertEqual(self.item_queries(f'/api/v1/items/{self.item.pk}/'), (rows, []))
+        self.assertGreaterEqual(item_cache.stats()['hits'], 2)
+
+    def test_writes_invalidate(self):
+        self.item_queries('/api/v1/items/')
+        response = self.client.post('/api/v1/items/', {'item_name': "Silk"},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        rows, queries = self.item_queries('/api/v1/items/')
+        self.assertEqual(sorted(row['item_name'] for row in rows), ["Cotton", "Silk"])
+        self.assertEqual(len(queries), 1)
+
+        # Writes that bypass the views are seen through the model signals.
+        Items.objects.filter(pk=self.item.pk).first().delete()
+        rows, _ = self.item_queries('/api/v1/items/')
+        self.assertEqual([row['item_name'] for row in rows], ["Silk"])
+
+
+@skipUnless(connection.vendor == 'postgresql', "Table versions are kept by PostgreSQL triggers")
+class ConditionalGetTests(TestCase):
+    """
+    A repeated GET is answered with 304 until the table changes, and the
+    body sent under a new ETag is never an older cached one, whichever
+    process or path wrote the change.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.item = Items.objects.create(item_name="Cotton")
+
+    def setUp(self):
+        item_cache.invalidate()
+
+    def test_not_modified_until_written(self):
+        first = self.client.get('/api/v1/items/')
+        etag = first['ETag']
+        self.assertEqual(self.client.get('/api/v1/items/', HTTP_IF_NONE_MATCH=etag).status_code,
+                         304)
+        self.assertNotEqual(self.client.get('/api/v1/items/?fields=item_name')['ETag'], etag)
+
+        self.client.put(f'/api/v1/items/{self.item.pk}/', {'item_name': "Silk"},
+                        content_type='application/json')
+        response = self.client.get('/api/v1/items/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['data'][0]['item_name'], "Silk")
+
+    def test_write_from_another_process_reloads_the_cache(self):
+        etag = self.client.get(f'/api/v1/items/{self.item.pk}/')['ETag']
+        self.client.get('/api/v1/items/')
+        # Raw SQL, as COPY or another worker would write, fires no signal.
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE items SET item_name = 'Linen' WHERE item_id = %s",
+                           [self.item.pk])
+
+        for path in ('/api/v1/items/', f'/api/v1/items/{self.item.pk}/'):
+            response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['data'][0]['item_name'], "Linen")
+
+    def test_transaction_detail(self):
+        company, years, parties = seed_transactions(3)
+        path = f'/api/v1/transaction/{Transactions.objects.first().pk}/'
+        etag = self.client.get(path)['ETag']
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Transactions.objects.update(amount=Decimal("1.00"))
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class AsyncViewParityTests(TestCase):
+    """
+    The async/ routes answer exactly as the sync ones do.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company, cls.years, cls.parties = seed_transactions(30)
+
+    def setUp(self):
+        item_cache.invalidate()
+
+    async def assert_same(self, path):
+        sync = await self.async_client.get(f'/api/v1/{path}')
+        response = await self.async_client.get(f'/api/v1/async/{path}')
+        self.assertEqual(response.status_code, sync.status_code)
+        self.assertEqual(response.json(), sync.json())
+
+    async def test_responses_match(self):
+        transaction = await Transactions.objects.afirst()
+        item = await Items.objects.afirst()
+        for path in ('parties/', f'parties/{self.parties[0].pk}/', 'parties/0/',
+                     'items/', f'items/{item.pk}/', 'items/?fields=item_name', 'tax/', 'remark/',
+                     'transaction/?page_size=7', 'transaction/?page_size=7&ordering=-bill_date',
+                     f'transaction/?page_size=7&party={self.parties[1].pk}&expand={EXPAND_ALL}',
+                     f'transaction/{transaction.pk}/?fields=transaction_id,amount',
+                     'transaction/?page_size=0', 'transaction/?fields=nope'):
+            with self.subTest(path=path):
+                await self.assert_same(path)
+
+    @override_settings(BMS_STREAM_CHUNK_SIZE=7)
+    async def test_stream_matches(self):
+        sync = await self.async_client.get('/api/v1/transaction/?stream=1')
+        response = await self.async_client.get('/api/v1/async/transaction/?stream=1')
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]),
+                         await sync_to_async(b''.join)(sync.streaming_content))
+
+    @skipUnless(connection.vendor == 'postgresql', "Table versions are kept by PostgreSQL triggers")
+    async def test_not_modified(self):
+        for path in ('parties/', 'items/', 'transaction/?page_size=7'):
+            with self.subTest(path=path):
+                etag = (await self.async_client.get(f'/api/v1/async/{path}'))['ETag']
+                response = await self.async_client.get(f'/api/v1/async/{path}',
+                                                       HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+        etag = (await self.async_client.get('/api/v1/async/items/'))['ETag']
+        await Items.objects.acreate(item_name="Silk")
+        response = await self.async_client.get('/api/v1/async/items/',
+                                               HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['data']), 2)
+
+
+class MetricsMiddlewareTests(TestCase):
+    """
+    The metrics middleware must not turn async views back into sync ones,
+    and must count every query a request runs, streamed or not.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        Tax.objects.create(tax_percentage=Decimal("5.00"))
+
+    def test_async_chain_stays_async(self):
+        async def get_response(request):
+            return HttpResponse()
+        self.assertTrue(iscoroutinefunction(MetricsMiddleware(get_response)))
+        self.assertFalse(iscoroutinefunction(MetricsMiddleware(lambda request: HttpResponse())))
+
+    async def test_async_requests_are_recorded(self):
+        stats = registry.endpoint('async-tax-list', 'GET')
+        requests, queries = stats.requests, stats.queries
+        response = await self.async_client.get('/api/v1/async/tax/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(stats.requests, requests + 1)
+        self.assertGreater(stats.queries, queries)
+
+    @override_settings(BMS_STREAM_CHUNK_SIZE=10)
+    def test_streamed_queries_are_counted(self):
+        seed_transactions(45)
+        stats = registry.endpoint('transaction-list-create', 'GET')
+        response = self.client.get('/api/v1/transaction/?stream=1')
+        queries, size = stats.queries, stats.response_bytes
+        body = b''.join(response.streaming_content)
+        self.assertEqual(len(json.loads(body)['data']), 45)
+        self.assertGreater(stats.queries, queries)
+        self.assertEqual(stats.response_bytes, size + len(body))
+
+    @override_settings(BMS_STREAM_CHUNK_SIZE=10)
+    async def test_async_streamed_queries_are_counted(self):
+        await sync_to_async(seed_transactions)(45)
+        stats = registry.endpoint('async-transaction-list', 'GET')
+        response = await self.async_client.get('/api/v1/async/transaction/?stream=1')
+        queries, size = stats.queries, stats.response_bytes
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(json.loads(body)['data']), 45)
+        self.assertGreater(stats.queries, queries)
+        self.assertEqual(stats.response_bytes, size + len(body))
+
+    def test_unknown_methods_share_one_label(self):
+        stats = registry.endpoint('tax-list-create', 'OTHER')
+        before = stats.requests
+        for method in ('BREW', 'PROPFIND'):
+            self.client.generic(method, '/api/v1/tax/')
+        self.assertEqual(stats.requests, before + 2)
+        self.assertNotIn(('tax-list-create', 'BREW'), registry.endpoints)
+
+
+@skipUnless(connection.vendor == 'postgresql', "Imports use PostgreSQL COPY")
+class TransactionImportTests(TestCase):
+    """
+    Malformed records go to the rejects file without stopping the import.
+    """
+
+    def test_malformed_records_are_rejected(self):
+        company, years, parties = seed_transactions(0)
+        valid = {
+            'bill_no': 'A1', 'bill_date': '2023-05-01', 'party': 'Party 1',
+            'seller_party': 'Party 2', 'product': 'Cotton', 'tax': '5', 'remark': 'Ok',
+            'quantity': 10, 'rate': '12.50', 'amount': '125.00',
+            'brokerage_percentage': '1.00', 'brokerage_amount': '1.25',
+            'brokerage_gst': '0.23', 'tax_amount': '6.25',
+        }
+        malformed = [{**valid, 'quantity': None}, {**valid, 'bill_no': 17},
+                     {**valid, 'bill_date': 20230501}, {**valid, 'rate': 'NaN'},
+                     {**valid, 'amount': 'Infinity'}, {**valid, 'quantity': 2.7},
+                     {**valid, 'quantity': True}, {**valid, 'quantity': '3.5'},
+                     {**valid, 'seller_party': 'Party 3'}]
+        Party.objects.filter(name='Party 3').update(status='inactive')
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        source = f"{directory}/transactions.ndjson"
+        with open(source, 'w') as f:
+            for record in [valid, *malformed]:
+                f.write(json.dumps(record) + '\n')
+
+        call_command('import_transactions', source, financial_year=years[0].pk,
+                     stdout=io.StringIO())
+
+        self.assertEqual(Transactions.objects.filter(company=company).count(), 1)
+        with open(f"{source}.rejected") as f:
+            rejects = [json.loads(line) for line in f]
+        self.assertEqual(len(rejects), len(malformed))
+        self.assertTrue(all(reject['error'] for reject in rejects))
+
+
+@skipUnless(connection.vendor == 'postgresql', "seed_bms loads with PostgreSQL COPY")
+class SeedTests(TestCase):
+    """
+    The same seed and sizes always produce the same data.
+    """
+
+    def seed(self, **options):
+        existing = list(Company.objects.values_list('pk', flat=True))
+        options = {'companies': 2, 'years': 2, 'parties': 30, 'items': 10, 'remarks': 5,
+                   'transactions': 300, 'chunk_size': 100, 'workers': 1, **options}
+        call_command('seed_bms', stdout=io.StringIO(), **options)
+        # Compared through names and dates, since every run gets new IDs.
+        return sorted(Transactions.objects.exclude(company__in=existing).values_list(
+            'company__name', 'company_financial_year__from_date', 'bill_date',
+            'party__name', 'party_bill_no', 'seller_party__name', 'product__item_name',
+            'quantity', 'rate', 'amount', 'brokerage_percentage', 'brokerage_amount',
+            'brokerage_gst', 'tax__tax_percentage', 'tax_amount', 'remark__remark',
+            'status'))
+
+    def test_same_seed_same_data(self):
+        first = self.seed(seed=7)
+        self.assertEqual(len(first), 300)
+        self.assertEqual(self.seed(seed=7), first)
+        self.assertNotEqual(self.seed(seed=8), first)
+
+
+class BenchApiTests(TestCase):
+    """
+    bench_api covers every route and fails on regressions past the
+    threshold, but not on noise below it.
+    """
+
+    def result(self, **changes):
+        return {'iterations': 30, 'status': [200], 'p50_ms': 4.0, 'p95_ms': 10.0,
+                'p99_ms': 12.0, 'mean_ms': 5.0, 'queries': 3, 'peak_memory_kb': 100.0,
+                **changes}
+
+    def test_compare(self):
+        options = {'threshold': 0.25, 'min_delta_ms': 2.0}
+        baseline = {'list': self.result()}
+        compare = BenchApiCommand().compare
+        for changes, expected in (({}, []),
+                                  ({'p95_ms': 12.4, 'peak_memory_kb': 124.0}, []),
+                                  ({'p95_ms': 13.0}, ["list: p95 10.00 ms -> 13.00 ms"]),
+                                  ({'queries': 4}, ["list: 3 -> 4 queries per request"]),
+                                  ({'peak_memory_kb': 130.0},
+                                   ["list: peak memory 100 KiB -> 130 KiB"]),
+                                  ({'status': [200, 500]}, ["list: status [200] -> [200, 500]"])):
+            with self.subTest(changes=changes):
+                self.assertEqual(compare(baseline, {'list': self.result(**changes)}, options),
+                                 expected)
+        # Under min_delta_ms a fast route may double without failing.
+        self.assertEqual(compare({'root': self.result(p95_ms=0.5)},
+                                 {'root': self.result(p95_ms=1.5)}, options), [])
+        # Scenarios new since the baseline have nothing to regress from.
+        self.assertEqual(compare({}, {'new': self.result()}, options), [])
+
+    @skipUnless(connection.vendor == 'postgresql', "Search scenarios need pg_trgm")
+    def test_baseline_round_trip(self):
+        seed_transactions(50)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        baseline = f"{directory}/baseline.json"
+        options = {'baseline': baseline, 'iterations': 1, 'warmup': 0,
+                   'page_sizes': [10], 'label': 'test', 'stdout': io.StringIO()}
+        call_command('bench_api', save=True, **options)
+        with open(baseline) as f:
+            saved = json.load(f)['test']['scenarios']
+        self.assertEqual(saved['party detail']['status'], [200])
+
+        saved['party detail']['queries'] -= 1
+        with open(baseline, 'w') as f:
+            json.dump({'test': {'scenarios': saved}}, f)
+        with self.assertRaisesMessage(CommandError, "party detail: "):
+            call_command('bench_api', only=['party detail'], threshold=1000, **options)
+
+
+@skipUnless(connection.vendor == 'postgresql' and pa is not None,
+            "Archiving needs PostgreSQL and pyarrow")
+class ArchiveTests(TestCase):
+    """
+    Once a year is archived, reads that name it must return what they
+    returned while its transactions were still in the database.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company, cls.years, cls.parties = seed_transactions(300)
+
+    def archive(self, year):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        year.status = 'inactive'
+        year.save()
+        return archive_financial_year(year, directory)
+
+    def test_reads_are_unchanged(self):
+        year = self.years[0]
+        queries = [f'financial_year={year.pk}',
+                   f'financial_year={year.pk}&party={self.parties[2].pk}&ordering=-bill_date',
+                   f'financial_year={year.pk}&from_date=2023-06-01&to_date=2023-07-15'
+                   '&fields=transaction_id,bill_no,amount&ordering=bill_no']
+        report = (f'/api/v1/reports/party-summary/?company={self.company.pk}'
+                  f'&financial_year={year.pk}&from_date=2023-05-10&to_date=2023-08-20')
+        transaction_id = Transactions.objects.filter(company_financial_year=year).first().pk
+        detail = f'/api/v1/transaction/{transaction_id}/'
+        before = ([collect_pages(self, query) for query in queries],
+                  self.client.get(report).json(), self.client.get(detail).json())
+
+        archived = self.archive(year)
+
+        self.assertEqual(archived.rows, 150)
+        self.assertFalse(Transactions.objects.filter(company_financial_year=year).exists())
+        after = ([collect_pages(self, query) for query in queries],
+                 self.client.get(report).json(), self.client.get(detail).json())
+        self.assertEqual(after, before)
+
+    def test_text_ordering_follows_database_collation(self):
+        year = self.years[0]
+        bill_nos = ['b-10', 'B/2', 'a 7', 'A_3', '#5', 'Z9', 'z10', 'Éa', 'e1', None]
+        rows = Transactions.objects.filter(company_financial_year=year).order_by('pk')
+        for row, bill_no in zip(rows[:len(bill_nos) * 3], bill_nos * 3):
+            row.bill_no = bill_no
+            row.save(update_fields=['bill_no'])
+        queries = [f'financial_year={year.pk}&ordering=bill_no',
+                   f'financial_year={year.pk}&ordering=-bill_no']
+        before = [collect_pages(self, query) for query in queries]
+
+        self.archive(year)
+
+        self.assertEqual([collect_pages(self, query) for query in queries], before)
+
+    def test_text_ordering_reads_stored_ranks(self):
+        year = self.years[0]
+        Transactions.objects.filter(company_financial_year=year, bill_no='4').update(bill_no=None)
+        archived = self.archive(year)
+        table = read_archive(archived, ['bill_no', 'bill_no_rank'])
+        ranks = dict(zip(table.column('bill_no').to_pylist(),
+                         table.column('bill_no_rank').to_pylist()))
+        self.assertIsNone(ranks[None])
+        self.assertEqual(sorted(ranks, key=lambda value: ranks[value] or 0)[1:],
+                         sorted(value for value in ranks if value is not None))
+
+        query = f'/api/v1/transaction/?financial_year={year.pk}&ordering=bill_no&page_size=7'
+        cursor = self.client.get(query).json()['pagination']['next_cursor']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'{query}&cursor={cursor}')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query['sql'] for query in queries.captured_queries
+                          if 'unnest' in query['sql']])
+
+        value, transaction_id = decode_cursor(cursor, 'bill_no')
+        forged = encode_cursor(value + 'x', transaction_id, 'bill_no')
+        self.assertEqual(self.client.get(f'{query}&cursor={forged}').status_code, 400)
+
+    def test_archived_year_is_read_only(self):
+        year = self.years[0]
+        row = Transactions.objects.filter(company_financial_year=year).first()
+        payload = json.loads(json.dumps(TransactionSerializer(row).data, cls=DjangoJSONEncoder))
+        del payload['transaction_id']
+        self.archive(year)
+
+        response = self.client.post('/api/v1/transaction/', payload,
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('company_financial_year', response.json()['error'])
+
+
+@skipUnless(connection.vendor == 'postgresql', "Deletion jobs use PostgreSQL SQL")
+class DeletionJobTests(TestCase):
+    """
+    A deletion queued by the API removes the row and its dependants batch
+    by batch, and leaves the brokerage rollup as a rebuild would.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company, cls.years, cls.parties = seed_transactions(200)
+        cls.other_tax = Tax.objects.create(tax_percentage=Decimal("12.00"))
+        Transactions.objects.filter(transaction_id__in=Transactions.objects.order_by(
+            'transaction_id').values('transaction_id')[:80]).update(tax=cls.other_tax)
+        rebuild_rollups()
+
+    def rollup_rows(self):
+        return sorted(BrokerageRollup.objects.exclude(transaction_count=0).values_list(
+            'company_id', 'financial_year_id', 'month', 'party_id', 'seller_party_id',
+            'product_id', 'quantity', 'amount', 'transaction_count'))
+
+    def assert_rollup_matches_rebuild(self):
+        purged = self.rollup_rows()
+        rebuild_rollups()
+        self.assertEqual(purged, self.rollup_rows())
+
+    def queue(self, path):
+        response = self.client.delete(path)
+        self.assertEqual(response.status_code, 202)
+        return Job.objects.get(pk=response.json()['data']['job_id'])
+
+    @override_settings(BMS_DELETE_BATCH_SIZE=25)
+    def test_tax_deletion(self):
+        job = self.queue(f'/api/v1/tax/{self.other_tax.pk}/')
+        self.other_tax.refresh_from_db()
+        self.assertEqual(self.other_tax.status, 'inactive')
+        self.assertEqual(Transactions.objects.filter(tax=self.other_tax).count(), 80)
+
+        self.assertEqual(run_job(claim_job('test')), 'completed')
+
+        job.refresh_from_db()
+        self.assertEqual(job.result, {'rows_deleted': 80})
+        self.assertFalse(Tax.objects.filter(pk=self.other_tax.pk).exists())
+        self.assertEqual(Transactions.objects.count(), 120)
+        self.assert_rollup_matches_rebuild()
+
+    def test_pending_deletion_takes_no_transactions(self):
+        party = self.parties[4]
+        payload = transaction_payload(Transactions.objects.order_by('pk').first())
+        self.queue(f'/api/v1/parties/{party.pk}/')
+        self.queue(f'/api/v1/tax/{self.other_tax.pk}/')
+        count = Transactions.objects.count()
+
+        response = self.client.post('/api/v1/transaction/', {**payload, 'party': party.pk},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], {'party': [INACTIVE_ERROR]})
+
+        response = self.client.post(
+            '/api/v1/transaction/bulk/?mode=partial',
+            [payload, {**payload, 'seller_party': party.pk, 'tax': self.other_tax.pk}],
+            content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['error'], [{
+            'index': 1,
+            'errors': {'seller_party': [INACTIVE_ERROR], 'tax': [INACTIVE_ERROR]},
+        }])
+        self.assertEqual(Transactions.objects.count(), count + 1)
+
+    @override_settings(BMS_DELETE_BATCH_SIZE=3)
+    def test_party_deletion_resumes(self):
+        party = self.parties[3]
+        job = self.queue(f'/api/v1/parties/{party.pk}/')
+        self.assertEqual(self.queue(f'/api/v1/parties/{party.pk}/').pk, job.pk)
+
+        # A worker that stopped after two batches, its lease run out.
+        for _ in range(2):
+            purge_batch(PURGE_PLANS['party'][0], party.pk, 3)
+        Job.objects.filter(pk=job.pk).update(
+            status='running', worker='gone', attempts=1,
+            progress={'step': 0, 'rows_deleted': 6, 'rows': {'transactions.party_id': 6}},
+            locked_until=timezone.now() - timedelta(seconds=1))
+
+        claimed = claim_job('test')
+        self.assertEqual((claimed.pk, claimed.attempts), (job.pk, 2))
+        self.assertEqual(run_job(claimed), 'completed')
+
+        self.assertFalse(Party.objects.filter(pk=party.pk).exists())
+        self.assertFalse(Transactions.objects.filter(party=party).exists())
+        self.assertFalse(Transactions.objects.filter(seller_party=party).exists())
+        self.assertFalse(BrokerageRollup.objects.filter(party=party).exists())
+        status = self.client.get(f'/api/v1/jobs/{job.pk}/').json()['data']
+        self.assertEqual(status['status'], 'completed')
+        rows = status['progress']['rows']
+        self.assertEqual(rows['transactions.party_id'], 10)
+        self.assertEqual(rows['transactions.seller_party_id'], 10)
+        self.assertEqual(status['progress']['rows_deleted'], sum(rows.values()))
+        self.assert_rollup_matches_rebuild()
+
+
+    @skipUnless(pa is not None, "Archiving needs pyarrow")
+    def test_company_deletion(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        archived_year = self.years[0]
+        archived_year.status = 'inactive'
+        archived_year.save()
+        archive = archive_financial_year(archived_year, directory)
+        self.queue(f'/api/v1/companies/{self.company.pk}/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(run_job(claim_job('test')), 'completed')
+
+        self.assertFalse(Company.objects.filter(pk=self.company.pk).exists())
+        self.assertFalse(FinancialYear.objects.filter(company=self.company).exists())
+        self.assertFalse(Transactions.objects.filter(company=self.company).exists())
+        self.assertFalse(BrokerageRollup.objects.filter(company=self.company).exists())
+        with connection.cursor() as cursor:
+            for year in self.years:
+                cursor.execute("SELECT to_regclass(%s)", [f"transactions_fy_{year.pk}"])
+                self.assertIsNone(cursor.fetchone()[0])
+        self.assertFalse(os.path.exists(archive.path))
+
+
+@skipUnless(connection.vendor == 'postgresql', "Jobs use SKIP LOCKED")
+class JobTests(TestCase):
+    """
+    Retries, per-company limits and cancellation of the job runner, with
+    a handler that fails or saves progress on request.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name="Test Company", phone="0")
+
+    def setUp(self):
+        def handler(job):
+            save_progress(job, started=True)
+            if job.params.get('fail'):
+                raise RuntimeError("failed")
+            if job.params.get('cancel'):
+                cancel_job(job)
+                save_progress(job, after_cancel=True)
+            return {'ok': True}
+        JOB_HANDLERS['test'] = handler
+        self.addCleanup(JOB_HANDLERS.pop, 'test')
+
+    @override_settings(BMS_JOB_RETRY_DELAY_SECONDS=10)
+    def test_failed_job_is_retried_with_backoff(self):
+        job = enqueue_job('test', {'fail': True}, max_attempts=2)
+
+        self.assertEqual(run_job(claim_job('test')), 'queued')
+        job.refresh_from_db()
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=5))
+        self.assertIsNone(claim_job('test'))
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        self.assertEqual(run_job(claim_job('test')), 'failed')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertIn('RuntimeError', job.error)
+
+    @override_settings(BMS_JOB_COMPANY_CONCURRENCY=1)
+    def test_company_concurrency_limit(self):
+        first = enqueue_job('test', company_id=self.company.pk)
+        second = enqueue_job('test', company_id=self.company.pk)
+        other = enqueue_job('test')
+
+        self.assertEqual(claim_job('a').pk, first.pk)
+        self.assertEqual(claim_job('b').pk, other.pk)
+        self.assertIsNone(claim_job('c'))
+        run_job(Job.objects.get(pk=first.pk))
+        self.assertEqual(claim_job('c').pk, second.pk)
+
+    def test_cancellation(self):
+        queued = enqueue_job('test')
+        response = self.client.delete(f'/api/v1/jobs/{queued.pk}/')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['data']['status'], 'cancelled')
+        self.assertEqual(self.client.delete(f'/api/v1/jobs/{queued.pk}/').status_code, 409)
+
+        running = enqueue_job('test', {'cancel': True})
+        self.assertEqual(run_job(claim_job('test')), 'cancelled')
+        running.refresh_from_db()
+        self.assertEqual(running.status, 'cancelled')
+        self.assertEqual(running.progress, {'started': True})
+
+    def test_api_queues_known_kinds_only(self):
+        response = self.client.post('/api/v1/jobs/', {'kind': 'delete'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            '/api/v1/jobs/', {'kind': 'rebuild_rollups', 'params': {'company': self.company.pk}},
+            content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        job = Job.objects.get(pk=response.json()['data']['job_id'])
+        self.assertEqual((job.company_id, job.params), (self.company.pk, {'company': self.company.pk}))
+
+
+@skipUnless(connection.vendor == 'postgresql', "Jobs use SKIP LOCKED")
+@override_settings(BMS_JOB_LEASE_SECONDS=1, BMS_JOB_HEARTBEAT_SECONDS=0.2)
+class JobHeartbeatTests(TransactionTestCase):
+    """
+    A handler that never saves progress keeps its job while it runs, and
+    still stops when the job is cancelled.
+    """
+
+    def setUp(self):
+        def handler(job):
+            if job.params.get('query'):
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_sleep(30)")
+            else:
+                time.sleep(2.5)
+            return {'ok': True}
+        JOB_HANDLERS['test'] = handler
+        self.addCleanup(JOB_HANDLERS.pop, 'test')
+
+    def in_thread(self, delay, function, *args):
+        def call():
+            time.sleep(delay)
+            try:
+                return function(*args)
+            finally:
+                connection.close()
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        return executor.submit(call)
+
+    def test_lease_is_renewed(self):
+        job = enqueue_job('test')
+        second = self.in_thread(1.5, claim_job, 'second')
+        self.assertEqual(run_job(claim_job('first')), 'completed')
+        self.assertIsNone(second.result())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker, job.attempts), ('completed', 'first', 1))
+
+    def test_cancel_landing_on_finish_job(self):
+        def handler(job):
+            cancel_job(job)
+            # Long enough for a beat to see the cancellation.
+            time.sleep(1)
+            return {'ok': True}
+        JOB_HANDLERS['test'] = handler
+        job = enqueue_job('test')
+
+        late_cancel = OperationalError("canceling statement due to user request")
+        with mock.patch('bms_app.jobs.finish_job', side_effect=late_cancel):
+            self.assertEqual(run_job(claim_job('first')), 'cancelled')
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'cancelled')
+
+        # Without a cancellation the error is the job's own.
+        job = enqueue_job('test')
+        JOB_HANDLERS['test'] = lambda job: {'ok': True}
+        with mock.patch('bms_app.jobs.finish_job', side_effect=late_cancel):
+            with self.assertRaises(OperationalError):
+                run_job(claim_job('first'))
+
+    def test_running_query_is_cancelled(self):
+        job = enqueue_job('test', {'query': True})
+        self.in_thread(0.5, cancel_job, job)
+        started = time.monotonic()
+        self.assertEqual(run_job(claim_job('first')), 'cancelled')
+        self.assertLess(time.monotonic() - started, 10)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'cancelled')
+
+
+@skipUnless(connection.vendor == 'postgresql', "Numbering is tested under PostgreSQL locking")
+class DocumentNumberTests(TransactionTestCase):
+    """
+    Bills posted without a bill_no get the next number of their company
+    and year, with no duplicates or gaps however many clerks post at once.
+    """
+
+    def setUp(self):
+        self.company, self.years, self.parties = seed_transactions(2)
+        self.company.invoice_head = "TC/"
+        self.company.save()
+        row = Transactions.objects.first()
+        self.values = {field.attname: getattr(row, field.attname)
+                       for field in Transactions._meta.concrete_fields if not field.primary_key}
+        self.values['company_financial_year_id'] = self.years[1].pk
+        self.payload = json.loads(json.dumps(
+            TransactionSerializer(row).data, cls=DjangoJSONEncoder))
+        del self.payload['transaction_id']
+        self.payload['bill_no'] = None
+        self.payload['company_financial_year'] = self.years[1].pk
+
+    def post_bills(self, count, rollback_every=0):
+        created = []
+        for index in range(count):
+            try:
+                with db_transaction.atomic():
+                    trnx = Transactions.objects.create(**{
+                        **self.values,
+                        'bill_no': next_number(self.company, self.years[1].pk, 'bill')})
+                    if rollback_every and index % rollback_every == 0:
+                        raise RuntimeError("rolled back")
+                    created.append(trnx.bill_no)
+            except RuntimeError:
+                pass
+        connection.close()
+        return created
+
+    def test_concurrent_clerks(self):
+        clerks, bills = 12, 15
+        with ThreadPoolExecutor(max_workers=clerks) as pool:
+            results = list(pool.map(lambda clerk: self.post_bills(bills, rollback_every=4),
+                                    range(clerks)))
+
+        numbers = sorted(int(bill.removeprefix("TC/")) for result in results for bill in result)
+        self.assertEqual(numbers, list(range(1, len(numbers) + 1)))
+        self.assertEqual(len(numbers), clerks * (bills - 4))
+
+    def test_api_allocates_missing_numbers(self):
+        response = self.client.post('/api/v1/transaction/', self.payload,
+                                    content_type='application/json')
+        self.assertEqual(response.json()['data'][0]['bill_no'], "TC/1")
+
+        response = self.client.post('/api/v1/transaction/bulk/',
+                                    [self.payload, {**self.payload, 'bill_no': "X-9"},
+                                     self.payload], content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        ids = [row['transaction_id'] for row in response.json()['data']]
+        self.assertEqual(
+            [Transactions.objects.get(pk=pk).bill_no for pk in ids], ["TC/2", "X-9", "TC/3"])
+
+        # Updates without a bill_no keep the number, or allocate one.
+        trnx = Transactions.objects.get(pk=ids[0])
+        response = self.client.put(f'/api/v1/transaction/{trnx.pk}/', self.payload,
+                                   content_type='application/json')
+        self.assertEqual(response.json()['data'][0]['bill_no'], "TC/2")
+        Transactions.objects.filter(pk=trnx.pk).update(bill_no=None)
+        response = self.client.put(f'/api/v1/transaction/{trnx.pk}/',
+                                   {**self.payload, 'bill_no': ""},
+                                   content_type='application/json')
+        self.assertEqual(response.json()['data'][0]['bill_no'], "TC/4")
+
+        response = self.client.post('/api/v1/invoices/', {
+            'company': self.company.pk, 'financial_year': self.years[1].pk,
+            'party': self.parties[0].pk}, content_type='application/json')
+        self.assertEqual(response.json()['data'][0]['invoice_number'], "TC/1")
+
+
+@skipUnless(connection.vendor == 'postgresql', "The GST summary is read from the rollup")
+class GSTSummaryTests(TestCase):
+    """
+    The GST summary matches the transactions, and completed months are
+    only recomputed after one of their transactions changes.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company, cls.years, cls.parties = seed_transactions(200)
+        for index, party in enumerate(cls.parties[:5]):
+            party.gst = f"27AAAAA{index:04d}A1Z5"
+            party.save()
+        higher = Tax.objects.create(tax_percentage=Decimal("18.00"))
+        Transactions.objects.filter(party__in=cls.parties[:3]).update(tax=higher)
+        rebuild_rollups()
+        cls.path = (f'/api/v1/reports/gst-summary/?company={cls.company.pk}'
+                    f'&financial_year={cls.years[0].pk}')
+
+    def summary(self, path=None):
+        response = self.client.get(path or self.path)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['data']
+
+    def test_totals_match_transactions(self):
+        months = self.summary()['months']
+        year_rows = Transactions.objects.filter(company_financial_year=self.years[0])
+        self.assertEqual(sum(month['totals']['transactions'] for month in months),
+                         year_rows.count())
+
+        april = months[0]
+        self.assertEqual(april['month'], '2023-04-01')
+        rows = year_rows.filter(bill_date__lt=date(2023, 5, 1))
+        self.assertEqual(Decimal(april['totals']['amount']), rows.aggregate(Sum('amount'))['amount__sum'])
+        by_rate = {row['tax_percentage']: row['transactions'] for row in april['by_tax_rate']}
+        self.assertEqual(by_rate, {
+            '5.00': rows.filter(tax__tax_percentage=5).count(),
+            '18.00': rows.filter(tax__tax_percentage=18).count()})
+        unregistered = april['by_party_gst'][-1]
+        self.assertIsNone(unregistered['gst'])
+        self.assertEqual(unregistered['transactions'], rows.filter(party__gst__isnull=True).count())
+
+    def test_completed_months_are_cached(self):
+        self.summary()
+        computed = dict(GSTMonthSummary.objects.values_list('month', 'computed_at'))
+        # The seeded bills of the first year run from April to October.
+        self.assertEqual(len(computed), 7)
+
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.summary()
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'FROM "transactions' in query['sql']])
+
+        trnx = Transactions.objects.filter(company_financial_year=self.years[0],
+                                           bill_date__month=6).first()
+        payload = json.loads(json.dumps(TransactionSerializer(trnx).data, cls=DjangoJSONEncoder))
+        payload['amount'] = str(trnx.amount + 100)
+        response = self.client.put(f'/api/v1/transaction/{trnx.pk}/', payload,
+                                   content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        updated = self.summary()
+        recomputed = [month for month, at in GSTMonthSummary.objects.values_list(
+            'month', 'computed_at') if at != computed[month]]
+        self.assertEqual(recomputed, [date(2023, 6, 1)])
+        june = [month for month in updated['months'] if month['month'] == '2023-06-01'][0]
+        cached_june = [month for month in cached['months'] if month['month'] == '2023-06-01'][0]
+        self.assertEqual(Decimal(june['totals']['amount']),
+                         Decimal(cached_june['totals']['amount']) + 100)
+
+        one_month = self.summary(self.path + '&month=2023-06-15')['months']
+        self.assertEqual(one_month, [june])
+
+    def test_rebuild_drops_cached_months(self):
+        cached = self.summary()
+        self.assertTrue(GSTMonthSummary.objects.exists())
+
+        # A queryset update bypasses the rollup, and the rebuild then
+        # restores the same row counts and revisions for June.
+        trnx = Transactions.objects.filter(company_financial_year=self.years[0],
+                                           bill_date__month=6).first()
+        Transactions.objects.filter(pk=trnx.pk).update(amount=trnx.amount + 100)
+        rebuild_rollups(self.company.pk)
+        self.assertFalse(GSTMonthSummary.objects.exists())
+
+        june = [month for month in self.summary()['months'] if month['month'] == '2023-06-01'][0]
+        cached_june = [month for month in cached['months'] if month['month'] == '2023-06-01'][0]
+        self.assertEqual(Decimal(june['totals']['amount']),
+                         Decimal(cached_june['totals']['amount']) + 100)
@@ -1,9 +1,23 @@
 import logging
 import traceback
-from django.http import JsonResponse
+from itertools import islice
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.http import StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from rest_framework.exceptions import ValidationError
 from rest_framework.views import APIView
-from .models import Transactions
-from .serializers import TransactionSerializer
+from .archive import archived_page, find_archived_transaction, iter_archive, year_archive
+from .fieldsets import InvalidFieldset, only_fields, requested_expansions, requested_fields
+from .models import Company, FinancialYear, Items, Party, Remarks, Tax, TransactionArchive, Transactions
+from .numbering import assign_bill_numbers, next_number
+from .pagination import InvalidPageRequest, approximate_count, get_ordering, keyset_page, sort_column, split_page
+from .responses import api_response, dumps_json
+from .rollup import add_rollup_delta, apply_rollup_deltas
+from .rowencoders import row_encoder
+from .serializers import ACTIVE_FOREIGN_KEYS, ARCHIVED_YEAR_ERROR, INACTIVE_ERROR, TransactionBulkSerializer, TransactionFilterSerializer, TransactionSerializer
+from .versions import versioned_etag
 
 # Setup logger
 logger = logging.getLogger(__name__)
@@ -11,52 +25,242 @@ logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
 
+BULK_FOREIGN_KEYS = {
+    'party': Party,
+    'seller_party': Party,
+    'product': Items,
+    'tax': Tax,
+    'remark': Remarks,
+    'company': Company,
+    'company_financial_year': FinancialYear,
+}
+
+# TransactionFilterSerializer fields and the lookups they filter on. Each
+# leads an index on transactions, alone or with the bill_date range.
+TRANSACTION_FILTERS = {
+    'company': 'company_id',
+    'financial_year': 'company_financial_year_id',
+    'party': 'party_id',
+    'seller_party': 'seller_party_id',
+    'product': 'product_id',
+    'status': 'status',
+    'from_date': 'bill_date__gte',
+    'to_date': 'bill_date__lte',
+    'bill_no': 'bill_no',
+    'party_bill_no': 'party_bill_no',
+}
+
+
+def transaction_lookups(params):
+    return {TRANSACTION_FILTERS[name]: value for name, value in params.items()}
+
+
+def filter_transactions(queryset, params):
+    return queryset.filter(**transaction_lookups(params))
+
+
+def requested_archive(params):
+    """
+    The archive of the financial year the filters name, if it is archived.
+    """
+    if 'financial_year' not in params:
+        return None
+    return year_archive(params['financial_year'])
+
+
+def validate_bulk_transactions(rows):
+    """
+    Validates a list of transaction payloads together.
+
+    Returns the unsaved Transactions for the valid rows as (index, object)
+    pairs and the errors of the invalid ones keyed by their index.
+    """
+    serializer = TransactionBulkSerializer()
+    errors = {}
+    valid = []
+    for index, row in enumerate(rows):
+        try:
+            valid.append((index, serializer.run_validation(row)))
+        except ValidationError as e:
+            errors[index] = e.detail
+
+    ids_by_model = {}
+    for field, model in BULK_FOREIGN_KEYS.items():
+        ids_by_model.setdefault(model, set()).update(
+            data[f"{field}_id"] for _, data in valid)
+    # Status of each referenced row that exists, by model and pk.
+    existing = {
+        model: dict(model.objects.filter(pk__in=ids).values_list('pk', 'status'))
+        for model, ids in ids_by_model.items()
+    }
+    archived = set(TransactionArchive.objects.filter(
+        financial_year__in=list(existing[FinancialYear])).values_list('financial_year', flat=True))
+
+    objects = []
+    for index, data in valid:
+        row_errors = {}
+        for field, model in BULK_FOREIGN_KEYS.items():
+            pk = data[f"{field}_id"]
+            if pk not in existing[model]:
+                row_errors[field] = [
+                    f'Invalid pk "{pk}" - object does not exist.']
+            elif field in ACTIVE_FOREIGN_KEYS and existing[model][pk] != 'active':
+                row_errors[field] = [INACTIVE_ERROR]
+        if data['company_financial_year_id'] in archived:
+            row_errors['company_financial_year'] = [ARCHIVED_YEAR_ERROR]
+        if row_errors:
+            errors[index] = row_errors
+        else:
+            objects.append((index, Transactions(**data)))
+
+    return objects, errors
+
+
+def stream_transactions(queryset, fields=None, expand=(), archive=None, lookups=None):
+    """
+    Yields the standard response envelope with every transaction in it,
+    reading rows through a server-side cursor one chunk at a time so the
+    worker never holds more than a chunk in memory. With an `archive`,
+    the rows matching `lookups` are read from it in batches instead.
+    """
+    chunk_size = settings.BMS_STREAM_CHUNK_SIZE
+    encoder = row_encoder(TransactionSerializer, fields, expand=expand)
+    if archive is None:
+        rows = encoder.values(queryset.order_by('transaction_id')).iterator(
+            chunk_size=chunk_size)
+        chunks = iter(lambda: list(islice(rows, chunk_size)), [])
+    else:
+        chunks = iter_archive(archive, encoder.columns, lookups, chunk_size)
+    yield b'{"error_code": 200, "message": "Data found", "data": ['
+    separator = b''
+    for chunk in chunks:
+        yield separator + dumps_json(encoder.encode_rows(chunk))[1:-1]
+        separator = b','
+    yield b'], "error": []}'
+
+
 class TransactionAPIView(APIView):
+    @method_decorator(condition(etag_func=versioned_etag(
+        'transactions', expandable=TransactionSerializer.expandable_fields)))
     def get(self, request, trnx_id=None, *args, **kwargs):
         try:
+            fields = requested_fields(request, TransactionSerializer)
+            expand = requested_expansions(request, TransactionSerializer, fields)
             if trnx_id:
-                transaction = Transactions.objects.filter(
-                    transaction_id=trnx_id).first()
+                transaction = only_fields(
+                    Transactions.objects.select_related(*expand).filter(
+                        transaction_id=trnx_id), fields).first()
                 if transaction is None:
-                    return JsonResponse({
-                        "error_code": 404,
-                        "message": "Transaction not found",
-                        "data": [],
+                    encoder = row_encoder(TransactionSerializer, fields, expand=expand)
+                    row = find_archived_transaction(trnx_id, encoder.columns)
+                    if row is None:
+                        return api_response(request, {
+                            "error_code": 404,
+                            "message": "Transaction not found",
+                            "data": [],
+                            "error": []
+                        }, status=404)
+
+                    logger.info(f"Fetched archived transaction: {trnx_id}")
+                    return api_response(request, {
+                        "error_code": 200,
+                        "message": "Transactiion found",
+                        "data": encoder.encode_rows([row]),
                         "error": []
-                    }, status=404)
+                    }, status=200)
 
-                serializer = TransactionSerializer(transaction)
+                serializer = TransactionSerializer(
+                    transaction, fields=fields, expand=expand)
                 logger.info(f"Fetched transaction: {
                             transaction.transaction_id}")
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 200,
                     "message": "Transactiion found",
                     "data": [serializer.data],
                     "error": []
                 }, status=200)
 
+            filters = TransactionFilterSerializer(data=request.GET)
+            if not filters.is_valid():
+                return api_response(request, {
+                    "error_code": 400,
+                    "message": "Validation failed",
+                    "data": [],
+                    "error": filters.errors
+                }, status=400)
+            queryset = filter_transactions(
+                Transactions.objects.all(), filters.validated_data)
+            archive = requested_archive(filters.validated_data)
+
+            if request.GET.get('stream'):
+                logger.info("Streaming all transactions")
+                return StreamingHttpResponse(
+                    stream_transactions(
+                        queryset, fields, expand, archive,
+                        transaction_lookups(filters.validated_data)),
+                    content_type='application/json')
+
             else:
-                transactions = Transactions.objects.all()
-                logger.warning("No transactions found")
-                if not transaction:
-                    return JsonResponse({
+                ordering = get_ordering(request)
+                column = sort_column(ordering)
+                encoder = row_encoder(TransactionSerializer, fields,
+                                      extra=(column, 'transaction_id'),
+                                      expand=expand)
+                if archive is None:
+                    transactions, next_cursor, page_size = keyset_page(
+                        encoder.values(queryset), request,
+                        key=encoder.getter(column, 'transaction_id'),
+                        ordering=ordering)
+                else:
+                    rows, page_size = archived_page(
+                        archive, encoder.columns,
+                        transaction_lookups(filters.validated_data), request, ordering)
+                    transactions, next_cursor = split_page(
+                        rows, page_size, encoder.getter(column, 'transaction_id'), ordering)
+                if not transactions and not request.GET.get('cursor'):
+                    logger.warning("No transactions found")
+                    return api_response(request, {
                         "error_code": 400,
                         "message": "No transaction found",
                         "data": [],
                         "error": []
                     }, status=400)
 
-                serializer = TransactionSerializer(transactions, many=True)
-                logger.info("Fetched all transactions")
-                return JsonResponse({
+                pagination = {
+                    "page_size": page_size,
+                    "next_cursor": next_cursor,
+                }
+                if request.GET.get('approx_total'):
+                    pagination["approximate_total"] = (
+                        approximate_count(queryset) if archive is None else archive.rows)
+
+                logger.info("Fetched transactions page")
+                return api_response(request, {
                     "error_code": 200,
                     "message": "Data found",
-                    "data": serializer.data,
-                    "error": []
+                    "data": encoder.encode_rows(transactions),
+                    "error": [],
+                    "pagination": pagination
                 }, status=200)
 
+        except InvalidPageRequest as e:
+            return api_response(request, {
+                "error_code": 400,
+                "message": "Invalid pagination parameters",
+                "data": [],
+                "error": [str(e)]
+            }, status=400)
+
+        except InvalidFieldset as e:
+            return api_response(request, {
+                "error_code": 400,
+                "message": "Invalid fields",
+                "data": [],
+                "error": [str(e)]
+            }, status=400)
+
         except Exception as e:
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -67,11 +271,19 @@ class TransactionAPIView(APIView):
         try:
             serializer = TransactionSerializer(data=request.data)
             if serializer.is_valid():
-                serializer.save()
+                data = serializer.validated_data
+                with db_transaction.atomic():
+                    if data.get('bill_no'):
+                        serializer.save()
+                    else:
+                        serializer.save(bill_no=next_number(
+                            data['company'], data['company_financial_year'].pk, 'bill'))
+                    apply_rollup_deltas(
+                        add_rollup_delta({}, serializer.instance))
                 logger.info(f"Created transaction: {
                             serializer.data['transaction_id']}")
 
-                return JsonResponse({
+                return api_response(request, {
                     "error_code": 200,
                     "message": "Transaction created successfully",
                     "data": [serializer.data],
@@ -79,7 +291,7 @@ class TransactionAPIView(APIView):
                 }, status=201)
 
             logger.error(f"Failed to create transaction: {serializer.errors}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 400,
                 "message": "Validation failed",
                 "data": [],
@@ -87,7 +299,7 @@ class TransactionAPIView(APIView):
             }, status=400)
 
         except Exception as e:
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -96,29 +308,42 @@ class TransactionAPIView(APIView):
 
     def put(self, request, trnx_id, *args, **kwargs):
         try:
-            transaction = Transactions.objects.filter(pk=trnx_id).first()
-            if transaction is None:
-                logger.error(f"Transaction with ID {trnx_id} not found")
-                return JsonResponse({
-                    "error_code": 404,
-                    "message": "Transaction not found",
-                    "data": [],
-                    "error": []
-                }, status=404)
+            with db_transaction.atomic():
+                transaction = Transactions.objects.select_for_update().filter(
+                    pk=trnx_id).first()
+                if transaction is None:
+                    logger.error(f"Transaction with ID {trnx_id} not found")
+                    return api_response(request, {
+                        "error_code": 404,
+                        "message": "Transaction not found",
+                        "data": [],
+                        "error": []
+                    }, status=404)
 
-            serializer = TransactionSerializer(transaction, data=request.data)
-            if serializer.is_valid():
-                serializer.save()
-                logger.info(f"Updated transaction: {transaction.trnx_id}")
-                return JsonResponse({
-                    "error_code": 200,
-                    "message": "Transaction updated successfully",
-                    "data": [serializer.data],
-                    "error": []
-                }, status=200)
+                deltas = add_rollup_delta({}, transaction, -1)
+                serializer = TransactionSerializer(
+                    transaction, data=request.data)
+                if serializer.is_valid():
+                    data = serializer.validated_data
+                    if data.get('bill_no'):
+                        serializer.save()
+                    else:
+                        # An update without a bill_no keeps the number the
+                        # bill has, or is given one as a new bill would be.
+                        serializer.save(bill_no=transaction.bill_no or next_number(
+                            data['company'], data['company_financial_year'].pk, 'bill'))
+                    apply_rollup_deltas(add_rollup_delta(deltas, transaction))
+                    logger.info(f"Updated transaction: {
+                                transaction.transaction_id}")
+                    return api_response(request, {
+                        "error_code": 200,
+                        "message": "Transaction updated successfully",
+                        "data": [serializer.data],
+                        "error": []
+                    }, status=200)
 
             logger.error(f"Failed to update transaction: {serializer.errors}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 400,
                 "message": "Validation failed",
                 "data": [],
@@ -127,7 +352,7 @@ class TransactionAPIView(APIView):
 
         except Exception as e:
             logger.error(f"Internal Server Error: {str(e)}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -136,20 +361,24 @@ class TransactionAPIView(APIView):
 
     def delete(self, request, trnx_id, *args, **kwargs):
         try:
-            transaction = Transactions.objects.filter(pk=trnx_id).first()
-            if transaction is None:
-                logger.error(f"Transaction with ID {trnx_id} not found")
-                return JsonResponse({
-                    "error_code": 404,
-                    "message": "Transaction not found",
-                    "data": [],
-                    "error": []
-                }, status=404)
+            with db_transaction.atomic():
+                transaction = Transactions.objects.select_for_update().filter(
+                    pk=trnx_id).first()
+                if transaction is None:
+                    logger.error(f"Transaction with ID {trnx_id} not found")
+                    return api_response(request, {
+                        "error_code": 404,
+                        "message": "Transaction not found",
+                        "data": [],
+                        "error": []
+                    }, status=404)
+
+                trnx_id = transaction.transaction_id
+                transaction.delete()
+                apply_rollup_deltas(add_rollup_delta({}, transaction, -1))
 
-            trnx_id = transaction.transaction_id
-            transaction.delete()
             logger.info(f"Deleted transaction: {trnx_id}")
-            return JsonResponse({
+            return api_response(request, {
                 "error_code": 200,
                 "message": "Transaction deleted successfully",
                 "data": [],
@@ -158,7 +387,78 @@ class TransactionAPIView(APIView):
 
         except Exception as e:
             logger.error(f"Internal Server Error: {str(e)}")
-            return JsonResponse({
+            return api_response(request, {
+                "error_code": 500,
+                "message": "Internal Server Error",
+                "data": [],
+                "error": traceback.format_exc().splitlines()
+            }, status=500)
+
+
+class TransactionBulkAPIView(APIView):
+    """
+    Creates many transactions from one JSON array.
+
+    ?mode=atomic (default) inserts nothing unless every row is valid;
+    ?mode=partial inserts the valid rows and reports the rest.
+    """
+
+    def post(self, request, *args, **kwargs):
+        try:
+            mode = request.GET.get('mode', 'atomic')
+            rows = request.data
+            if mode not in ('atomic', 'partial') or not isinstance(rows, list):
+                return api_response(request, {
+                    "error_code": 400,
+                    "message": "Expected a JSON array and mode atomic or partial",
+                    "data": [],
+                    "error": []
+                }, status=400)
+
+            if len(rows) > settings.BMS_BULK_MAX_ROWS:
+                return api_response(request, {
+                    "error_code": 400,
+                    "message": f"At most {settings.BMS_BULK_MAX_ROWS} transactions per request",
+                    "data": [],
+                    "error": []
+                }, status=400)
+
+            objects, errors = validate_bulk_transactions(rows)
+            error = [{"index": index, "errors": errors[index]}
+                     for index in sorted(errors)]
+            if not objects or (errors and mode == 'atomic'):
+                logger.error(f"Bulk transaction validation failed for {
+                             len(errors)} rows")
+                return api_response(request, {
+                    "error_code": 400,
+                    "message": "Validation failed",
+                    "data": [],
+                    "error": error
+                }, status=400)
+
+            deltas = {}
+            for _, obj in objects:
+                add_rollup_delta(deltas, obj)
+            with db_transaction.atomic():
+                assign_bill_numbers([obj for _, obj in objects])
+                Transactions.objects.bulk_create(
+                    [obj for _, obj in objects],
+                    batch_size=settings.BMS_BULK_BATCH_SIZE)
+                apply_rollup_deltas(deltas)
+
+            logger.info(f"Bulk created {len(objects)} transactions")
+            return api_response(request, {
+                "error_code": 200,
+                "message": ("Transactions created successfully" if not errors
+                            else "Valid transactions created"),
+                "data": [{"index": index, "transaction_id": obj.transaction_id}
+                         for index, obj in objects],
+                "error": error
+            }, status=201)
+
+        except Exception as e:
+            logger.error(f"Internal Server Error: {str(e)}")
+            return api_response(request, {
                 "error_code": 500,
                 "message": "Internal Server Error",
                 "data": [],
@@ -1,8 +1,12 @@
 from django.urls import path
+from .async_views import AsyncItemsView, AsyncPartyView, AsyncRemarkView, AsyncTaxView, AsyncTransactionView
 from .company import CompanyAPIView
-from .misc import ItemsAPIView, RemarkAPIView, TaxAPIView, GSTAPIView
-from .party import PartyAPIView
-from .transaction import TransactionAPIView
+from .jobs import JobAPIView
+from .misc import ItemsAPIView, RemarkAPIView, TaxAPIView, GSTAPIView, ReferenceCacheStatsAPIView
+from .party import CompanyPartyInvoiceAPIView, PartyAPIView
+from .report import GSTSummaryAPIView, PartySummaryAPIView
+from .search import ItemSearchAPIView, PartySearchAPIView
+from .transaction import TransactionAPIView, TransactionBulkAPIView
 from .views import SampleView
 
 urlpatterns = [
@@ -13,15 +17,20 @@ urlpatterns = [
     path('parties/', PartyAPIView.as_view(), name='party-list-create'),
     path('parties/<int:party_id>/', PartyAPIView.as_view(),
          name='party-detail-update-delete'),
+    path('invoices/', CompanyPartyInvoiceAPIView.as_view(), name='invoice-list-create'),
     path('items/', ItemsAPIView.as_view(), name='item-list-create'),
     path('items/<int:item_id>/', ItemsAPIView.as_view(),
          name='item-detail-update-delete'),
     path('remark/', RemarkAPIView.as_view(), name='remark-list-create'),
-    path('remark/<int:remark>/', RemarkAPIView.as_view(),
+    path('remark/<int:remark_id>/', RemarkAPIView.as_view(),
          name='remark-detail-update-delete'),
     path('tax/', TaxAPIView.as_view(), name='tax-list-create'),
     path('tax/<int:tax_id>/', TaxAPIView.as_view(),
          name='tax-detail-update-delete'),
+    path('cache/stats/', ReferenceCacheStatsAPIView.as_view(),
+         name='reference-cache-stats'),
+    path('jobs/', JobAPIView.as_view(), name='job-list-create'),
+    path('jobs/<int:job_id>/', JobAPIView.as_view(), name='job-detail-cancel'),
     path('gst/', GSTAPIView.as_view(), name='gst-list-create'),
     path('gst/<int:gst_id>/', GSTAPIView.as_view(),
          name='gst-detail-update-delete'),
@@ -29,5 +38,28 @@ urlpatterns = [
          name='transaction-list-create'),
     path('transaction/<int:trnx_id>/', TransactionAPIView.as_view(),
          name='transaction-detail-update-delete'),
-
+    path('transaction/bulk/', TransactionBulkAPIView.as_view(),
+         name='transaction-bulk-create'),
+    path('reports/party-summary/', PartySummaryAPIView.as_view(),
+         name='report-party-summary'),
+    path('reports/gst-summary/', GSTSummaryAPIView.as_view(),
+         name='report-gst-summary'),
+    path('search/parties/', PartySearchAPIView.as_view(), name='party-search'),
+    path('search/items/', ItemSearchAPIView.as_view(), name='item-search'),
+    path('async/parties/', AsyncPartyView.as_view(), name='async-party-list'),
+    path('async/parties/<int:party_id>/', AsyncPartyView.as_view(),
+         name='async-party-detail'),
+    path('async/items/', AsyncItemsView.as_view(), name='async-item-list'),
+    path('async/items/<int:pk>/', AsyncItemsView.as_view(),
+         name='async-item-detail'),
+    path('async/remark/', AsyncRemarkView.as_view(), name='async-remark-list'),
+    path('async/remark/<int:pk>/', AsyncRemarkView.as_view(),
+         name='async-remark-detail'),
+    path('async/tax/', AsyncTaxView.as_view(), name='async-tax-list'),
+    path('async/tax/<int:pk>/', AsyncTaxView.as_view(),
+         name='async-tax-detail'),
+    path('async/transaction/', AsyncTransactionView.as_view(),
+         name='async-transaction-list'),
+    path('async/transaction/<int:trnx_id>/', AsyncTransactionView.as_view(),
+         name='async-transaction-detail'),
 ]